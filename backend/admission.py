@@ -0,0 +1,226 @@
+"""
+Admission control for expensive endpoints.
+
+Each gate caps how many requests of one kind (course generation, upskilling
+generation, bulk skill-gap analysis, chat) run at once in this worker. Requests
+over the limit wait in a bounded queue ordered by priority class (interactive
+before batch before background, first come first served within a class):
+
+- a full queue sheds its lowest-priority waiter for a higher-priority arrival,
+  otherwise the arrival is rejected straight away with 429,
+- a request still queued after the gate's queue timeout, or shed, gets 503.
+
+Both carry a Retry-After hint derived from the queue depth and how long recent
+requests held their slot. Cheap endpoints (health, quiz submission, progress)
+are never gated, so they keep answering while generation is saturated.
+
+Limits can be tuned per gate with environment variables, e.g.
+ADMISSION_COURSE_GENERATION_LIMIT, ADMISSION_CHAT_QUEUE_SIZE,
+ADMISSION_BULK_SKILL_GAP_QUEUE_TIMEOUT.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+try:
+    import metrics
+    import profiling
+except ImportError:
+    from backend import metrics, profiling
+
+INTERACTIVE, BATCH, BACKGROUND = "interactive", "batch", "background"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1, BACKGROUND: 2}
+_PRIORITY_NAMES = {rank: name for name, rank in PRIORITIES.items()}
+MAX_RETRY_AFTER = 300
+
+ADMISSION_IN_FLIGHT = metrics.registry.gauge(
+    "admission_in_flight", "Requests holding an admission slot.", ("gate",)
+)
+ADMISSION_QUEUE_DEPTH = metrics.registry.gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot.", ("gate",)
+)
+ADMISSION_WAIT = metrics.registry.histogram(
+    "admission_wait_seconds", "Time admitted requests spent queued.", ("gate", "priority")
+)
+ADMISSION_REJECTED = metrics.registry.counter(
+    "admission_rejected_total", "Requests turned away by admission control.", ("gate", "priority", "reason")
+)
+
+
+class Rejected(Exception):
+    def __init__(self, gate: str, status: int, reason: str, retry_after: float):
+        messages = {"queue_full": "is at capacity", "timeout": "is overloaded", "shed": "is overloaded"}
+        super().__init__(f"{gate.replace('_', ' ').capitalize()} {messages[reason]}. "
+                         f"Try again in {retry_after:.0f} seconds.")
+        self.gate = gate
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def error(self) -> Dict:
+        """
+        The {"error", "retryAfter"} result the agent returns for unavailable dependencies.
+        """
+        return {"error": str(self), "retryAfter": self.retry_after, "status": self.status}
+
+
+def _env(name: str, setting: str, default: float) -> float:
+    return float(os.getenv(f"ADMISSION_{name.upper()}_{setting}", default))
+
+
+class Slot:
+    def __init__(self, gate: "Gate"):
+        self.gate = gate
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate._release(time.monotonic() - self.started)
+
+
+class Gate:
+    """
+    Concurrency limit with a bounded priority queue. Use `async with gate.slot():`,
+    or `acquire()` and `Slot.release()` when the work outlives the handler
+    (streamed responses).
+    """
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float, expected_seconds: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.avg_seconds = expected_seconds  # moving average of slot hold times
+        self.in_flight = 0
+        self._waiters: List[list] = []  # heap of [rank, seq, future]
+        self._seq = itertools.count()
+        self.rejected = 0
+        ADMISSION_IN_FLIGHT.set(0, gate=name)
+        ADMISSION_QUEUE_DEPTH.set(0, gate=name)
+
+    @classmethod
+    def from_env(cls, name: str, limit: int, queue_size: int, queue_timeout: float,
+                 expected_seconds: float) -> "Gate":
+        return cls(name, limit=int(_env(name, "LIMIT", limit)), queue_size=int(_env(name, "QUEUE_SIZE", queue_size)),
+                   queue_timeout=_env(name, "QUEUE_TIMEOUT", queue_timeout), expected_seconds=expected_seconds)
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the queue ahead of a new arrival has likely drained.
+        """
+        waves = (len(self._waiters) + 1) / self.limit
+        return float(min(MAX_RETRY_AFTER, max(1, math.ceil(waves * self.avg_seconds))))
+
+    def _reject(self, priority: str, status: int, reason: str) -> Rejected:
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(gate=self.name, priority=priority, reason=reason)
+        return Rejected(self.name, status, reason, self.retry_after())
+
+    def _depth_changed(self):
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), gate=self.name)
+
+    async def acquire(self, priority: str = INTERACTIVE) -> Slot:
+        """
+        Waits for a slot; raises Rejected when the queue is full, the wait times
+        out or a higher-priority request takes this one's place.
+        """
+        rank = PRIORITIES[priority]
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            ADMISSION_IN_FLIGHT.set(self.in_flight, gate=self.name)
+            ADMISSION_WAIT.observe(0.0, gate=self.name, priority=priority)
+            return Slot(self)
+
+        if len(self._waiters) >= self.queue_size:
+            lowest = max(self._waiters, key=lambda entry: entry[:2]) if self._waiters else None
+            if lowest is None or lowest[0] <= rank:
+                raise self._reject(priority, 429, "queue_full")
+            self._waiters.remove(lowest)
+            heapq.heapify(self._waiters)
+            lowest[2].set_exception(self._reject(_PRIORITY_NAMES[lowest[0]], 503, "shed"))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        self._depth_changed()
+        start = time.monotonic()
+        try:
+            done, _ = await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+        if not done:
+            self._abandon(entry)
+            raise self._reject(priority, 503, "timeout")
+        future.result()  # raises Rejected when shed
+        waited = time.monotonic() - start
+        ADMISSION_WAIT.observe(waited, gate=self.name, priority=priority)
+        profiling.record("admission_wait", waited, self.name)
+        return Slot(self)
+
+    def _abandon(self, entry: list):
+        future = entry[2]
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self._depth_changed()
+        elif future.done() and not future.cancelled() and future.exception() is None:
+            self._release(None)  # a slot was handed over just as the waiter gave up
+        future.cancel()
+
+    def _release(self, held_seconds):
+        if held_seconds is not None:
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * held_seconds
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)  # the slot passes straight to the next waiter
+                self._depth_changed()
+                return
+        self._depth_changed()
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight, gate=self.name)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE):
+        slot = await self.acquire(priority)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    def snapshot(self) -> Dict:
+        queued = {name: 0 for name in PRIORITIES}
+        for rank, _, _ in self._waiters:
+            queued[_PRIORITY_NAMES[rank]] += 1
+        return {
+            "limit": self.limit,
+            "inFlight": self.in_flight,
+            "queueSize": self.queue_size,
+            "queued": queued,
+            "queueTimeoutSeconds": self.queue_timeout,
+            "avgHoldSeconds": round(self.avg_seconds, 2),
+            "retryAfterSeconds": self.retry_after(),
+            "rejected": self.rejected,
+        }
+
+
+gates: Dict[str, Gate] = {
+    "course_generation": Gate.from_env("course_generation", limit=8, queue_size=32, queue_timeout=30,
+                                       expected_seconds=30),
+    "upskilling_generation": Gate.from_env("upskilling_generation", limit=4, queue_size=16, queue_timeout=30,
+                                           expected_seconds=30),
+    "bulk_skill_gap": Gate.from_env("bulk_skill_gap", limit=2, queue_size=4, queue_timeout=10,
+                                    expected_seconds=20),
+    "chat": Gate.from_env("chat", limit=64, queue_size=256, queue_timeout=10, expected_seconds=2),
+}
+
+
+def snapshot() -> Dict[str, Dict]:
+    return {name: gate.snapshot() for name, gate in gates.items()}
@@ -5,7 +5,8 @@ from dotenv import load_dotenv
 import json
 import re
 import asyncio
-from typing import List, Dict, Any
+import time
+from typing import Callable, List, Dict, Any
 
 # Robustly load .env.local from the project root
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,20 +36,51 @@ generation_config = {
     "response_mime_type": "application/json",
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-flash-latest",
-    generation_config=generation_config,
-)
+# Builds the model objects; the bench and tests swap in bench.fake_gemini.FakeGeminiModel.
+GenerativeModel = genai.GenerativeModel
+_models = {}  # (GenerativeModel, model name, instructions key) -> model
 
 # Search Tool using google-api-python-client
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from bson import ObjectId
 
 try:
     from db import db
 except ImportError:
     from backend.db import db
 
+try:
+    import admission
+    import circuit_breaker
+    import course_cache
+    import course_search
+    import metrics
+    import model_router
+    import module_library
+    import profiling
+    import prompt_cache
+    import skill_matcher
+    import streaming_json
+except ImportError:
+    from backend import (admission, circuit_breaker, course_cache, course_search, metrics, model_router,
+                         module_library, profiling, prompt_cache, skill_matcher, streaming_json)
+
+# Stream the course outline and start each module as soon as it has been parsed.
+OUTLINE_STREAMING = os.getenv("COURSE_OUTLINE_STREAMING", "1") != "0"
+
+
+def _get_model(model_name: str, instructions: "prompt_cache.Instructions" = None):
+    """
+    Returns the GenerativeModel for a route tier, with `instructions` as its system
+    instruction.
+    """
+    key = (GenerativeModel, model_name, instructions.key if instructions else None)
+    if key not in _models:
+        _models[key] = GenerativeModel(model_name=model_name, generation_config=generation_config,
+                                       system_instruction=instructions.text if instructions else None)
+    return _models[key]
+
 def extract_json(text):
     """
     Robustly extracts JSON from text, handling markdown code blocks and extra text.
@@ -79,26 +111,84 @@ def extract_json(text):
     print(f"DEBUG: Failed to extract JSON from: {text[:100]}...")
     return None
 
-async def generate_with_retry(prompt, retries=2):
+async def generate_with_retry(prompt, retries=2, call_site="generic", instructions=None):
     """
     Generates content with retry logic for JSON errors.
+    `call_site` picks the model route (see model_router) and labels the metrics
+    recorded for each attempt (outline, module_details, ...). `instructions`
+    (prompt_cache.Instructions) are sent as the system instruction, ahead of `prompt`.
+    Returns None straight away while the Gemini circuit breaker is open.
     """
+    breaker = circuit_breaker.gemini
+    get_model = (lambda model_name: _get_model(model_name, instructions)) if instructions else _get_model
     for attempt in range(retries):
+        is_last_attempt = attempt == retries - 1
+        if not breaker.allow():
+            metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="circuit_open")
+            print(f"Warning: Gemini circuit open, skipping {call_site} call")
+            return None
+        start = time.perf_counter()
         try:
-            response = await model.generate_content_async(prompt)
-            data = extract_json(response.text)
+            with profiling.span("gemini", f"{call_site} attempt {attempt + 1}"):
+                response, _ = await model_router.router.generate(call_site, prompt, get_model)
+            breaker.record_success()
+            metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site=call_site)
+            metrics.record_gemini_usage(call_site, response)
+            with profiling.span("json", call_site):
+                data = extract_json(response.text)
             if data:
+                metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="success")
                 return data
+            metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="json_error")
+            metrics.GEMINI_JSON_FAILURES.inc(call_site=call_site)
+            if not is_last_attempt:
+                metrics.GEMINI_RETRIES.inc(call_site=call_site, reason="json_error")
             print(f"Warning: JSON extraction failed (Attempt {attempt+1}/{retries})")
         except Exception as e:
+            metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site=call_site)
             print(f"Warning: Generation error (Attempt {attempt+1}/{retries}): {e}")
-            if "Quota" in str(e) or "429" in str(e):
+            if metrics.is_rate_limit_error(e):
+                breaker.record_failure(rate_limited=True)
+                metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="rate_limited")
+                metrics.GEMINI_RATE_LIMITED.inc(call_site=call_site)
+                if is_last_attempt or breaker.is_open():
+                    return None
+                metrics.GEMINI_RETRIES.inc(call_site=call_site, reason="rate_limited")
                 wait_time = 10 * (attempt + 1)
                 print(f"Rate limit hit. Waiting {wait_time}s...")
-                await asyncio.sleep(wait_time)
+                with profiling.span("retry_wait", call_site):
+                    await asyncio.sleep(wait_time)
+            else:
+                breaker.record_failure()
+                metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="error")
+                if not is_last_attempt:
+                    metrics.GEMINI_RETRIES.inc(call_site=call_site, reason="error")
             
     return None
 
+def _execute_youtube_search(youtube, query: str):
+    """
+    Runs a single search.list call, recording its outcome and quota cost and
+    feeding the YouTube circuit breaker.
+    """
+    try:
+        with profiling.span("youtube", query):
+            response = youtube.search().list(
+                q=query,
+                part="snippet",
+                type="video",
+                maxResults=1
+            ).execute()
+    except Exception as e:
+        metrics.record_youtube_call("search.list", "error")
+        status = getattr(getattr(e, "resp", None), "status", None)
+        circuit_breaker.youtube.record_failure(
+            rate_limited=status in (403, 429) or metrics.is_rate_limit_error(e) or "quota" in str(e).lower())
+        raise
+    metrics.record_youtube_call("search.list", "success")
+    circuit_breaker.youtube.record_success()
+    return response
+
 async def fetch_video_for_topic(primary_query: str, fallback_query: str = None):
     """
     Searches YouTube for a video related to the topic.
@@ -120,28 +210,25 @@ async def fetch_video_for_topic(primary_query: str, fallback_query: str = None):
         print("Warning: YOUTUBE_API_KEY not set")
         return default_video
 
+    if not circuit_breaker.youtube.allow():
+        # Quota exhausted or API failing: don't spend a round-trip, let the client retry later.
+        return {**default_video, "deferred": True}
+
     try:
-        youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+        # YOUTUBE_API_ENDPOINT points the client at a stub server (see bench/fake_youtube.py)
+        api_endpoint = os.getenv("YOUTUBE_API_ENDPOINT")
+        client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY, client_options=client_options)
         
         # 1. Try specific search
-        search_response = youtube.search().list(
-            q=primary_query,
-            part="snippet",
-            type="video",
-            maxResults=1
-        ).execute()
+        search_response = _execute_youtube_search(youtube, primary_query)
         
         items = search_response.get("items", [])
         
         # 2. Fallback if no results
         if not items and fallback_query:
             print(f"DEBUG: No results for '{primary_query}', trying fallback: '{fallback_query}'...")
-            search_response = youtube.search().list(
-                q=fallback_query,
-                part="snippet",
-                type="video",
-                maxResults=1
-            ).execute()
+            search_response = _execute_youtube_search(youtube, fallback_query)
             items = search_response.get("items", [])
             
         if items:
@@ -170,98 +257,156 @@ async def fetch_video_for_topic(primary_query: str, fallback_query: str = None):
         
     return default_video
 
-async def generate_course_outline(course_name: str):
-    """
-    Generates the course outline: Modules and Sub-modules titles only.
-    """
-    prompt = f"""
+def gemini_unavailable_error() -> Dict:
+    retry_after = circuit_breaker.gemini.retry_after()
+    return {"error": f"Course generation is temporarily unavailable. Try again in {retry_after:.0f} seconds.",
+            "retryAfter": retry_after}
+
+COURSE_OUTLINE_INSTRUCTIONS = prompt_cache.Instructions.dedent("outline", """
     You are an expert curriculum designer.
-    Create a detailed course outline for: "{course_name}".
-    
+    Create detailed course outlines for the course you are given.
+
     The course should have 5-7 Modules.
     **CRITICAL CONSTRAINT**: Each Module MUST have EXACTLY 3 Sub-modules (Sections).
-    
+
     **NAMING CONVENTION**:
     Every sub-module title MUST follow this exact format: "Section [Number]: [Descriptive Name]"
     - Example: "Section 1: Introduction to Variables"
     - Example: "Section 2: Understanding Data Types"
     - Example: "Section 3: Type Casting in Python"
-    
+
     Ensure the "Descriptive Name" is meaningful and specific to the topic. Do NOT use generic names like "Introduction" or "Basics".
-    
+
     Output JSON format:
-    {{
-        "title": "{course_name}",
-        "description": "Comprehensive guide to {course_name}",
+    {
+        "title": "<the course name>",
+        "description": "Comprehensive guide to <the course name>",
         "category": "Technical",
         "modules": [
-            {{
+            {
                 "moduleTitle": "String",
                 "subModules": [
-                    {{ "subTitle": "Section 1: String" }},
-                    {{ "subTitle": "Section 2: String" }},
-                    {{ "subTitle": "Section 3: String" }}
+                    { "subTitle": "Section 1: String" },
+                    { "subTitle": "Section 2: String" },
+                    { "subTitle": "Section 3: String" }
                 ]
-            }}
+            }
         ]
-    }}
+    }
+""")
+
+def course_outline_prompt(course_name: str) -> str:
+    return f'Create a detailed course outline for: "{course_name}".'
+
+async def generate_course_outline(course_name: str):
+    """
+    Generates the course outline: Modules and Sub-modules titles only.
     """
-    
     try:
         print(f"DEBUG: Generating outline for: {course_name}")
-        return await generate_with_retry(prompt)
+        return await generate_with_retry(course_outline_prompt(course_name), call_site="outline",
+                                         instructions=COURSE_OUTLINE_INSTRUCTIONS)
     except Exception as e:
         print(f"Error generating outline: {e}")
         return None
 
-async def generate_module_details(course_name: str, module_title: str, sub_modules: List[Dict]):
+async def stream_course_outline(course_name: str, on_module: Callable[[Dict], None]):
     """
-    Generates detailed content for a single module:
-    - Explanations and Examples for each sub-module.
-    - A Quiz for the module.
+    Streams the course outline, calling `on_module(module)` as soon as each
+    module's title and sub-modules have been parsed.
+    Returns the whole outline, or None if the stream failed or wasn't valid JSON
+    (modules already handed to `on_module` may then be incomplete).
     """
-    sub_module_titles = [sm["subTitle"] for sm in sub_modules]
-    
-    prompt = f"""
+    call_site = "outline"
+    breaker = circuit_breaker.gemini
+    if not breaker.allow():
+        metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="circuit_open")
+        print(f"Warning: Gemini circuit open, skipping {call_site} call")
+        return None
+    print(f"DEBUG: Streaming outline for: {course_name}")
+    parser = streaming_json.ArrayItemParser("modules")
+    get_model = lambda model_name: _get_model(model_name, COURSE_OUTLINE_INSTRUCTIONS)
+    last_chunk = None
+    start = time.perf_counter()
+    try:
+        with profiling.span("gemini", f"{call_site} stream"):
+            async for chunk in model_router.router.stream(call_site, course_outline_prompt(course_name), get_model):
+                last_chunk = chunk
+                for module in parser.feed(chunk.text):
+                    if module.get("moduleTitle"):
+                        on_module(module)
+    except Exception as e:
+        metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site=call_site)
+        print(f"Warning: Outline stream failed: {e}")
+        limited = metrics.is_rate_limit_error(e)
+        breaker.record_failure(rate_limited=limited)
+        metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="rate_limited" if limited else "error")
+        if limited:
+            metrics.GEMINI_RATE_LIMITED.inc(call_site=call_site)
+        return None
+    breaker.record_success()
+    metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site=call_site)
+    if last_chunk is not None:
+        metrics.record_gemini_usage(call_site, last_chunk)
+    with profiling.span("json", call_site):
+        outline = extract_json(parser.text)
+    if not outline:
+        metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="json_error")
+        metrics.GEMINI_JSON_FAILURES.inc(call_site=call_site)
+        return None
+    metrics.GEMINI_CALLS.inc(call_site=call_site, outcome="success")
+    return outline
+
+MODULE_DETAILS_INSTRUCTIONS = prompt_cache.Instructions.dedent("module_details", """
     You are a Senior Curriculum Architect and DSA Expert.
-    
-    Task: Generate detailed content for the module "{module_title}" of the course "{course_name}".
-    
-    Sub-modules to cover: {sub_module_titles}
-    
+
+    Each request gives you one module of a course and the sub-modules it must cover.
+
     1. For EACH sub-module, provide:
        - "explanation": A detailed, clear explanation (2-3 paragraphs).
        - "examples": A practical code example or real-world scenario string.
        - "youtube_query": A specific search query to find a relevant YouTube video for this sub-topic.
-    
+
     2. **MANDATORY**: Create a Quiz for this module.
        - The quiz MUST be included in the output.
        - 3-5 Multiple Choice Questions (MCQs) testing understanding of these sub-modules.
        - The questions can be conceptual or code-based.
-    
+
     Output JSON format:
-    {{
+    {
         "subModulesContent": [
-            {{
+            {
                 "subTitle": "String (Must match input)",
                 "explanation": "String",
                 "examples": "String",
                 "youtube_query": "String"
-            }}
+            }
         ],
         "quiz": [
-            {{
+            {
                 "question": "String",
                 "options": ["String", "String", "String", "String"],
                 "correctAnswer": "String (Must be one of the options)"
-            }}
+            }
         ]
-    }}
+    }
+""")
+
+async def generate_module_details(course_name: str, module_title: str, sub_modules: List[Dict]):
     """
-    
+    Generates detailed content for a single module:
+    - Explanations and Examples for each sub-module.
+    - A Quiz for the module.
+    """
+    sub_module_titles = [sm["subTitle"] for sm in sub_modules]
+    prompt = f"""Task: Generate detailed content for the module "{module_title}" of the course "{course_name}".
+
+Sub-modules to cover: {sub_module_titles}"""
+
     try:
         # print(f"DEBUG: Generating details for module: {module_title}")
-        details = await generate_with_retry(prompt)
+        details = await generate_with_retry(prompt, call_site="module_details",
+                                            instructions=MODULE_DETAILS_INSTRUCTIONS)
         return module_title, details # Return tuple for easy mapping
     except Exception as e:
         print(f"Error generating module details: {e}")
@@ -274,7 +419,8 @@ async def process_module(course_name, module_title, sub_modules_outline, missing
     print(f"DEBUG: Processing module: {module_title}...")
 
     # 1. Generate text content (in parallel with other modules, but here sequential within module)
-    _, details = await generate_module_details(course_name, module_title, sub_modules_outline)
+    with profiling.span("module", module_title):
+        _, details = await generate_module_details(course_name, module_title, sub_modules_outline)
 
     if not details:
         print(f"Error: Could not generate details for module {module_title}")
@@ -306,25 +452,62 @@ async def process_module(course_name, module_title, sub_modules_outline, missing
         "quiz": details.get("quiz", [])
     }
 
-async def generate_full_course(course_name: str):
+async def generate_full_course(course_name: str, priority: str = admission.INTERACTIVE):
+    """
+    Generates and stores a course, waiting for a course_generation admission slot
+    first (see admission). Returns an error with `retryAfter` when the worker is
+    saturated or Gemini's circuit is open.
+    """
+    if circuit_breaker.gemini.is_open():
+        return gemini_unavailable_error()
+    try:
+        async with admission.gates["course_generation"].slot(priority):
+            return await _generate_full_course(course_name)
+    except admission.Rejected as e:
+        print(f"Warning: {e}")
+        return e.error()
+
+async def _generate_full_course(course_name: str):
     """
     Orchestrates the full generation process:
-    1. Generate Outline.
-    2. For each module, generate details and fetch videos (PARALLEL).
-    3. Construct the final object.
-    4. Save to MongoDB.
+    1. Stream the Outline; each module starts generating (PARALLEL) as soon as
+       its title and sub-modules have been parsed.
+    2. Construct the final object.
+    3. Save to MongoDB.
     """
-    # 1. Generate Outline
-    outline = await generate_course_outline(course_name)
+    if circuit_breaker.gemini.is_open():
+        return gemini_unavailable_error()
+    tasks, started = [], []
+
+    def start_module(module):
+        started.append(module["moduleTitle"])
+        tasks.append(asyncio.create_task(
+            process_module(course_name, module["moduleTitle"], module.get("subModules", []))))
+
+    # 1. Generate Outline, pipelined with the module details
+    outline = await stream_course_outline(course_name, start_module) if OUTLINE_STREAMING else None
     if not outline:
-        return {"error": "Failed to generate course outline"}
-    
-    # 2. Process all modules in parallel
-    tasks = []
-    for module in outline.get("modules", []):
-         tasks.append(process_module(course_name, module["moduleTitle"], module.get("subModules", [])))
-    
-    print(f"DEBUG: Starting parallel generation for {len(tasks)} modules...")
+        # Regenerate the outline whole. Modules already under way keep running and
+        # are kept when the new outline has them too; the rest are cancelled.
+        in_flight = {" ".join(title.lower().split()): task for title, task in zip(started, tasks)}
+        tasks.clear()
+        outline = await generate_course_outline(course_name)
+        for module in (outline or {}).get("modules", []):
+            task = in_flight.pop(" ".join(module["moduleTitle"].lower().split()), None)
+            if task:
+                tasks.append(task)
+            else:
+                start_module(module)
+        for task in in_flight.values():
+            task.cancel()
+        await asyncio.gather(*in_flight.values(), return_exceptions=True)
+        if not outline:
+            return {"error": "Failed to generate course outline"}
+    else:
+        for module in outline.get("modules", [])[len(tasks):]:
+            start_module(module)  # missed by the incremental parser
+
+    print(f"DEBUG: Waiting on parallel generation for {len(tasks)} modules...")
     results = await asyncio.gather(*tasks)
     
     final_modules = [r for r in results if r is not None]
@@ -344,32 +527,88 @@ async def generate_full_course(course_name: str):
         existing = await db.courses.find_one({"title": course_data["title"]})
         if existing:
             await db.courses.update_one({"_id": existing["_id"]}, {"$set": course_data})
+            course_data["_id"] = existing["_id"]
             print(f"DEBUG: Updated existing course: {course_data['title']}")
+            await course_cache.cache.invalidate(str(course_data["_id"]))
         else:
-            await db.courses.insert_one(course_data)
+            result = await db.courses.insert_one(course_data)
+            course_data["_id"] = result.inserted_id
             print(f"DEBUG: Inserted new course: {course_data['title']}")
-            
+        course_search.index.add(course_data)
+        if course_cache.ENABLED:
+            await course_cache.cache.put(course_data, course_name)
+
+        await module_library.index_modules(final_modules, [course_name], course_data["title"])
         return course_data
     except Exception as e:
         print(f"Error saving to DB: {e}")
         return {"error": f"Database error: {str(e)}"}
 
+async def find_existing_course(course_name: str, projection: Dict = None):
+    """
+    Looks up a stored course by exact, case-insensitive title.
+    """
+    return await db.courses.find_one(
+        {"title": {"$regex": f"^{re.escape(course_name)}$", "$options": "i"}}, projection
+    )
+
+def course_id_query(course_id: str) -> Dict:
+    try:
+        return {"_id": ObjectId(course_id)}
+    except Exception:
+        return {"_id": course_id}
+
+async def get_course_by_id(course_id: str):
+    """
+    Read-through lookup of a course by ID. The returned document may be shared
+    with other requests; do not modify it.
+    """
+    if course_cache.ENABLED:
+        course = await course_cache.cache.get_by_id(course_id)
+        if course:
+            return course
+    course = await db.courses.find_one(course_id_query(course_id))
+    if not course:
+        return None
+    if course_cache.ENABLED:
+        await course_cache.cache.put(course)
+    return course
+
+async def find_similar_course(course_name: str, projection: Dict = None):
+    """
+    Looks up a stored course whose title is close enough to `course_name`
+    ("Intro to Python" -> "Python Basics") using the course search index.
+    """
+    match = await course_search.find_close_match(course_name)
+    if not match:
+        return None
+    print(f"DEBUG: '{course_name}' matched existing course '{match['title']}' (score {match['score']})")
+    return await db.courses.find_one(course_id_query(match["_id"]), projection)
+
 async def get_course_content(course_name: str):
     """
     Retrieves course content.
-    1. Checks MongoDB first.
+    1. Checks MongoDB first (exact title, then a close-enough existing course).
     2. If not found, triggers full generation (which saves to DB).
     3. Returns the course object.
     """
     try:
-        # 1. Check DB
+        # 1. Check the cache, then the DB
+        if course_cache.ENABLED:
+            course = await course_cache.cache.get_by_title(course_name)
+            if course:
+                print("DEBUG: Found course in cache")
+                return course
+
         print(f"DEBUG: Checking DB for course: {course_name}")
-        course = await db.courses.find_one({"title": {"$regex": f"^{re.escape(course_name)}$", "$options": "i"}})
+        course = await find_existing_course(course_name)
+        if not course:
+            course = await find_similar_course(course_name)
         
         if course:
             print("DEBUG: Found course in DB")
-            if "_id" in course:
-                course["_id"] = str(course["_id"])
+            if course_cache.ENABLED:
+                await course_cache.cache.put(course, course_name)
             return course
             
         # 2. Generate if not found
@@ -380,7 +619,87 @@ async def get_course_content(course_name: str):
         print(f"Error in get_course_content: {e}")
         return {"error": str(e)}
 
-async def get_recommendations_with_links(current_role: str):
+# Stored role recommendations older than this are regenerated (0 keeps them forever).
+RECOMMENDATION_MAX_AGE_SECONDS = float(os.getenv("RECOMMENDATION_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+def _role_key(role: str) -> str:
+    return " ".join(role.lower().split())
+
+async def get_cached_recommendations(current_role: str, max_age: float = None):
+    """
+    Returns stored recommendations for a role (shared by every user with that role),
+    unless they are older than `max_age` seconds (RECOMMENDATION_MAX_AGE_SECONDS by
+    default, 0 for any age).
+    """
+    if not db:
+        return None
+    cached = await db.recommendations.find_one({"roleKey": _role_key(current_role)})
+    if not cached:
+        return None
+    max_age = RECOMMENDATION_MAX_AGE_SECONDS if max_age is None else max_age
+    if max_age and time.time() - cached.get("generatedAt", 0) > max_age:
+        return None
+    return {"courses": cached["courses"]}
+
+async def store_recommendations(current_role: str, recommendations: Dict):
+    if not db or not recommendations or not recommendations.get("courses"):
+        return
+    await db.recommendations.update_one(
+        {"roleKey": _role_key(current_role)},
+        {"$set": {"role": current_role, "courses": recommendations["courses"], "generatedAt": time.time()}},
+        upsert=True,
+    )
+
+async def get_recommendations_with_links(current_role: str, use_cache: bool = True):
+    """
+    Returns course recommendations for a role, generating and storing them on a
+    cache miss. The catalog pre-generation CLI fills the same collection.
+    """
+    if use_cache:
+        try:
+            cached = await get_cached_recommendations(current_role)
+            if cached:
+                return cached
+        except Exception as e:
+            print(f"Warning: Recommendation cache lookup failed: {e}")
+
+    recommendations = await generate_role_recommendations(current_role)
+    if not recommendations:
+        if not use_cache:
+            return recommendations
+        # Interactive callers get the expired entry, or a degraded answer, instead of an error.
+        try:
+            stale = await get_cached_recommendations(current_role, max_age=0)
+            if stale:
+                return stale
+        except Exception as e:
+            print(f"Warning: Recommendation cache lookup failed: {e}")
+        return await degraded_recommendations(current_role)
+    try:
+        await store_recommendations(current_role, recommendations)
+    except Exception as e:
+        print(f"Warning: Failed to store recommendations: {e}")
+    return recommendations
+
+async def degraded_recommendations(current_role: str) -> Dict:
+    """
+    Recommendations built without Gemini: matching catalog courses, else templates.
+    Never stored.
+    """
+    try:
+        courses = [{"title": c["title"], "description": c["description"], "topics": []}
+                   for c in await course_search.search_courses(current_role, 3)]
+    except Exception as e:
+        print(f"Warning: Catalog lookup for degraded recommendations failed: {e}")
+        courses = []
+    if not courses:
+        courses = [
+            {"title": f"Mastering {current_role}", "description": f"Deepen your core {current_role} skills.", "topics": []},
+            {"title": f"Beyond {current_role}", "description": "Prepare for the next step in your career.", "topics": []},
+        ]
+    return {"courses": courses, "degraded": True}
+
+async def generate_role_recommendations(current_role: str):
     prompt = f"""
     You are an expert career coach.
     User role: "{current_role}".
@@ -388,11 +707,79 @@ async def get_recommendations_with_links(current_role: str):
     Output JSON: {{ "courses": [ {{ "title": "...", "description": "...", "topics": ["..."] }} ] }}
     """
     try:
-        return await generate_with_retry(prompt)
+        return await generate_with_retry(prompt, call_site="recommendations")
     except:
         return None
 
-async def analyze_skill_gap(employee_skills: List[str], target_role: str, target_role_skills: List[str]):
+SKILL_GAP_MODES = ("hybrid", "fast", "llm")
+
+def resolve_skill_gap_mode(mode: str = None) -> str:
+    """
+    The requested mode, else SKILL_GAP_MODE, else "hybrid". Raises ValueError for
+    unknown modes.
+    """
+    mode = (mode or os.getenv("SKILL_GAP_MODE", "hybrid")).lower()
+    if mode not in SKILL_GAP_MODES:
+        raise ValueError(f"Unknown skill gap mode '{mode}'. Use one of: {', '.join(SKILL_GAP_MODES)}.")
+    return mode
+
+async def analyze_skill_gap(employee_skills: List[str], target_role: str, target_role_skills: List[str], mode: str = None):
+    """
+    Analyzes the gap between employee skills and target role skills.
+
+    Modes (SKILL_GAP_MODE env var or per-request `mode`):
+    - "hybrid" (default): missing skills, match percentage and time estimate come from
+      the local skill matcher; Gemini only writes the recommendations.
+    - "fast": no Gemini call at all, recommendations are templated.
+    - "llm": the whole analysis is done by Gemini (previous behaviour).
+    """
+    try:
+        mode = resolve_skill_gap_mode(mode)
+    except ValueError as e:
+        return {"error": str(e)}
+    if mode == "llm" and not circuit_breaker.gemini.is_open():
+        return await analyze_skill_gap_with_llm(employee_skills, target_role, target_role_skills)
+
+    match = skill_matcher.matcher.match(employee_skills, target_role_skills)
+    missing = match["missingSkills"]
+    recommendations = None
+    if mode != "fast":
+        recommendations = await generate_gap_recommendations(target_role, list(match["matchedSkills"]), missing)
+    result = {
+        "missingSkills": missing,
+        "matchPercentage": match["matchPercentage"],
+        "estimatedTime": skill_matcher.estimate_time(missing),
+        "recommendations": recommendations or skill_matcher.template_recommendations(missing, target_role),
+    }
+    if mode != "fast" and not recommendations:
+        result["degraded"] = True
+    return result
+
+async def generate_gap_recommendations(target_role: str, matched_skills: List[str], missing_skills: List[str]):
+    """
+    Asks Gemini for the narrative upskilling recommendations only.
+    """
+    prompt = f"""
+    You are an expert career coach.
+    An employee is moving into the role "{target_role}".
+    Skills they already have for it: {json.dumps(matched_skills)}
+    Skills they are missing: {json.dumps(missing_skills)}
+    
+    Provide 2-3 specific, actionable Upskilling Recommendations focused on the missing skills.
+    
+    Output strictly valid JSON:
+    {{ "recommendations": ["Take course X", "Build project Y"] }}
+    """
+    try:
+        result = await generate_with_retry(prompt, call_site="skill_gap")
+        recommendations = (result or {}).get("recommendations")
+        if isinstance(recommendations, list) and recommendations:
+            return recommendations
+    except Exception as e:
+        print(f"Error generating skill gap recommendations: {e}")
+    return None
+
+async def analyze_skill_gap_with_llm(employee_skills: List[str], target_role: str, target_role_skills: List[str]):
     """
     Analyzes the gap between employee skills and target role skills using Gemini.
     """
@@ -421,7 +808,7 @@ async def analyze_skill_gap(employee_skills: List[str], target_role: str, target
     
     try:
         print(f"DEBUG: Analyzing skill gap for target role: {target_role}")
-        result = await generate_with_retry(prompt)
+        result = await generate_with_retry(prompt, call_site="skill_gap")
         
         if not result:
             return {"error": "Failed to generate skill gap analysis. Please try again."}
@@ -431,7 +818,22 @@ async def analyze_skill_gap(employee_skills: List[str], target_role: str, target
         print(f"Error analyzing skill gap: {e}")
         return {"error": str(e)}
 
-async def generate_upskilling_course(missing_skills: List[str], current_skills: List[str], email: str = None):
+async def generate_upskilling_course(missing_skills: List[str], current_skills: List[str], email: str = None,
+                                     priority: str = admission.INTERACTIVE):
+    """
+    Generates a targeted upskilling course once an upskilling_generation
+    admission slot is free (see admission).
+    """
+    try:
+        async with admission.gates["upskilling_generation"].slot(priority):
+            return await _generate_upskilling_course(missing_skills, current_skills, email)
+    except admission.Rejected as e:
+        print(f"Warning: {e}")
+        return e.error()
+
+UPSKILLING_MODULE_COUNT = 3
+
+async def _generate_upskilling_course(missing_skills: List[str], current_skills: List[str], email: str = None):
     """
     Generates a targeted upskilling course to bridge the skill gap.
     """
@@ -451,57 +853,34 @@ async def generate_upskilling_course(missing_skills: List[str], current_skills:
         except Exception as e:
             print(f"Error looking up user: {e}")
 
-    # 1. Generate Outline focused on missing skills
-    prompt = f"""
-    You are a Senior Curriculum Architect and DSA Expert.
-    
-    Task: Create a highly targeted course outline to bridge the skill gap for these specific missing skills: {json.dumps(missing_skills)}.
-    The learner already knows: {json.dumps(current_skills)}, so DO NOT cover basics regarding those.
-    
-    Requirements:
-    1.  **No Generic Placeholders**: Never use "Section 1", "Module 2", etc. Every title must be meaningful and context-specific (e.g., "Implementing Advanced Binary Search").
-    2.  **Module Depth**: Create exactly 3 Modules.
-    3.  **Section Depth**: Each Module MUST have EXACTLY 3 Sub-modules (Sections).
-    4.  **Descriptive Titles**: Ensure all titles are descriptive and focused on the learning objective.
-    5.  **NAMING CONVENTION**: Every sub-module title MUST follow this exact format: "Section [Number]: [Descriptive Name]" (e.g., "Section 1: Setup and Config").
-    
-    Output JSON format:
-    {{
-        "title": "{course_name}",
-        "description": "Focused upskilling path to master {", ".join(missing_skills)}.",
-        "category": "Upskilling",
-        "modules": [
-            {{
-                "moduleTitle": "Descriptive Module Title",
-                "subModules": [
-                    {{ "subTitle": "Section 1: Descriptive Section Title" }},
-                    {{ "subTitle": "Section 2: Descriptive Section Title" }},
-                    {{ "subTitle": "Section 3: Descriptive Section Title" }}
-                ]
-            }}
-        ]
-    }}
-    """
-    
-    try:
-        print(f"DEBUG: Generating upskilling outline for: {missing_skills}")
-        outline = await generate_with_retry(prompt)
-        if not outline: raise ValueError("Outline generation failed")
-    except Exception as e:
-        print(f"Error generating upskilling outline: {e}")
-        return {"error": str(e)}
-
+    # 1. Reuse library modules that already teach some of the missing skills
+    reused_modules, skills_to_generate = await module_library.find_reusable_modules(
+        missing_skills, " ".join(current_skills), limit=UPSKILLING_MODULE_COUNT)
+    if reused_modules:
+        print(f"DEBUG: Reusing {len(reused_modules)} library modules; generating for {skills_to_generate}")
+    # Covered skills still get fresh modules when the library can't fill the course.
+    skills_to_generate = skills_to_generate or missing_skills
+    module_count = UPSKILLING_MODULE_COUNT - len(reused_modules)
+    if module_count <= 0:
+        outline = {"title": course_name, "description": f"Focused upskilling path to master {', '.join(missing_skills)}."}
+    else:
+        outline = await _generate_upskilling_outline(course_name, skills_to_generate, current_skills, module_count)
+        if "error" in outline:
+            return outline
+        if reused_modules:
+            outline["description"] = f"Focused upskilling path to master {', '.join(missing_skills)}."
 
-    # 2. Process modules in parallel to improve performance
+    # 2. Process the remaining modules in parallel to improve performance
     tasks = []
-    skill_focus = missing_skills[0] if missing_skills else ""
+    skill_focus = skills_to_generate[0] if skills_to_generate else ""
     
     for module in outline.get("modules", []):
          tasks.append(process_module(course_name, module["moduleTitle"], module.get("subModules", []), skill_focus))
     
     print(f"DEBUG: Starting parallel generation for {len(tasks)} modules...")
     results = await asyncio.gather(*tasks)
-    final_modules = [r for r in results if r is not None]
+    generated_modules = [r for r in results if r is not None]
+    final_modules = reused_modules + generated_modules
         
     # 3. Construct Final Course Object
     course_data = {
@@ -519,11 +898,64 @@ async def generate_upskilling_course(missing_skills: List[str], current_skills:
     # 4. Save to MongoDB
     try:
         result = await db.courses.insert_one(course_data)
-        course_data["_id"] = str(result.inserted_id)
-        if "userId" in course_data: course_data["userId"] = str(course_data["userId"])
+        course_data["_id"] = result.inserted_id
         print(f"DEBUG: Inserted new upskilling course: {course_data['title']}")
-            
-        return course_data
     except Exception as e:
         print(f"Error saving to DB: {e}")
         return {"error": f"Database error: {str(e)}"}
+
+    await module_library.index_modules(generated_modules, skills_to_generate, course_data["title"])
+    return course_data
+
+UPSKILLING_OUTLINE_INSTRUCTIONS = prompt_cache.Instructions.dedent("upskilling_outline", """
+    You are a Senior Curriculum Architect and DSA Expert.
+
+    Each request gives you a learner's missing skills, the skills they already have,
+    the course title and how many Modules to create.
+
+    Requirements:
+    1.  **No Generic Placeholders**: Never use "Section 1", "Module 2", etc. Every title must be meaningful and context-specific (e.g., "Implementing Advanced Binary Search").
+    2.  **Module Depth**: Create exactly the number of Modules requested.
+    3.  **Section Depth**: Each Module MUST have EXACTLY 3 Sub-modules (Sections).
+    4.  **Descriptive Titles**: Ensure all titles are descriptive and focused on the learning objective.
+    5.  **NAMING CONVENTION**: Every sub-module title MUST follow this exact format: "Section [Number]: [Descriptive Name]" (e.g., "Section 1: Setup and Config").
+
+    Output JSON format:
+    {
+        "title": "<the course title>",
+        "description": "Focused upskilling path to master <the missing skills, comma-separated>.",
+        "category": "Upskilling",
+        "modules": [
+            {
+                "moduleTitle": "Descriptive Module Title",
+                "subModules": [
+                    { "subTitle": "Section 1: Descriptive Section Title" },
+                    { "subTitle": "Section 2: Descriptive Section Title" },
+                    { "subTitle": "Section 3: Descriptive Section Title" }
+                ]
+            }
+        ]
+    }
+""")
+
+async def _generate_upskilling_outline(course_name: str, missing_skills: List[str], current_skills: List[str],
+                                      module_count: int = 3):
+    """
+    Asks Gemini for an upskilling outline covering `missing_skills`.
+    """
+    if circuit_breaker.gemini.is_open():
+        return gemini_unavailable_error()
+    prompt = f"""Task: Create a highly targeted course outline to bridge the skill gap for these specific missing skills: {json.dumps(missing_skills)}.
+The learner already knows: {json.dumps(current_skills)}, so DO NOT cover basics regarding those.
+Course title: "{course_name}"
+Create exactly {module_count} Modules."""
+
+    try:
+        print(f"DEBUG: Generating upskilling outline for: {missing_skills}")
+        outline = await generate_with_retry(prompt, call_site="upskilling_outline",
+                                            instructions=UPSKILLING_OUTLINE_INSTRUCTIONS)
+        if not outline: raise ValueError("Outline generation failed")
+    except Exception as e:
+        print(f"Error generating upskilling outline: {e}")
+        return {"error": str(e)}
+    return outline
@@ -0,0 +1,4 @@
+"""
+Offline benchmark harness: local stand-ins for Gemini, YouTube and MongoDB plus
+load scenarios for the main endpoints. Run with `python -m bench.run`.
+"""
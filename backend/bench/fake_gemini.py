@@ -0,0 +1,202 @@
+"""
+Offline stand-in for `genai.GenerativeModel`.
+
+Replays canned JSON shaped like each of the agent's prompts (outline, module details,
+skill gap, recommendations, upskilling outline) with configurable latency, 429 rate
+and truncation rate. A seeded RNG keeps runs reproducible. System instructions are
+counted in the reported prompt tokens.
+"""
+import ast
+import asyncio
+import copy
+import json
+import random
+import re
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self):
+        super().__init__("429 Resource has been exhausted (e.g. check quota).")
+
+
+def _course_outline(course_name: str, module_count: int = 5) -> Dict:
+    return {
+        "title": course_name,
+        "description": f"Comprehensive guide to {course_name}",
+        "category": "Technical",
+        "modules": [
+            {
+                "moduleTitle": f"{course_name}: Part {m + 1}",
+                "subModules": [{"subTitle": f"Section {s + 1}: {course_name} topic {m + 1}.{s + 1}"} for s in range(3)],
+            }
+            for m in range(module_count)
+        ],
+    }
+
+
+def _module_details(module_title: str, sub_titles) -> Dict:
+    paragraph = (f"{module_title} builds on the previous material with worked explanations, "
+                 "trade-offs and common pitfalls. ") * 6
+    return {
+        "subModulesContent": [
+            {
+                "subTitle": title,
+                "explanation": paragraph,
+                "examples": f"def example():\n    return '{title}'\n" * 4,
+                "youtube_query": f"{title} tutorial",
+            }
+            for title in sub_titles
+        ],
+        "quiz": [
+            {
+                "question": f"Question {q + 1} about {module_title}?",
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "correctAnswer": "Option A",
+            }
+            for q in range(4)
+        ],
+    }
+
+
+def canned_response(prompt: str) -> Dict:
+    """
+    Builds a plausible JSON payload for one of the agent's prompts.
+    """
+    if "Sub-modules to cover:" in prompt:
+        module = re.search(r'content for the module "(.*?)"', prompt)
+        subs = re.search(r"Sub-modules to cover: (\[.*?\])", prompt)
+        sub_titles = ast.literal_eval(subs.group(1)) if subs else ["Section 1: Overview"]
+        return _module_details(module.group(1) if module else "Module", sub_titles)
+    if "bridge the skill gap" in prompt:
+        title = re.search(r'Course title: "(.*?)"', prompt)
+        count = re.search(r"Create exactly (\d+) Modules", prompt)
+        outline = _course_outline(title.group(1) if title else "Upskilling", module_count=int(count.group(1)) if count else 3)
+        outline["category"] = "Upskilling"
+        return outline
+    if "course outline for" in prompt:
+        name = re.search(r'course outline for: "(.*?)"', prompt)
+        return _course_outline(name.group(1) if name else "Course")
+    if "Entries:" in prompt:
+        entries = re.search(r"Entries:\s*(\[.*?\])\s*\n", prompt, re.S)
+        entries = json.loads(entries.group(1)) if entries else []
+        return {"results": [
+            {"id": e["id"], "recommendations": [f"Pair with a {e['targetRole']} on {s}" for s in e["missingSkills"][:3]]}
+            for e in entries
+        ]}
+    if "Skills they are missing:" in prompt:
+        missing = re.search(r"Skills they are missing: (\[.*?\])", prompt)
+        missing = json.loads(missing.group(1)) if missing else []
+        return {"recommendations": [f"Ship a small service that uses {s}" for s in missing[:3]] or ["Mentor others"]}
+    if "Target Role Required Skills" in prompt:
+        employee = re.search(r"Employee Current Skills: (\[.*?\])", prompt)
+        required = re.search(r"Target Role Required Skills: (\[.*?\])", prompt)
+        have = {s.lower() for s in json.loads(employee.group(1))} if employee else set()
+        need = json.loads(required.group(1)) if required else []
+        missing = [s for s in need if s.lower() not in have]
+        match = round(100 * (len(need) - len(missing)) / len(need)) if need else 100
+        return {
+            "missingSkills": missing,
+            "matchPercentage": match,
+            "estimatedTime": f"{max(1, len(missing)) * 2} weeks",
+            "recommendations": [f"Build a project using {s}" for s in missing[:3]] or ["Keep practising"],
+        }
+    if "User role:" in prompt:
+        role = re.search(r'User role: "(.*?)"', prompt)
+        role = role.group(1) if role else "Engineer"
+        return {"courses": [
+            {"title": f"Mastering {role}", "description": f"Deepen your {role} skills.", "topics": ["Core", "Advanced"]},
+            {"title": f"Transitioning beyond {role}", "description": "Prepare for the next level.", "topics": ["Leadership"]},
+        ]}
+    return {"ok": True}
+
+
+class FakeStream:
+    """
+    What `generate_content_async(..., stream=True)` returns: the response text in
+    `chunks` pieces with the latency spread evenly across them. Like the real
+    stream, usage metadata arrives with the last chunk.
+    """
+    def __init__(self, response: SimpleNamespace, delay: float, chunks: int = 8):
+        self.response = response
+        self.delay = delay
+        self.chunks = max(1, chunks)
+
+    @property
+    def text(self) -> str:
+        return self.response.text
+
+    async def __aiter__(self):
+        text = self.response.text
+        size = -(-len(text) // self.chunks) or 1
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            if self.delay:
+                await asyncio.sleep(self.delay / len(pieces))
+            usage = self.response.usage_metadata if i == len(pieces) - 1 else None
+            yield SimpleNamespace(text=piece, usage_metadata=usage)
+
+
+class FakeGeminiModel:
+    """
+    Drop-in replacement for `agent.GenerativeModel`: calling it returns a model
+    view sharing its RNG and call counts.
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 truncation_rate: float = 0.0, seed: Optional[int] = 0, stream_chunks: int = 8):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.truncation_rate = truncation_rate
+        self.rng = random.Random(seed)
+        self.stream_chunks = stream_chunks
+        self.system_instruction = ""
+        self.calls = Counter()
+
+    def __call__(self, model_name: str = None, generation_config: Dict = None,
+                 system_instruction: str = None) -> "FakeGeminiModel":
+        """
+        Stands in for the `genai.GenerativeModel` constructor: this model (sharing
+        its RNG and call counts) with the given system instruction.
+        """
+        view = copy.copy(self)
+        view.system_instruction = system_instruction or ""
+        return view
+
+    def _delay(self) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _respond(self, prompt) -> SimpleNamespace:
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        if self.rng.random() < self.rate_429:
+            self.calls["rate_limited"] += 1
+            raise FakeRateLimitError()
+        text = json.dumps(canned_response(prompt))
+        if self.rng.random() < self.truncation_rate:
+            self.calls["truncated"] += 1
+            text = text[: len(text) // 2]
+        self.calls["ok"] += 1
+        prompt_tokens = (len(self.system_instruction) + len(prompt)) // 4
+        self.calls["system_instruction_tokens"] += len(self.system_instruction) // 4
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, cached_content_token_count=0,
+                                candidates_token_count=len(text) // 4, total_token_count=prompt_tokens + len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        delay = self._delay()
+        if stream:
+            return FakeStream(self._respond(prompt), delay, self.stream_chunks)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(prompt)
+
+    def generate_content(self, prompt, **kwargs):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(prompt)
@@ -0,0 +1,481 @@
+"""
+In-process stand-in for the subset of the Motor API used by the backend.
+
+Collections are plain lists of dicts guarded by nothing but the event loop; every
+operation deep-copies documents in and out so callers see the same isolation they
+get from a real BSON round-trip. An optional per-operation latency simulates the
+network hop to Atlas.
+"""
+import asyncio
+import copy
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+_MISSING = object()
+
+
+def _get_path(doc: Any, path: str):
+    current = doc
+    for part in path.split("."):
+        if isinstance(current, dict):
+            if part not in current:
+                return _MISSING
+            current = current[part]
+        elif isinstance(current, list) and part.isdigit():
+            index = int(part)
+            if index >= len(current):
+                return _MISSING
+            current = current[index]
+        elif isinstance(current, list):
+            values = [_get_path(item, part) for item in current if isinstance(item, dict)]
+            values = [v for v in values if v is not _MISSING]
+            return values if values else _MISSING
+        else:
+            return _MISSING
+    return current
+
+
+def _set_path(doc: Dict, path: str, value: Any):
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        if isinstance(current, list):
+            current = current[int(part)]
+            continue
+        # Like MongoDB, a missing intermediate field becomes an embedded document
+        # even when the next path part is numeric ("scores.0" -> {"scores": {"0": ...}}).
+        if part not in current or current[part] is None:
+            current[part] = {}
+        current = current[part]
+    last = parts[-1]
+    if isinstance(current, list):
+        index = int(last)
+        while len(current) <= index:
+            current.append(None)
+        current[index] = value
+    else:
+        current[last] = value
+
+
+def _unset_path(doc: Dict, path: str):
+    parts = path.split(".")
+    current = _get_path(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+    if isinstance(current, dict):
+        current.pop(parts[-1], None)
+
+
+def _compare(value, condition) -> bool:
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$regex":
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                candidates = value if isinstance(value, list) else [value]
+                if not any(isinstance(c, str) and re.search(arg, c, flags) for c in candidates):
+                    return False
+            elif op == "$options":
+                continue
+            elif op == "$in":
+                candidates = value if isinstance(value, list) else [value]
+                if not any(c in arg for c in candidates):
+                    return False
+            elif op == "$nin":
+                candidates = value if isinstance(value, list) else [value]
+                if any(c in arg for c in candidates):
+                    return False
+            elif op == "$exists":
+                if (value is not _MISSING) != bool(arg):
+                    return False
+            elif op == "$ne":
+                if value == arg or (isinstance(value, list) and arg in value):
+                    return False
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is _MISSING or value is None:
+                    return False
+                if op == "$gt" and not value > arg:
+                    return False
+                if op == "$gte" and not value >= arg:
+                    return False
+                if op == "$lt" and not value < arg:
+                    return False
+                if op == "$lte" and not value <= arg:
+                    return False
+            elif op == "$elemMatch":
+                if not isinstance(value, list) or not any(matches(item, arg) for item in value):
+                    return False
+            else:
+                raise NotImplementedError(f"FakeMongo does not support query operator {op}")
+        return True
+    if value is _MISSING:
+        return condition is None
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    """
+    Evaluates a MongoDB-style filter against a document.
+    """
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif not _compare(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+def _include_path(source: Dict, target: Dict, parts: List[str]):
+    """
+    Copies one projected path into `target`, descending into arrays of embedded
+    documents the way MongoDB does ("modules.quiz" keeps `quiz` of every module).
+    """
+    head, rest = parts[0], parts[1:]
+    if head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = copy.deepcopy(value)
+    elif isinstance(value, dict):
+        _include_path(value, target.setdefault(head, {}), rest)
+    elif isinstance(value, list):
+        items = target.setdefault(head, [{} for item in value if isinstance(item, dict)])
+        for item, projected in zip([v for v in value if isinstance(v, dict)], items):
+            _include_path(item, projected, rest)
+
+
+def _apply_projection(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    exclude = {k for k, v in projection.items() if not v}
+    if include:
+        result = {}
+        for path in include:
+            _include_path(doc, result, path.split("."))
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = copy.deepcopy(doc)
+    for path in exclude:
+        _unset_path(result, path)
+    return result
+
+
+def apply_update(doc: Dict, update: Dict, is_insert: bool = False):
+    """
+    Applies MongoDB update operators to `doc` in place.
+    """
+    if not any(k.startswith("$") for k in update):
+        preserved_id = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if preserved_id is not None:
+            doc["_id"] = preserved_id
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = _get_path(doc, path)
+            if op == "$set":
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$setOnInsert":
+                if is_insert:
+                    _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == "$max":
+                if current is _MISSING or value > current:
+                    _set_path(doc, path, value)
+            elif op == "$min":
+                if current is _MISSING or value < current:
+                    _set_path(doc, path, value)
+            elif op in ("$push", "$addToSet"):
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                target = [] if current is _MISSING else current
+                for item in items:
+                    if op == "$push" or item not in target:
+                        target.append(copy.deepcopy(item))
+                _set_path(doc, path, target)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    _set_path(doc, path, [item for item in current if item != value])
+            else:
+                raise NotImplementedError(f"FakeMongo does not support update operator {op}")
+
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", query: Optional[Dict], projection: Optional[Dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Dict]] = None
+
+    def sort(self, key, direction=1):
+        self._sort = key if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _materialize(self) -> List[Dict]:
+        docs = [d for d in self._collection._docs if matches(d, self._query)]
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda d: (_get_path(d, key) is _MISSING, _get_path(d, key)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [copy.deepcopy(_apply_projection(d, self._projection)) for d in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        await self._collection._delay()
+        docs = self._materialize()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._results is None:
+            await self._collection._delay()
+            self._results = self._materialize()
+        if not self._results:
+            raise StopAsyncIteration
+        return self._results.pop(0)
+
+
+class FakeAggregateCursor(FakeCursor):
+    def __init__(self, collection: "FakeCollection", docs: List[Dict]):
+        super().__init__(collection, None, None)
+        self._docs = docs
+
+    def _materialize(self) -> List[Dict]:
+        return copy.deepcopy(self._docs)
+
+
+class FakeCollection:
+    def __init__(self, name: str, database: "FakeDatabase"):
+        self.name = name
+        self.database = database
+        self._docs: List[Dict] = []
+        self.indexes: Dict[str, Any] = {}
+
+    async def _delay(self):
+        self.database.operation_count += 1
+        if self.database.latency:
+            await asyncio.sleep(self.database.latency)
+        else:
+            await asyncio.sleep(0)
+
+    def _find_raw(self, query: Optional[Dict]) -> Optional[Dict]:
+        for doc in self._docs:
+            if matches(doc, query):
+                return doc
+        return None
+
+    async def find_one(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs):
+        await self._delay()
+        doc = self._find_raw(query)
+        return copy.deepcopy(_apply_projection(doc, projection)) if doc is not None else None
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs) -> FakeCursor:
+        return FakeCursor(self, query, projection)
+
+    async def count_documents(self, query: Optional[Dict] = None, **kwargs) -> int:
+        await self._delay()
+        return sum(1 for d in self._docs if matches(d, query))
+
+    async def insert_one(self, document: Dict, **kwargs):
+        await self._delay()
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        self._docs.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    async def insert_many(self, documents: List[Dict], **kwargs):
+        ids = []
+        for document in documents:
+            ids.append((await self.insert_one(document)).inserted_id)
+        return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def _upsert_document(self, query: Dict, update: Dict) -> Dict:
+        doc = {k: copy.deepcopy(v) for k, v in (query or {}).items()
+               if not k.startswith("$") and not (isinstance(v, dict) and any(op.startswith("$") for op in v))}
+        apply_update(doc, update, is_insert=True)
+        doc.setdefault("_id", ObjectId())
+        self._docs.append(doc)
+        return doc
+
+    async def update_one(self, query: Dict, update: Dict, upsert: bool = False, **kwargs):
+        await self._delay()
+        doc = self._find_raw(query)
+        if doc is None:
+            if upsert:
+                created = self._upsert_document(query, update)
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=created["_id"], acknowledged=True)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None, acknowledged=True)
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        return SimpleNamespace(matched_count=1, modified_count=int(before != doc), upserted_id=None, acknowledged=True)
+
+    async def update_many(self, query: Dict, update: Dict, upsert: bool = False, **kwargs):
+        await self._delay()
+        matched = [d for d in self._docs if matches(d, query)]
+        for doc in matched:
+            apply_update(doc, update)
+        if not matched and upsert:
+            created = self._upsert_document(query, update)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=created["_id"], acknowledged=True)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched), upserted_id=None, acknowledged=True)
+
+    async def find_one_and_update(self, query: Dict, update: Dict, upsert: bool = False,
+                                  return_document: bool = False, projection: Optional[Dict] = None, **kwargs):
+        await self._delay()
+        doc = self._find_raw(query)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self._upsert_document(query, update)
+            return copy.deepcopy(_apply_projection(doc, projection)) if return_document else None
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        result = doc if return_document else before
+        return copy.deepcopy(_apply_projection(result, projection))
+
+    async def delete_one(self, query: Dict, **kwargs):
+        await self._delay()
+        doc = self._find_raw(query)
+        if doc is None:
+            return SimpleNamespace(deleted_count=0, acknowledged=True)
+        self._docs.remove(doc)
+        return SimpleNamespace(deleted_count=1, acknowledged=True)
+
+    async def delete_many(self, query: Dict, **kwargs):
+        await self._delay()
+        before = len(self._docs)
+        self._docs = [d for d in self._docs if not matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self._docs), acknowledged=True)
+
+    async def create_index(self, keys, **kwargs) -> str:
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = kwargs.get("name") or "_".join(f"{k}_{v}" for k, v in keys)
+        self.indexes[name] = {"key": keys, **kwargs}
+        return name
+
+    def aggregate(self, pipeline: List[Dict], **kwargs) -> FakeAggregateCursor:
+        docs = [copy.deepcopy(d) for d in self._docs]
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == "$match":
+                docs = [d for d in docs if matches(d, arg)]
+            elif op == "$project":
+                docs = [_apply_projection(d, arg) for d in docs]
+            elif op == "$limit":
+                docs = docs[:arg]
+            elif op == "$unwind":
+                path = (arg["path"] if isinstance(arg, dict) else arg)[1:]
+                unwound = []
+                for d in docs:
+                    values = _get_path(d, path)
+                    for value in values if isinstance(values, list) else []:
+                        item = copy.deepcopy(d)
+                        _set_path(item, path, value)
+                        unwound.append(item)
+                docs = unwound
+            elif op == "$group":
+                docs = _group(docs, arg)
+            elif op == "$sort":
+                for key, direction in reversed(list(arg.items())):
+                    docs.sort(key=lambda d: _get_path(d, key), reverse=direction < 0)
+            else:
+                raise NotImplementedError(f"FakeMongo does not support pipeline stage {op}")
+        return FakeAggregateCursor(self, docs)
+
+
+def _resolve(doc: Dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get_path(doc, expression[1:])
+        return None if value is _MISSING else value
+    return expression
+
+
+def _group(docs: List[Dict], spec: Dict) -> List[Dict]:
+    groups: Dict[Any, Dict] = {}
+    for doc in docs:
+        key_expr = spec["_id"]
+        if isinstance(key_expr, dict):
+            key = tuple((k, _resolve(doc, v)) for k, v in key_expr.items())
+            group_id = dict(key)
+        else:
+            key = group_id = _resolve(doc, key_expr)
+        group = groups.setdefault(key, {"_id": group_id, "__count": {}})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = accumulator.items()
+            value = _resolve(doc, expr)
+            if op == "$sum":
+                group[field] = group.get(field, 0) + (value or 0)
+            elif op == "$avg":
+                group["__count"][field] = group["__count"].get(field, 0) + 1
+                group[field] = group.get(field, 0) + (value or 0)
+            elif op == "$max":
+                group[field] = value if field not in group else max(group[field], value)
+            elif op == "$min":
+                group[field] = value if field not in group else min(group[field], value)
+            elif op == "$push":
+                group.setdefault(field, []).append(value)
+            else:
+                raise NotImplementedError(f"FakeMongo does not support accumulator {op}")
+    results = []
+    for group in groups.values():
+        counts = group.pop("__count")
+        for field, count in counts.items():
+            group[field] = group[field] / count
+        results.append(group)
+    return results
+
+
+class FakeDatabase:
+    """
+    Async database stand-in: `db.courses`, `db["users"]` and `db.command("ping")` work
+    like they do on a Motor database.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.operation_count = 0
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.get_collection(name)
+
+    async def command(self, name, *args, **kwargs):
+        return {"ok": 1.0}
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
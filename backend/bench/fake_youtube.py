@@ -0,0 +1,83 @@
+"""
+Stub YouTube Data API server.
+
+Serves `GET /youtube/v3/search` on localhost so `googleapiclient` can be pointed at it
+through YOUTUBE_API_ENDPOINT. Latency and the share of quota errors are configurable.
+"""
+import json
+import random
+import threading
+import time
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeYouTubeServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != "/youtube/v3/search":
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        stub = self.server
+        with stub.lock:
+            stub.request_count += 1
+            fail = stub.rng.random() < stub.quota_error_rate
+        if stub.latency:
+            time.sleep(stub.latency)
+        if fail:
+            self._send_json(403, {"error": {"code": 403, "message": "quotaExceeded",
+                                            "errors": [{"reason": "quotaExceeded"}]}})
+            return
+
+        query = parse_qs(parsed.query).get("q", [""])[0]
+        video_id = md5(query.encode()).hexdigest()[:11]
+        self._send_json(200, {"items": [{
+            "id": {"kind": "youtube#video", "videoId": video_id},
+            "snippet": {
+                "title": f"{query} explained",
+                "channelTitle": "Bench Channel",
+                "thumbnails": {"high": {"url": f"https://img.youtube.com/vi/{video_id}/0.jpg"}},
+            },
+        }]})
+
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, quota_error_rate: float = 0.0, seed: int = 0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeYouTubeServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-youtube", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
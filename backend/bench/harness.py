@@ -0,0 +1,112 @@
+"""
+Wires the offline stand-ins into the backend before `main` is imported.
+
+Gemini is replaced by FakeGeminiModel, YouTube requests go to a local stub server,
+MongoDB is replaced by FakeDatabase, and the RAG chain is built with deterministic
+fake embeddings and a canned chat model over a throw-away FAISS index.
+"""
+import importlib
+import os
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .fake_gemini import FakeGeminiModel
+from .fake_mongo import FakeDatabase
+from .fake_youtube import FakeYouTubeServer
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class BenchConfig:
+    gemini_latency: float = 0.05
+    gemini_jitter: float = 0.0
+    gemini_429_rate: float = 0.0
+    gemini_truncation_rate: float = 0.0
+    youtube_latency: float = 0.0
+    youtube_quota_error_rate: float = 0.0
+    mongo_latency: float = 0.002
+    chat_latency: float = 0.05
+    seed: int = 0
+
+
+@dataclass
+class BenchEnvironment:
+    config: BenchConfig
+    app: object
+    db: FakeDatabase
+    gemini: FakeGeminiModel
+    youtube: FakeYouTubeServer
+    index_dir: tempfile.TemporaryDirectory
+    modules: dict = field(default_factory=dict)
+
+    def close(self):
+        self.youtube.stop()
+        self.index_dir.cleanup()
+
+
+def _patch_rag_providers(chat_latency: float):
+    import langchain_google_genai
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    def embeddings_factory(*args, **kwargs):
+        return DeterministicFakeEmbedding(size=256)
+
+    def chat_factory(*args, **kwargs):
+        return FakeListChatModel(responses=["Nexor Navigator helps you plan your next role."], sleep=chat_latency or None)
+
+    langchain_google_genai.GoogleGenerativeAIEmbeddings = embeddings_factory
+    langchain_google_genai.ChatGoogleGenerativeAI = chat_factory
+
+
+def _patch_databases(fake_db: FakeDatabase):
+    """
+    Replaces every `db` reference imported from db.py by backend modules.
+    """
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None) or ""
+        if not module_file.startswith(str(BACKEND_DIR)) or "bench" in Path(module_file).parts:
+            continue
+        if hasattr(module, "db") and not isinstance(getattr(module, "db"), type(sys)):
+            module.db = fake_db
+
+
+def install(config: Optional[BenchConfig] = None) -> BenchEnvironment:
+    """
+    Installs all stand-ins and imports the FastAPI app. Must run before anything
+    else imports `main`, `agent` or `rag`.
+    """
+    config = config or BenchConfig()
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    youtube = FakeYouTubeServer(latency=config.youtube_latency,
+                                quota_error_rate=config.youtube_quota_error_rate, seed=config.seed).start()
+    index_dir = tempfile.TemporaryDirectory(prefix="bench-faiss-")
+
+    # Empty values win over .env.local because load_dotenv doesn't override existing keys.
+    os.environ["MONGODB_URI"] = ""
+    os.environ["GEMINI_API_KEY"] = "bench-fake-key"
+    os.environ["YOUTUBE_API_KEY"] = "bench-fake-key"
+    os.environ["YOUTUBE_API_ENDPOINT"] = youtube.url
+    os.environ["RAG_INDEX_DIR"] = str(Path(index_dir.name) / "faiss_index")
+
+    _patch_rag_providers(config.chat_latency)
+
+    agent = importlib.import_module("agent")
+    main = importlib.import_module("main")
+
+    gemini = FakeGeminiModel(latency=config.gemini_latency, jitter=config.gemini_jitter,
+                             rate_429=config.gemini_429_rate, truncation_rate=config.gemini_truncation_rate,
+                             seed=config.seed)
+    agent.GenerativeModel = gemini
+
+    fake_db = FakeDatabase(latency=config.mongo_latency)
+    _patch_databases(fake_db)
+
+    return BenchEnvironment(config=config, app=main.app, db=fake_db, gemini=gemini, youtube=youtube,
+                            index_dir=index_dir, modules={"agent": agent, "main": main})
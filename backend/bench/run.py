@@ -0,0 +1,162 @@
+"""
+Offline load scenarios for the FastAPI backend.
+
+Usage (from the backend directory):
+    python -m bench.run                          # all scenarios, default settings
+    python -m bench.run -s course_warm -n 500 -c 50 --gemini-latency 0.2
+    python -m bench.run --json > bench_output.json
+
+Every scenario drives the real app in-process through httpx's ASGI transport, with
+Gemini, YouTube and MongoDB replaced by the stand-ins from `bench.harness`.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+from .harness import BenchConfig, BenchEnvironment, install
+
+WARM_COURSE = "Bench Warm Course"
+BENCH_EMAIL = "bench.user@example.com"
+
+RequestSpec = Tuple[str, str, Dict]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+async def _seed(env: BenchEnvironment, client: httpx.AsyncClient) -> Dict:
+    """
+    Creates the user and the warm course every scenario can rely on.
+    """
+    await env.db.users.insert_one({"email": BENCH_EMAIL, "fullName": "Bench User", "currentRole": "Backend Developer"})
+    response = await client.post("/api/get-course-content", json={"course_name": WARM_COURSE})
+    response.raise_for_status()
+    course = await env.db.courses.find_one({"title": WARM_COURSE})
+    return {"courseId": str(course["_id"]), "moduleTitle": course["modules"][0]["moduleTitle"]}
+
+
+def _scenarios(seed_data: Dict, run_id: str) -> Dict[str, Callable[[int], RequestSpec]]:
+    return {
+        "course_cold": lambda i: ("POST", "/api/get-course-content", {"course_name": f"Bench Cold Course {run_id}-{i}"}),
+        "course_warm": lambda i: ("POST", "/api/get-course-content", {"course_name": WARM_COURSE}),
+        "quiz_submit": lambda i: ("POST", "/api/submit-quiz", {
+            "courseId": seed_data["courseId"], "moduleTitle": seed_data["moduleTitle"], "answers": [0, 1, 0, 0],
+            "email": BENCH_EMAIL}),
+        "skill_gap": lambda i: ("POST", "/api/analyze-skill-gap", {
+            "employeeSkills": ["Python", "React.js", "SQL"], "targetRole": "Full Stack Engineer",
+            "targetRoleSkills": ["Python", "React", "AWS", "Docker", "SQL"]}),
+        "recommendations": lambda i: ("GET", f"/api/recommendations?email={BENCH_EMAIL}", None),
+        "chat": lambda i: ("POST", "/api/chat", {"query": "What does Nexor Navigator offer?"}),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, make_request: Callable[[int], RequestSpec],
+                       total: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, body = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 400 or (
+                    response.headers.get("content-type", "").startswith("application/json") and
+                    isinstance(response.json(), dict) and "error" in response.json())
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += int(failed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "durationSeconds": round(elapsed, 3),
+        "throughputRps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50Ms": round(percentile(ordered, 50) * 1000, 2),
+        "p90Ms": round(percentile(ordered, 90) * 1000, 2),
+        "p99Ms": round(percentile(ordered, 99) * 1000, 2),
+        "maxMs": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "meanMs": round(statistics.fmean(ordered) * 1000, 2) if ordered else 0.0,
+    }
+
+
+async def run(config: BenchConfig, scenario_names: List[str], total: int, concurrency: int) -> List[Dict]:
+    env = install(config)
+    try:
+        transport = httpx.ASGITransport(app=env.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            seed_data = await _seed(env, client)
+            scenarios = _scenarios(seed_data, run_id=str(int(time.time())))
+            unknown = set(scenario_names) - set(scenarios)
+            if unknown:
+                raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+            results = []
+            for name in scenario_names:
+                results.append(await run_scenario(client, name, scenarios[name], total, concurrency))
+            return results
+    finally:
+        env.close()
+
+
+def _print_table(results: List[Dict]):
+    columns = ["scenario", "requests", "concurrency", "errors", "throughputRps", "p50Ms", "p90Ms", "p99Ms", "maxMs"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in results:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load scenarios for the NextRole backend.")
+    parser.add_argument("-s", "--scenario", action="append",
+                        help="Scenario to run (repeatable). Default: all of them.")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="Requests per scenario.")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="Concurrent clients.")
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-jitter", type=float, default=0.0)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-truncation-rate", type=float, default=0.0)
+    parser.add_argument("--youtube-latency", type=float, default=0.0)
+    parser.add_argument("--youtube-quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--mongo-latency", type=float, default=0.002)
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    config = BenchConfig(
+        gemini_latency=args.gemini_latency, gemini_jitter=args.gemini_jitter,
+        gemini_429_rate=args.gemini_429_rate, gemini_truncation_rate=args.gemini_truncation_rate,
+        youtube_latency=args.youtube_latency, youtube_quota_error_rate=args.youtube_quota_error_rate,
+        mongo_latency=args.mongo_latency, chat_latency=args.chat_latency, seed=args.seed,
+    )
+    names = args.scenario or ["course_cold", "course_warm", "quiz_submit", "skill_gap", "recommendations", "chat"]
+    results = asyncio.run(run(config, names, args.requests, args.concurrency))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
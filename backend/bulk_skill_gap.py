@@ -0,0 +1,161 @@
+"""
+Bulk skill-gap analysis for whole teams.
+
+Employees with identical skill sets are analysed once per target role, all matches
+are computed in one vectorized pass by the local skill matcher, and the remaining
+recommendation work is packed into multi-employee Gemini prompts that run under a
+concurrency cap. Results are yielded as soon as they are ready so the endpoint can
+stream them.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import agent
+    import skill_matcher
+except ImportError:
+    from backend import agent, skill_matcher
+
+# Employees (unique gap groups) per Gemini prompt and prompts in flight at once.
+PACK_SIZE = int(os.getenv("BULK_SKILL_GAP_PACK_SIZE", "10"))
+LLM_CONCURRENCY = int(os.getenv("BULK_SKILL_GAP_CONCURRENCY", "4"))
+
+
+def _group_key(role: str, missing_skills: Sequence[str]) -> Tuple:
+    return (role, tuple(sorted(skill_matcher.matcher.canonical(s) for s in missing_skills)))
+
+
+async def recommend_packed(entries: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Asks Gemini for recommendations for several (role, missing skills) entries in a
+    single prompt. Returns recommendations by entry id; entries the model skipped
+    are simply absent.
+    """
+    prompt = f"""
+    You are an expert career coach.
+    Each entry below describes an employee moving into a target role and the skills they are missing.
+    For EVERY entry, provide 2-3 specific, actionable Upskilling Recommendations focused on its missing skills.
+
+    Entries:
+    {json.dumps(entries)}
+
+    Output strictly valid JSON, one result per entry id:
+    {{ "results": [ {{ "id": "g0", "recommendations": ["Take course X", "Build project Y"] }} ] }}
+    """
+    result = await agent.generate_with_retry(prompt, call_site="skill_gap_bulk")
+    recommendations = {}
+    for item in (result or {}).get("results", []):
+        if isinstance(item, dict) and isinstance(item.get("recommendations"), list) and item["recommendations"]:
+            recommendations[str(item.get("id"))] = item["recommendations"]
+    return recommendations
+
+
+def _employee_result(employee_id: str, role: str, match: Dict, recommendations: List[str]) -> Dict:
+    return {
+        "employeeId": employee_id,
+        "targetRole": role,
+        "missingSkills": match["missingSkills"],
+        "matchPercentage": match["matchPercentage"],
+        "estimatedTime": skill_matcher.estimate_time(match["missingSkills"]),
+        "recommendations": recommendations,
+    }
+
+
+def resolve_mode(mode: Optional[str] = None) -> str:
+    """
+    The bulk mode to run ("llm" runs as hybrid). Raises ValueError for unknown
+    modes, like analyze_skill_gap refuses them.
+    """
+    mode = agent.resolve_skill_gap_mode(mode)
+    # A full per-employee LLM analysis is exactly what bulk mode avoids.
+    return "hybrid" if mode == "llm" else mode
+
+
+async def analyze_skill_gap_bulk(employees: List[Dict], target_roles: List[Dict],
+                                 mode: Optional[str] = None) -> AsyncIterator[Dict]:
+    """
+    Yields one result per (employee, target role) followed by a summary record.
+
+    `employees` items have `employeeId`, `skills` and an optional `targetRole`
+    (restricting the analysis to that role); `target_roles` items have `role` and
+    `skills`. `mode` is "hybrid" (default) or "fast", as in analyze_skill_gap;
+    unknown modes raise ValueError.
+    """
+    started = time.perf_counter()
+    mode = resolve_mode(mode)
+    roles = {r["role"]: r["skills"] for r in target_roles}
+
+    # 1. Deduplicate identical (skill set, role) pairs.
+    pairs: Dict[Tuple, List[str]] = {}
+    pair_inputs: Dict[Tuple, Tuple[List[str], str]] = {}
+    for employee in employees:
+        wanted = [employee["targetRole"]] if employee.get("targetRole") else list(roles)
+        skill_key = frozenset(skill_matcher.matcher.canonical(s) for s in employee["skills"] if s and s.strip())
+        for role in wanted:
+            if role not in roles:
+                yield {"employeeId": employee["employeeId"], "targetRole": role,
+                       "error": f"Unknown target role '{role}'"}
+                continue
+            key = (skill_key, role)
+            pairs.setdefault(key, []).append(employee["employeeId"])
+            pair_inputs.setdefault(key, (employee["skills"], role))
+
+    # 2. One vectorized matching pass over every unique pair.
+    keys = list(pairs)
+    matches = skill_matcher.matcher.match_batch([(pair_inputs[k][0], roles[pair_inputs[k][1]]) for k in keys])
+
+    # 3. Group pairs whose gap is identical; fully matched or fast-mode groups finish now.
+    groups: Dict[Tuple, List[int]] = {}
+    for i, key in enumerate(keys):
+        role = pair_inputs[key][1]
+        missing = matches[i]["missingSkills"]
+        if mode == "fast" or not missing:
+            recommendations = skill_matcher.template_recommendations(missing, role)
+            for employee_id in pairs[key]:
+                yield _employee_result(employee_id, role, matches[i], recommendations)
+        else:
+            groups.setdefault(_group_key(role, missing), []).append(i)
+
+    # 4. Packed recommendation prompts under a concurrency cap, streamed as they finish.
+    group_items = list(groups.items())
+    packs = [group_items[i:i + PACK_SIZE] for i in range(0, len(group_items), PACK_SIZE)]
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def run_pack(pack):
+        entries = []
+        for n, (_, indices) in enumerate(pack):
+            first = indices[0]
+            entries.append({"id": f"g{n}", "targetRole": pair_inputs[keys[first]][1],
+                            "missingSkills": matches[first]["missingSkills"]})
+        async with semaphore:
+            try:
+                recommendations = await recommend_packed(entries)
+            except Exception as e:
+                print(f"Error generating packed recommendations: {e}")
+                recommendations = {}
+        return pack, entries, recommendations
+
+    llm_groups = len(group_items)
+    for finished in asyncio.as_completed([run_pack(pack) for pack in packs]):
+        pack, entries, recommendations = await finished
+        for entry, (_, indices) in zip(entries, pack):
+            advice = recommendations.get(entry["id"]) or skill_matcher.template_recommendations(
+                entry["missingSkills"], entry["targetRole"])
+            for i in indices:
+                role = pair_inputs[keys[i]][1]
+                for employee_id in pairs[keys[i]]:
+                    yield _employee_result(employee_id, role, matches[i], advice)
+
+    yield {
+        "done": True,
+        "summary": {
+            "employees": len(employees),
+            "uniquePairs": len(keys),
+            "recommendationGroups": llm_groups,
+            "llmPrompts": len(packs),
+            "durationSeconds": round(time.perf_counter() - started, 3),
+        },
+    }
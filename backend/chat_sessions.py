@@ -0,0 +1,157 @@
+"""
+Chat sessions for multi-turn RAG conversations.
+
+A session remembers which knowledge-base records the recent answers were grounded
+on (their IDs in the index version they came from) and a compact rolling summary
+of the conversation. Follow-up questions ("and how long does that take?") reuse
+that context instead of searching again; follow-ups that bring in new terms
+search and merge the results with it.
+
+Sessions live in this worker's memory: at most RAG_SESSION_MAX of them, each
+holding at most RAG_SESSION_CONTEXT_RECORDS record IDs and a summary of about
+RAG_SESSION_SUMMARY_TOKENS tokens, dropped after RAG_SESSION_IDLE_SECONDS idle.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+IDLE_SECONDS = float(os.getenv("RAG_SESSION_IDLE_SECONDS", "900"))
+MAX_SESSIONS = int(os.getenv("RAG_SESSION_MAX", "10000"))
+CONTEXT_RECORDS = int(os.getenv("RAG_SESSION_CONTEXT_RECORDS", "8"))
+SUMMARY_TOKENS = int(os.getenv("RAG_SESSION_SUMMARY_TOKENS", "200"))
+
+SESSION_RETRIEVALS = metrics.registry.counter(
+    "rag_session_retrievals_total", "Chat retrievals by how session context was used.", ("mode",)
+)
+SESSIONS_ACTIVE = metrics.registry.gauge(
+    "rag_sessions_active", "Chat sessions held by this worker."
+)
+
+_FOLLOW_UP_START = re.compile(
+    r"^(and|also|but|so|then|what about|how about|why|it|its|it's|that|this|those|these|they|them|their|there)\b"
+)
+_REFERENCES = {"it", "its", "that", "this", "those", "these", "they", "them", "their", "there", "same", "above"}
+# Words that carry no topic of their own in a follow-up question.
+_GENERIC = {
+    "a", "an", "and", "the", "to", "of", "for", "in", "on", "with", "is", "are", "was", "be", "do", "does", "did",
+    "can", "could", "would", "should", "will", "i", "me", "my", "we", "you", "your", "what", "which", "who", "how",
+    "why", "when", "where", "about", "also", "but", "so", "then", "more", "much", "many", "long", "take", "takes",
+    "time", "work", "works", "mean", "means", "explain", "example", "examples", "detail", "details", "tell",
+    "please", "again", "else", "other", "there", "any", "some", "get", "need", "happen", "happens", "after",
+    "before", "next", "first", "still", "really", "just", "exactly", *_REFERENCES,
+}
+
+
+def content_terms(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in words if w not in _GENERIC]
+
+
+def is_follow_up(query: str) -> bool:
+    """
+    True for questions that lean on the previous turn: they open with a
+    connective or reference, or refer back to something without naming it.
+    """
+    text = query.strip().lower()
+    words = re.findall(r"[a-z0-9']+", text)
+    return bool(_FOLLOW_UP_START.match(text)) or (len(words) <= 8 and bool(_REFERENCES & set(words)))
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rsplit(" ", 1)[0] + "..."
+
+
+@dataclass
+class ChatSession:
+    id: str
+    tenant: Optional[str] = None
+    index_version: Optional[str] = None  # index version the record IDs belong to
+    record_ids: List[str] = field(default_factory=list)
+    turns: List[str] = field(default_factory=list)  # rolling summary, oldest first
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.turns)
+
+    def context_ids(self, index_version: str) -> List[str]:
+        return self.record_ids if index_version == self.index_version else []
+
+    def remember(self, query: str, answer: str, index_version: str, record_ids: List[str]):
+        """
+        Keeps the records this answer used (most recent first) and rolls the
+        summary forward, dropping the oldest turns beyond the token budget.
+        """
+        previous = self.context_ids(index_version)
+        self.record_ids = list(dict.fromkeys(record_ids + previous))[:CONTEXT_RECORDS]
+        self.index_version = index_version
+        self.turns.append(f"Q: {_first_sentence(query)} A: {_first_sentence(answer)}")
+        while len(self.turns) > 1 and len(self.summary) // 4 > SUMMARY_TOKENS:
+            self.turns.pop(0)
+
+
+class SessionStore:
+    """
+    LRU of chat sessions with idle expiry.
+    """
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_seconds: float = IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_or_create(self, session_id: Optional[str], tenant: Optional[str] = None) -> ChatSession:
+        """
+        Returns the session, or a new one if it is unknown, expired or belongs to
+        another tenant. New sessions always get a fresh server-generated id, so a
+        caller-chosen id can never replace someone else's session.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None or session.tenant != tenant:
+                session = ChatSession(id=uuid.uuid4().hex, tenant=tenant)
+                self._sessions[session.id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            SESSIONS_ACTIVE.set(len(self._sessions))
+            return session
+
+    def _expire(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            SESSIONS_ACTIVE.set(len(self._sessions))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {"sessions": len(self._sessions), "maxSessions": self.max_sessions,
+                    "idleSeconds": self.idle_seconds, "evictions": self.evictions}
+
+
+store = SessionStore()
@@ -0,0 +1,129 @@
+"""
+Structure-aware chunking for the RAG knowledge base.
+
+Documents are split into sections at headings (Markdown `#`, underlined
+headings and numbered headings such as "3. Personalized Development Roadmap").
+Each section becomes a parent document; its body is packed line by line into
+small child chunks (at most RAG_CHUNK_CHARS characters, no overlap) that carry
+the section heading and are what gets embedded. At query time the retriever
+expands matching children to their parent sections as far as the token budget
+allows (see vector_index.VectorIndexRetriever).
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "400"))
+# Changing how documents are split must rebuild the index.
+SETTINGS = f"sections-v1:{CHUNK_CHARS}"
+
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_NUMBERED_HEADING = re.compile(r"^(\d+\.(?:\d+\.?)*|\d+\))\s+([A-Z].{0,78})$")  # "3. Title", "1.2 Title", "4) Title"
+_UNDERLINE = re.compile(r"^(=+|-+)\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Section:
+    path: Tuple[str, ...]  # heading titles from the outermost level down
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def heading(self) -> str:
+        return " > ".join(self.path)
+
+    @property
+    def body(self) -> str:
+        return "\n".join(self.lines).strip()
+
+
+def _heading(line: str, next_line: str):
+    """
+    (level, title) if `line` is a heading, else None.
+    """
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1)), match.group(2)
+    match = _NUMBERED_HEADING.match(line)
+    if match and not line.rstrip().endswith((".", ":", ",", ";")):
+        return len(re.findall(r"\d+", match.group(1))), line.strip()
+    if line.strip() and _UNDERLINE.match(next_line) and len(line) <= 80:
+        return (1 if next_line.startswith("=") else 2), line.strip()
+    return None
+
+
+def split_sections(text: str) -> List[Section]:
+    lines = text.splitlines()
+    sections = [Section(path=())]
+    stack: List[Tuple[int, str]] = []
+    skip_underline = False
+    for i, line in enumerate(lines):
+        if skip_underline:
+            skip_underline = False
+            continue
+        heading = _heading(line, lines[i + 1] if i + 1 < len(lines) else "")
+        if heading is None:
+            sections[-1].lines.append(line)
+            continue
+        level, title = heading
+        skip_underline = bool(_UNDERLINE.match(lines[i + 1])) if i + 1 < len(lines) else False
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+        sections.append(Section(path=tuple(t for _, t in stack)))
+    return [s for s in sections if s.body]
+
+
+def _pieces(line: str, limit: int) -> List[str]:
+    """
+    Splits a line longer than `limit` at sentence ends, then at spaces.
+    """
+    if len(line) <= limit:
+        return [line]
+    pieces = []
+    for sentence in _SENTENCE_END.split(line):
+        while len(sentence) > limit:
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def pack_lines(body: str, limit: int = CHUNK_CHARS) -> List[str]:
+    chunks, current = [], ""
+    for line in body.splitlines():
+        for piece in _pieces(line.strip(), limit):
+            if not piece:
+                continue
+            if current and len(current) + 1 + len(piece) > limit:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_documents(documents: List[Document], chunk_chars: int = CHUNK_CHARS) -> Tuple[List[Document], List[Document]]:
+    """
+    Returns (children, parents). Each child's metadata has the position of its
+    parent in `parents` under "parent".
+    """
+    children, parents = [], []
+    for doc in documents:
+        for section in split_sections(doc.page_content):
+            heading = section.heading
+            metadata = {**doc.metadata, "section": heading}
+            parent_id = len(parents)
+            parents.append(Document(page_content=f"{heading}\n{section.body}" if heading else section.body,
+                                    metadata=metadata))
+            for chunk in pack_lines(section.body, chunk_chars):
+                children.append(Document(page_content=f"{heading}\n{chunk}" if heading else chunk,
+                                         metadata={**metadata, "parent": parent_id}))
+    return children, parents
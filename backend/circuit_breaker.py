@@ -0,0 +1,178 @@
+"""
+Circuit breakers for external dependencies (Gemini, YouTube).
+
+Each breaker watches the outcomes of recent calls in a sliding window. When enough
+calls fail, or enough are rate limited (429 / quota exhausted), it opens and callers
+fail fast to their degraded behaviour instead of waiting on retries. After
+`open_seconds` it lets a few probe calls through (half-open); a successful probe
+closes it again, a failed one re-opens it for twice as long (up to
+`max_open_seconds`). A probe that never reports back (its caller was cancelled)
+gives its place up after `open_seconds`.
+
+Thresholds can be tuned per dependency with environment variables, e.g.
+CIRCUIT_GEMINI_FAILURE_RATE, CIRCUIT_GEMINI_OPEN_SECONDS, CIRCUIT_YOUTUBE_MIN_CALLS.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = metrics.registry.gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).", ("dependency",)
+)
+BREAKER_TRANSITIONS = metrics.registry.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes.", ("dependency", "state")
+)
+BREAKER_REJECTIONS = metrics.registry.counter(
+    "circuit_breaker_rejections_total", "Calls short-circuited by an open breaker.", ("dependency",)
+)
+
+
+def _env(name: str, setting: str, default: float) -> float:
+    return float(os.getenv(f"CIRCUIT_{name.upper()}_{setting}", default))
+
+
+class CircuitBreaker:
+    """
+    Sliding-window circuit breaker. Call `allow()` before the dependency call and
+    `record_success()` / `record_failure(rate_limited=...)` after it.
+    """
+    def __init__(self, name: str, failure_rate: float = 0.5, rate_limit_rate: float = 0.2,
+                 min_calls: int = 5, window_seconds: float = 60.0, open_seconds: float = 30.0,
+                 max_open_seconds: float = 300.0, half_open_calls: int = 1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0
+        self._probes = deque()  # lease expiry times of half-open probes in flight
+        self._calls = deque()  # (timestamp, outcome) with outcome in success/error/rate_limited
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(0, dependency=name)
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "CircuitBreaker":
+        settings = {
+            "failure_rate": ("FAILURE_RATE", 0.5), "rate_limit_rate": ("RATE_LIMIT_RATE", 0.2),
+            "min_calls": ("MIN_CALLS", 5), "window_seconds": ("WINDOW_SECONDS", 60.0),
+            "open_seconds": ("OPEN_SECONDS", 30.0), "max_open_seconds": ("MAX_OPEN_SECONDS", 300.0),
+        }
+        kwargs = {key: _env(name, env_name, defaults.get(key, default))
+                  for key, (env_name, default) in settings.items()}
+        kwargs["min_calls"] = int(kwargs["min_calls"])
+        return cls(name, **kwargs)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        BREAKER_STATE.set(_STATE_VALUES[state], dependency=self.name)
+        BREAKER_TRANSITIONS.inc(dependency=self.name, state=state)
+        print(f"Warning: Circuit breaker '{self.name}' is now {state}")
+
+    def retry_after(self) -> float:
+        if self.state == HALF_OPEN and len(self._probes) >= self.half_open_calls:
+            return max(0.0, self._probes[0] - time.monotonic())  # until the oldest probe's lease runs out
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        True if a call may go ahead. Moves an expired open breaker to half-open.
+        """
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._transition(HALF_OPEN)
+                self._probes.clear()
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN:
+                now = time.monotonic()
+                while self._probes and self._probes[0] <= now:
+                    self._probes.popleft()
+                if len(self._probes) < self.half_open_calls:
+                    self._probes.append(now + self.open_seconds)
+                    return True
+        BREAKER_REJECTIONS.inc(dependency=self.name)
+        return False
+
+    def is_open(self) -> bool:
+        return self.state == OPEN and self.retry_after() > 0
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._calls.clear()
+                self.open_seconds = self.base_open_seconds
+                self._transition(CLOSED)
+                return
+            self._append("success")
+
+    def record_failure(self, rate_limited: bool = False):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open(min(self.open_seconds * 2, self.max_open_seconds))
+                return
+            self._append("rate_limited" if rate_limited else "error")
+            calls = len(self._calls)
+            if calls < self.min_calls or self.state == OPEN:
+                return
+            failures = sum(1 for _, outcome in self._calls if outcome != "success")
+            limited = sum(1 for _, outcome in self._calls if outcome == "rate_limited")
+            if failures / calls >= self.failure_rate or limited / calls >= self.rate_limit_rate:
+                self._open(self.base_open_seconds)
+
+    def _open(self, seconds: float):
+        self.open_seconds = seconds
+        self.opened_at = time.monotonic()
+        self._calls.clear()
+        self._transition(OPEN)
+
+    def _append(self, outcome: str):
+        now = time.monotonic()
+        self._calls.append((now, outcome))
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self.open_seconds = self.base_open_seconds
+            self._transition(CLOSED)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            calls = list(self._calls)
+        return {
+            "state": self.state,
+            "retryAfterSeconds": round(self.retry_after(), 1),
+            "recentCalls": len(calls),
+            "recentFailures": sum(1 for _, outcome in calls if outcome == "error"),
+            "recentRateLimited": sum(1 for _, outcome in calls if outcome == "rate_limited"),
+        }
+
+
+gemini = CircuitBreaker.from_env("gemini")
+youtube = CircuitBreaker.from_env("youtube", rate_limit_rate=0.1)
+
+breakers = {"gemini": gemini, "youtube": youtube}
+
+
+def snapshot() -> Dict[str, Dict]:
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -0,0 +1,50 @@
+"""
+Shared setup for the backend tests: puts backend/ on the import path and
+provides the offline stand-ins from bench/ as fixtures.
+"""
+import os
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench.fake_gemini import FakeGeminiModel
+from bench.fake_mongo import FakeDatabase
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """
+    Installs a FakeGeminiModel as agent's model constructor. Call the fixture
+    with FakeGeminiModel options; it returns the fake, which counts its calls.
+    """
+    import agent
+
+    def install(**options) -> FakeGeminiModel:
+        model = FakeGeminiModel(**options)
+        monkeypatch.setattr(agent, "GenerativeModel", model)
+        return model
+
+    return install
+
+
+@pytest.fixture
+def fake_db(monkeypatch) -> FakeDatabase:
+    """
+    An empty FakeDatabase in place of MongoDB for the course modules, with a fresh
+    course search index and course cache so neither serves another test's courses.
+    """
+    import agent
+    import course_cache
+    import course_search
+    import module_library
+    import progress
+
+    db = FakeDatabase()
+    for module in (agent, course_search, module_library, progress):
+        monkeypatch.setattr(module, "db", db)
+    monkeypatch.setattr(course_search, "index", course_search.CourseSearchIndex())
+    monkeypatch.setattr(course_cache, "cache", course_cache.CourseCache())
+    return db
@@ -0,0 +1,321 @@
+"""
+Read-through cache for course documents.
+
+Courses are looked up by normalized title or by ID. The first layer is an
+in-process LRU bounded by entry count and by the approximate serialized size of
+the documents, with a TTL per entry. An optional shared layer (Redis, or a local
+stand-in for tests and benchmarks) lets several workers share what one of them
+loaded. Writes that replace or delete a course must call `invalidate`. With a
+shared layer, invalidating also bumps the course's version key there, and every
+local hit compares it with the version the entry was cached under, so other
+workers stop serving their copy at once (at the cost of one small shared read
+per hit). Without a shared layer there is only the one worker's cache.
+
+Each entry keeps the course's serialized JSON next to the document, so responses
+for cached courses are written without encoding them again (see `serialized`).
+
+Cached documents are shared between requests and must be treated as read-only.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+try:
+    import metrics
+    import serialization
+except ImportError:
+    from backend import metrics, serialization
+
+CACHE_REQUESTS = metrics.registry.counter(
+    "course_cache_requests_total", "Course cache lookups.", ("layer", "outcome")
+)
+CACHE_BYTES = metrics.registry.gauge(
+    "course_cache_bytes", "Approximate serialized size of courses held in the local cache."
+)
+
+
+def title_key(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+class LocalSharedBackend:
+    """
+    In-memory stand-in for a shared cache server. Values are bytes, as they would be
+    over the network; share one instance between caches to simulate several workers.
+    """
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._values.get(key)
+            if item and item[1] < time.monotonic():
+                del self._values[key]
+                item = None
+        return item[0] if item else None
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+
+class RedisSharedBackend:
+    """
+    Shared layer on Redis (needs the `redis` package).
+    """
+    def __init__(self, url: str, prefix: str = "nextrole:course:"):
+        import redis.asyncio as redis_asyncio
+
+        self._client = redis_asyncio.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*(self.prefix + k for k in keys))
+
+
+def shared_backend_from_env():
+    url = os.getenv("COURSE_CACHE_SHARED_URL", "")
+    if not url:
+        return None
+    if url == "local":
+        return LocalSharedBackend()
+    try:
+        return RedisSharedBackend(url)
+    except ImportError:
+        print("Warning: COURSE_CACHE_SHARED_URL is set but the redis package is not installed")
+        return None
+
+
+class CourseCache:
+    """
+    LRU + TTL cache of course documents keyed by ID, with normalized titles (and
+    other names a course was requested under) pointing at IDs.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 2000,
+                 ttl: float = 600.0, shared=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        # course ID -> (document, serialized JSON, expiry, shared version)
+        self._entries: "OrderedDict[str, Tuple[Dict, bytes, float, Optional[bytes]]]" = OrderedDict()
+        self._titles: Dict[str, str] = {}
+        self._keys_by_id: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Local layer -----------------------------------------------------------
+
+    def _get_local(self, course_id: str) -> Optional[Tuple]:
+        with self._lock:
+            entry = self._entries.get(course_id)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                self._drop(course_id)
+                return None
+            self._entries.move_to_end(course_id)
+            return entry
+
+    async def _get_current(self, course_id: str) -> Optional[Dict]:
+        """
+        The local copy of a course, unless another worker invalidated it since.
+        """
+        entry = self._get_local(course_id)
+        if entry is None:
+            return None
+        if self.shared and await self._version(course_id) != entry[3]:
+            with self._lock:
+                if self._entries.get(course_id) is entry:
+                    self._drop(course_id)
+            return None
+        return entry[0]
+
+    def _put_local(self, course: Dict, encoded: bytes, names=(), version: Optional[bytes] = None):
+        course_id = str(course["_id"])
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(course_id)
+            self._entries[course_id] = (course, encoded, time.monotonic() + self.ttl, version)
+            self._bytes += len(encoded)
+            keys = self._keys_by_id.setdefault(course_id, set())
+            for name in (course.get("title"), *names):
+                if name:
+                    self._titles[title_key(name)] = course_id
+                    keys.add(title_key(name))
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._drop(next(iter(self._entries)))
+            CACHE_BYTES.set(self._bytes)
+
+    def _drop(self, course_id: str):
+        entry = self._entries.pop(course_id, None)
+        if entry:
+            self._bytes -= len(entry[1])
+        for key in self._keys_by_id.pop(course_id, ()):
+            if self._titles.get(key) == course_id:
+                del self._titles[key]
+        CACHE_BYTES.set(self._bytes)
+
+    # Public API ------------------------------------------------------------
+
+    async def get_by_id(self, course_id: str) -> Optional[Dict]:
+        course = await self._get_current(str(course_id))
+        if course is not None:
+            self._count("local", "hit")
+            return course
+        self._count("local", "miss")
+        if self.shared:
+            return await self._get_shared(str(course_id))
+        return None
+
+    async def get_by_title(self, title: str) -> Optional[Dict]:
+        key = title_key(title)
+        course_id = self._titles.get(key)
+        course = await self._get_current(course_id) if course_id else None
+        if course is not None:
+            self._count("local", "hit")
+            return course
+        self._count("local", "miss")
+        if self.shared:
+            return await self._get_shared(title=key, names=(title,))
+        return None
+
+    async def _get_shared(self, course_id: str = None, title: str = None, names=()) -> Optional[Dict]:
+        value = version = None
+        try:
+            if title:
+                course_id = await self.shared.get(f"title:{title}")
+                course_id = course_id.decode() if course_id else None
+            if course_id:
+                # Version before document: if the course is invalidated in between,
+                # the entry is caught as stale on its next hit.
+                version = await self.shared.get(f"version:{course_id}")
+                value = await self.shared.get(f"id:{course_id}")
+        except Exception as e:
+            print(f"Warning: Shared course cache read failed: {e}")
+            value = None
+        if not value:
+            self._count("shared", "miss")
+            return None
+        self._count("shared", "hit")
+        course = serialization.loads(value)
+        self._put_local(course, bytes(value), names, version)
+        return course
+
+    async def _version(self, course_id: str) -> Optional[bytes]:
+        try:
+            return await self.shared.get(f"version:{course_id}")
+        except Exception as e:
+            print(f"Warning: Shared course cache read failed: {e}")
+            return None
+
+    async def put(self, course: Dict, *names: str):
+        """
+        Caches a course under `str(course["_id"])`. `names` are extra
+        titles the course should be found under, e.g. the title a user asked for.
+        """
+        if "_id" not in course:
+            return
+        encoded = serialization.dumps(course)
+        course_id = str(course["_id"])
+        self._put_local(course, encoded, names, await self._version(course_id) if self.shared else None)
+        if self.shared:
+            try:
+                await self.shared.set(f"id:{course_id}", encoded, self.ttl)
+                for name in (course.get("title"), *names):
+                    if name:
+                        await self.shared.set(f"title:{title_key(name)}", course_id.encode(), self.ttl)
+            except Exception as e:
+                print(f"Warning: Shared course cache write failed: {e}")
+
+    async def invalidate(self, course_id: str = None, title: str = None):
+        """
+        Removes a course (by ID, by title, or both) from every layer, and from
+        other workers' local layers through its shared version key.
+        """
+        keys = set()
+        with self._lock:
+            if title and not course_id:
+                course_id = self._titles.get(title_key(title))
+            if course_id:
+                keys.update(f"title:{k}" for k in self._keys_by_id.get(str(course_id), ()))
+                self._drop(str(course_id))
+            if title:
+                self._titles.pop(title_key(title), None)
+                keys.add(f"title:{title_key(title)}")
+        if course_id:
+            keys.add(f"id:{course_id}")
+        if self.shared and keys:
+            try:
+                await self.shared.delete(*keys)
+                if course_id:
+                    await self.shared.set(f"version:{course_id}", uuid.uuid4().hex.encode(), self.ttl)
+            except Exception as e:
+                print(f"Warning: Shared course cache invalidation failed: {e}")
+
+    def serialized(self, course: Dict) -> Optional[bytes]:
+        """
+        JSON bytes of `course` if this exact document object is cached, else None.
+        """
+        entry = self._entries.get(str(course.get("_id")))
+        return entry[1] if entry is not None and entry[0] is course else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._titles.clear()
+            self._keys_by_id.clear()
+            self._bytes = 0
+            CACHE_BYTES.set(0)
+
+    def _count(self, layer: str, outcome: str):
+        CACHE_REQUESTS.inc(layer=layer, outcome=outcome)
+        if layer == "local":
+            if outcome == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "titles": len(self._titles),
+            "bytes": self._bytes,
+            "maxBytes": self.max_bytes,
+            "ttlSeconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": type(self.shared).__name__ if self.shared else None,
+        }
+
+
+ENABLED = os.getenv("COURSE_CACHE_ENABLED", "1") != "0"
+
+cache = CourseCache(
+    max_bytes=int(os.getenv("COURSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    max_entries=int(os.getenv("COURSE_CACHE_MAX_ENTRIES", "2000")),
+    ttl=float(os.getenv("COURSE_CACHE_TTL_SECONDS", "600")),
+    shared=shared_backend_from_env(),
+)
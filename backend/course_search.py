@@ -0,0 +1,219 @@
+"""
+Search over generated catalog courses.
+
+Titles are reduced to canonical terms (skill aliases, plural stripping and level
+synonyms such as "intro"/"basics" -> beginner) and kept in a local inverted index;
+each title also gets a character-trigram embedding so near-identical or misspelt
+titles are found by nearest-neighbour search. `find_close_match` lets the course
+endpoint serve "Python Basics" when "Intro to Python" is requested instead of
+generating a duplicate.
+
+The index lives in process memory, is built from MongoDB on first use and is
+refreshed every COURSE_SEARCH_REFRESH_SECONDS so courses created by other workers
+show up too. Per-user upskilling courses are not indexed.
+"""
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+try:
+    from db import db
+    import skill_matcher
+except ImportError:
+    from backend.db import db
+    from backend import skill_matcher
+
+ENABLED = os.getenv("COURSE_SEARCH_ENABLED", "1") != "0"
+# Minimum combined score for an existing course to replace a generation request.
+MATCH_THRESHOLD = float(os.getenv("COURSE_MATCH_THRESHOLD", "0.8"))
+REFRESH_SECONDS = float(os.getenv("COURSE_SEARCH_REFRESH_SECONDS", "300"))
+NEIGHBOURS = 20
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "for", "in", "on", "with", "your", "you", "how",
+    "course", "guide", "complete", "comprehensive", "learn", "learning", "tutorial",
+}
+_LEVELS = {
+    "intro": "level:beginner", "introduction": "level:beginner", "introductory": "level:beginner",
+    "basic": "level:beginner", "basics": "level:beginner", "beginner": "level:beginner",
+    "beginners": "level:beginner", "fundamental": "level:beginner", "fundamentals": "level:beginner",
+    "foundations": "level:beginner", "essentials": "level:beginner", "101": "level:beginner",
+    "advanced": "level:advanced", "mastering": "level:advanced", "master": "level:advanced",
+    "expert": "level:advanced", "intermediate": "level:intermediate",
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def title_terms(title: str) -> List[str]:
+    """
+    Canonical search terms of a title: "Intro to React.js" -> ["level:beginner", "react"].
+    """
+    words = [w.strip(".") for w in re.findall(r"[\w+#.]+", title.lower())]
+    words = [w for w in words if w]
+    alias_index = skill_matcher.matcher.alias_index
+    terms, i = [], 0
+    while i < len(words):
+        pair = f"{words[i]} {words[i + 1]}" if i + 1 < len(words) else None
+        if pair and pair in alias_index:
+            terms.append(alias_index[pair])
+            i += 2
+            continue
+        word = words[i]
+        i += 1
+        if word in _LEVELS:
+            terms.append(_LEVELS[word])
+        elif word in alias_index:
+            terms.append(alias_index[word])
+        elif word not in _STOPWORDS:
+            terms.append(skill_matcher.matcher.canonical(_stem(word)))
+    return list(dict.fromkeys(terms))
+
+
+def _key_text(terms: List[str]) -> str:
+    return " ".join(sorted(t for t in terms if not t.startswith("level:")))
+
+
+class CourseSearchIndex:
+    """
+    Inverted index plus embedding matrix over course titles.
+    """
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.docs: Dict[str, Dict] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self._ids: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, course: Dict):
+        """
+        Indexes (or re-indexes) a course document. Courses owned by a user are skipped.
+        """
+        if not course.get("title") or course.get("userId") or "_id" not in course:
+            return
+        course_id = str(course["_id"])
+        self.remove(course_id)
+        terms = title_terms(course["title"])
+        self.docs[course_id] = {
+            "_id": course_id,
+            "title": course["title"],
+            "description": course.get("description", ""),
+            "category": course.get("category", ""),
+            "terms": terms,
+            "vector": skill_matcher.trigram_embedding(_key_text(terms) or course["title"].lower()),
+        }
+        for term in terms:
+            self.postings.setdefault(term, set()).add(course_id)
+        self._matrix = None
+
+    def remove(self, course_id: str):
+        doc = self.docs.pop(str(course_id), None)
+        if not doc:
+            return
+        for term in doc["terms"]:
+            ids = self.postings.get(term)
+            if ids:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self.postings[term]
+        self._matrix = None
+
+    async def ensure_loaded(self, force: bool = False):
+        """
+        (Re)builds the index from the courses collection when it is missing or stale.
+        """
+        if not db:
+            return
+        if not force and self._loaded_at and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if not force and self._loaded_at and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            cursor = db.courses.find({"userId": {"$exists": False}},
+                                     {"title": 1, "description": 1, "category": 1})
+            courses = await cursor.to_list(length=None)
+            self.docs.clear()
+            self.postings.clear()
+            for course in courses:
+                self.add(course)
+            self._loaded_at = time.monotonic()
+            print(f"DEBUG: Course search index loaded with {len(self.docs)} courses")
+
+    def _embeddings(self) -> np.ndarray:
+        if self._matrix is None:
+            self._ids = list(self.docs)
+            self._matrix = (np.stack([self.docs[i]["vector"] for i in self._ids])
+                            if self._ids else np.zeros((0, skill_matcher.EMBEDDING_DIM), dtype=np.float32))
+        return self._matrix
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Ranks courses by 0.5 * term overlap (Jaccard) + 0.5 * embedding cosine similarity.
+        Candidates are the union of inverted-index hits and the embedding neighbours.
+        """
+        terms = title_terms(query)
+        if not terms or not self.docs:
+            return []
+        matrix = self._embeddings()
+        similarities = matrix @ skill_matcher.trigram_embedding(_key_text(terms) or query.lower())
+        candidates = {i for term in terms for i in self.postings.get(term, ())}
+        if len(self._ids) > NEIGHBOURS:
+            nearest = np.argpartition(-similarities, NEIGHBOURS)[:NEIGHBOURS]
+        else:
+            nearest = range(len(self._ids))
+        candidates.update(self._ids[i] for i in nearest)
+        position = {course_id: i for i, course_id in enumerate(self._ids)}
+
+        query_terms = set(terms)
+        results = []
+        for course_id in candidates:
+            doc = self.docs[course_id]
+            doc_terms = set(doc["terms"])
+            overlap = len(query_terms & doc_terms) / len(query_terms | doc_terms) if doc_terms else 0.0
+            score = 0.5 * overlap + 0.5 * max(0.0, float(similarities[position[course_id]]))
+            results.append({"_id": course_id, "title": doc["title"], "description": doc["description"],
+                            "category": doc["category"], "score": round(score, 4)})
+        results.sort(key=lambda r: (-r["score"], r["title"]))
+        return results[:limit]
+
+    def find_close_match(self, query: str, threshold: float = None) -> Optional[Dict]:
+        """
+        Best existing course if it is close enough to stand in for `query`.
+        """
+        results = self.search(query, limit=1)
+        threshold = MATCH_THRESHOLD if threshold is None else threshold
+        if results and results[0]["score"] >= threshold:
+            return results[0]
+        return None
+
+
+index = CourseSearchIndex()
+
+
+async def search_courses(query: str, limit: int = 10) -> List[Dict]:
+    await index.ensure_loaded()
+    return index.search(query, limit)
+
+
+async def find_close_match(query: str) -> Optional[Dict]:
+    if not ENABLED:
+        return None
+    try:
+        await index.ensure_loaded()
+        return index.find_close_match(query)
+    except Exception as e:
+        print(f"Warning: Course search failed: {e}")
+        return None
@@ -1,33 +1,160 @@
 import os
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
 
+try:
+    from metrics import MongoCommandMetrics, MongoPoolMetrics
+    from profiling import MongoProfileListener
+except ImportError:
+    from backend.metrics import MongoCommandMetrics, MongoPoolMetrics
+    from backend.profiling import MongoProfileListener
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env.local")
 
 MONGODB_URI = os.getenv("MONGODB_URI")
 
-client = None
+# Serverless containers (Vercel) serve one request at a time, so a large pool only
+# multiplies TLS handshakes on cold start. Long-running uvicorn workers keep the
+# driver default unless MONGODB_MAX_POOL_SIZE says otherwise.
+IS_SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+
+pool_metrics = MongoPoolMetrics()
+
+_client = None
+_client_pid = None
+
+
+def _int_env(name: str, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def client_options() -> dict:
+    """
+    Builds the Motor client keyword arguments from MONGODB_* environment variables.
+    """
+    options = {
+        "maxPoolSize": _int_env("MONGODB_MAX_POOL_SIZE", 10 if IS_SERVERLESS else 100),
+        "minPoolSize": _int_env("MONGODB_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env("MONGODB_MAX_IDLE_TIME_MS", 300000),
+        "connectTimeoutMS": _int_env("MONGODB_CONNECT_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _int_env("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "waitQueueTimeoutMS": _int_env("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 10000),
+        "appname": os.getenv("MONGODB_APP_NAME", "nextrole-backend"),
+    }
+    socket_timeout = _int_env("MONGODB_SOCKET_TIMEOUT_MS")
+    if socket_timeout is not None:
+        options["socketTimeoutMS"] = socket_timeout
+    compressors = os.getenv("MONGODB_COMPRESSORS")  # e.g. "zstd,zlib"
+    if compressors:
+        options["compressors"] = compressors
+    read_preference = os.getenv("MONGODB_READ_PREFERENCE")  # e.g. "secondaryPreferred"
+    if read_preference:
+        options["readPreference"] = read_preference
+    return options
+
+
+def get_client():
+    """
+    Returns the process-wide Motor client, creating it on first use.
+
+    The client lives in a module global so warm serverless invocations reuse the
+    already-resolved SRV records and open TLS connections. A forked worker gets a
+    fresh client, since pymongo clients must not be shared across fork().
+    """
+    global _client, _client_pid
+    if not MONGODB_URI:
+        return None
+    if _client is None or _client_pid != os.getpid():
+        _client = AsyncIOMotorClient(
+            MONGODB_URI, event_listeners=[MongoCommandMetrics(), MongoProfileListener(), pool_metrics], **client_options()
+        )
+        _client_pid = os.getpid()
+    return _client
+
+
+class DatabaseProxy:
+    """
+    Stands in for the Motor database object so modules can keep doing
+    `from db import db` while the underlying client is created lazily, and closed
+    and recreated by the lifespan handler or after a fork.
+    """
+    def _database(self):
+        return get_client().get_database()  # Uses the database name from the URI
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"DatabaseProxy({MONGODB_URI and MONGODB_URI.split('@')[-1]!r})"
+
+
 db = None
 
 if MONGODB_URI:
-    try:
-        client = AsyncIOMotorClient(MONGODB_URI)
-        db = client.get_database() # Uses the database name from the URI
-    except Exception as e:
-        print(f"Warning: Failed to connect to MongoDB: {e}")
+    db = DatabaseProxy()
 else:
     print("Warning: MONGODB_URI is not set in environment variables. Database features will be unavailable.")
 
+
+async def warm_up(connections: int = None):
+    """
+    Opens connections ahead of the first request: one ping resolves SRV records and
+    selects a server, then concurrent pings fill the pool up to `connections`.
+    """
+    client = get_client()
+    if client is None:
+        return
+    if connections is None:
+        connections = _int_env("MONGODB_WARMUP_CONNECTIONS", 1 if IS_SERVERLESS else 4)
+    try:
+        await client.admin.command("ping")
+        if connections > 1:
+            await asyncio.gather(*(client.admin.command("ping") for _ in range(connections - 1)))
+        print(f"DEBUG: MongoDB warm-up done ({pool_metrics.snapshot()['openConnections']} connections open)")
+    except Exception as e:
+        print(f"Warning: MongoDB warm-up failed: {e}")
+
+
+def close_client():
+    global _client, _client_pid
+    if _client is not None:
+        _client.close()
+    _client = None
+    _client_pid = None
+
+
+def pool_stats() -> dict:
+    options = client_options()
+    return {
+        "configured": bool(MONGODB_URI),
+        "serverless": IS_SERVERLESS,
+        "maxPoolSize": options["maxPoolSize"],
+        "minPoolSize": options["minPoolSize"],
+        "compressors": options.get("compressors"),
+        "readPreference": options.get("readPreference", "primary"),
+        **pool_metrics.snapshot(),
+    }
+
+
 # Test connection
 async def test_connection():
     try:
-        await client.admin.command('ping')
+        await get_client().admin.command('ping')
         print("Pinged your deployment. You successfully connected to MongoDB!")
     except Exception as e:
         print(e)
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(test_connection())
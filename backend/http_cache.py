@@ -0,0 +1,235 @@
+"""
+HTTP caching and compression for API responses.
+
+`HTTPCacheMiddleware` is a pure ASGI middleware that, for complete (non-streamed)
+responses:
+
+- adds a `Cache-Control` header chosen by route template (see CACHE_POLICIES)
+  unless the endpoint set one itself,
+- adds a content-hash `ETag` to successful GET responses and answers a matching
+  `If-None-Match` with `304 Not Modified`,
+- compresses large text/JSON bodies with brotli (when the optional `brotli`
+  package is installed) or gzip, according to `Accept-Encoding`.
+
+Streamed responses (for example NDJSON) pass through untouched apart from the
+Cache-Control header. Compressed bodies of hot responses are kept in a small LRU
+keyed by ETag so popular courses are compressed once.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Route template -> Cache-Control. Course content may include the caller's progress,
+# so it is private and always revalidated (cheap thanks to ETags).
+CACHE_POLICIES: Dict[str, str] = {
+    "/api/get-course-content": "private, no-cache",
+    "/api/courses/content": "private, no-cache",
+    "/api/recommendations": "private, max-age=300",
+    "/api/courses/search": "public, max-age=60",
+    "/api/progress": "private, no-cache",
+    "/api/progress/{course_id}": "private, no-cache",
+    "/api/courses/{course_id}/completion": "private, no-cache",
+    "/api/health": "no-store",
+    "/metrics": "no-store",
+    "/api/debug/loop": "no-store",
+    "/api/debug/db": "no-store",
+    "/api/debug/cache": "no-store",
+    "/api/debug/models": "no-store",
+    "/api/debug/admission": "no-store",
+    "/api/debug/profiles": "no-store",
+    "/api/debug/profiles/{profile_id}": "no-store",
+    "/api/debug/rag": "no-store",
+    "/api/admin/rag/reload": "no-store",
+}
+
+MIN_COMPRESS_BYTES = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+COMPRESSED_CACHE_ENTRIES = int(os.getenv("HTTP_COMPRESSED_CACHE_ENTRIES", "256"))
+
+_COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+_ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _strip_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in _ENCODING_SUFFIX.values():
+        if tag.endswith(suffix + '"'):
+            return tag[: -len(suffix) - 1] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header value against `etag`.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(_strip_tag(tag) == etag for tag in if_none_match.split(",") if tag.strip())
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks br or gzip from an Accept-Encoding header, honouring q=0.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _CompressedCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: Optional[str], body: bytes, encoding: str) -> bytes:
+        if not etag or not self.max_entries:
+            return compress(body, encoding)
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is not None:
+                self._items.move_to_end(key)
+                return cached
+        compressed = compress(body, encoding)
+        with self._lock:
+            self._items[key] = compressed
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return compressed
+
+
+compressed_cache = _CompressedCache(COMPRESSED_CACHE_ENTRIES)
+
+
+def _header(headers: Iterable[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class HTTPCacheMiddleware:
+    """
+    Pure ASGI middleware adding Cache-Control, ETag/304 and response compression.
+    """
+    def __init__(self, app, policies: Dict[str, str] = None, min_size: int = MIN_COMPRESS_BYTES):
+        self.app = app
+        self.policies = CACHE_POLICIES if policies is None else policies
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers", [])
+        method = scope.get("method", "GET")
+        state = {"start": None, "body": [], "passthrough": False}
+
+        async def send_wrapper(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            state["body"].append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streaming response: send what we have and stop buffering.
+                state["passthrough"] = True
+                await send(self._with_policy(scope, state["start"]))
+                await send({"type": "http.response.body", "body": b"".join(state["body"]), "more_body": True})
+                return
+            for outgoing in self._finish(scope, method, request_headers, state["start"], b"".join(state["body"])):
+                await send(outgoing)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _policy(self, scope) -> Optional[str]:
+        route = scope.get("route")
+        path = getattr(route, "path", None)
+        return self.policies.get(path) if path else None
+
+    def _with_policy(self, scope, start):
+        headers = list(start.get("headers", []))
+        policy = self._policy(scope)
+        if policy and _header(headers, b"cache-control") is None:
+            headers.append((b"cache-control", policy.encode()))
+        return {**start, "headers": headers}
+
+    def _finish(self, scope, method: str, request_headers, start, body: bytes) -> List[Dict]:
+        start = self._with_policy(scope, start)
+        if method == "HEAD":
+            return [start, {"type": "http.response.body", "body": body}]
+        headers = [h for h in start["headers"] if h[0].lower() != b"content-length"]
+        status = start["status"]
+        policy = _header(headers, b"cache-control") or ""
+
+        etag = _header(headers, b"etag")
+        if etag is None and status == 200 and method == "GET" and "no-store" not in policy:
+            etag = content_etag(body)
+            headers.append((b"etag", etag.encode()))
+        if etag and method == "GET" and status == 200:
+            if_none_match = _header(request_headers, b"if-none-match")
+            if if_none_match and etag_matches(if_none_match, etag):
+                kept = [h for h in headers if h[0].lower() in (b"etag", b"cache-control", b"vary", b"date")]
+                return [{"type": "http.response.start", "status": 304, "headers": kept},
+                        {"type": "http.response.body", "body": b""}]
+
+        content_type = _header(headers, b"content-type") or ""
+        if (len(body) >= self.min_size and status not in (204, 304)
+                and _header(headers, b"content-encoding") is None
+                and content_type.startswith(_COMPRESSIBLE)):
+            encoding = choose_encoding(_header(request_headers, b"accept-encoding") or "")
+            if encoding:
+                body = compressed_cache.get_or_compress(etag, body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+                if etag:
+                    tagged = etag[:-1] + _ENCODING_SUFFIX[encoding] + '"'
+                    headers = [(k, tagged.encode()) if k.lower() == b"etag" else (k, v) for k, v in headers]
+            vary = _header(headers, b"vary")
+            if vary is None:
+                headers.append((b"vary", b"Accept-Encoding"))
+            elif "accept-encoding" not in vary.lower():
+                headers = [(k, (v.decode() + ", Accept-Encoding").encode()) if k.lower() == b"vary" else (k, v)
+                           for k, v in headers]
+
+        headers.append((b"content-length", str(len(body)).encode()))
+        return [{**start, "headers": headers}, {"type": "http.response.body", "body": body}]
@@ -0,0 +1,209 @@
+"""
+Opt-in event-loop watchdog.
+
+A heartbeat coroutine measures how late the event loop wakes it up (loop lag). A
+separate watchdog thread checks that heartbeat; when the loop has not ticked for
+longer than the stall threshold it samples the loop thread's stack, so the code
+that is blocking the loop (sync SDK calls, heavy JSON work, ...) shows up in the
+report together with the endpoint whose task was running at that moment.
+
+Enable with LOOP_MONITOR_ENABLED=1. Results are exposed on /api/debug/loop and
+logged as warnings.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter as _Counter, deque
+from typing import Dict, List, Optional
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+LOOP_LAG = metrics.registry.histogram(
+    "event_loop_lag_seconds", "Delay between a heartbeat's scheduled and actual wake-up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = metrics.registry.counter(
+    "event_loop_stalls_total", "Event-loop stalls longer than the configured threshold.", ("route",)
+)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and captures stack samples while the loop is stalled.
+    """
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.25,
+                 max_stalls: int = 50, max_samples_per_stall: int = 10, stack_depth: int = 20):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.max_samples_per_stall = max_samples_per_stall
+        self.stack_depth = stack_depth
+        self.stalls = deque(maxlen=max_stalls)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._last_tick = time.perf_counter()
+        self._current_stall: Optional[Dict] = None
+        self._task_scopes = weakref.WeakKeyDictionary()
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        return cls(
+            interval=float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1")),
+            stall_threshold=float(os.getenv("LOOP_MONITOR_STALL_THRESHOLD", "0.25")),
+            max_stalls=int(os.getenv("LOOP_MONITOR_MAX_STALLS", "50")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self):
+        """
+        Starts the heartbeat on the running loop and the watchdog thread.
+        """
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.perf_counter()
+        self._stop_event.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._watchdog_thread = threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True)
+        self._watchdog_thread.start()
+        print(f"DEBUG: Loop monitor started (interval={self.interval}s, threshold={self.stall_threshold}s)")
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._watchdog_thread:
+            self._watchdog_thread.join(timeout=1)
+            self._watchdog_thread = None
+
+    def track_task(self, scope: Dict):
+        """
+        Associates the current task with the ASGI scope it is serving, so stalls can
+        be attributed to an endpoint.
+        """
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_scopes[task] = scope
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+            with self._lock:
+                self._last_tick = now
+                stall = self._current_stall
+                self._current_stall = None
+            if stall is not None:
+                self._finish_stall(stall, lag)
+
+    def _watchdog(self):
+        poll = max(self.interval / 2, 0.01)
+        while not self._stop_event.wait(poll):
+            with self._lock:
+                blocked_for = time.perf_counter() - self._last_tick - self.interval
+                if blocked_for < self.stall_threshold:
+                    continue
+                if self._current_stall is None:
+                    self._current_stall = {
+                        "startedAt": time.time() - blocked_for,
+                        "route": self._current_route(),
+                        "samples": _Counter(),
+                    }
+                stall = self._current_stall
+            if sum(stall["samples"].values()) < self.max_samples_per_stall:
+                stack = self._sample_loop_stack()
+                if stack:
+                    stall["samples"][stack] += 1
+
+    def _current_route(self) -> str:
+        task = asyncio.current_task(self._loop) if self._loop else None
+        scope = self._task_scopes.get(task) if task is not None else None
+        if scope is None:
+            return "background"
+        route = scope.get("route")
+        return getattr(route, "path", None) or scope.get("path", "unknown")
+
+    def _sample_loop_stack(self) -> Optional[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return "".join(traceback.format_stack(frame, limit=self.stack_depth))
+
+    def _finish_stall(self, stall: Dict, lag: float):
+        samples = [{"count": count, "stack": stack} for stack, count in stall["samples"].most_common()]
+        record = {
+            "startedAt": stall["startedAt"],
+            "durationSeconds": round(lag + self.interval, 4),
+            "route": stall["route"],
+            "samples": samples,
+        }
+        self.stalls.append(record)
+        LOOP_STALLS.inc(route=stall["route"])
+        top_frame = samples[0]["stack"].strip().splitlines()[-2:] if samples else []
+        print(f"Warning: Event loop blocked for {record['durationSeconds']}s during {stall['route']}: {' | '.join(l.strip() for l in top_frame)}")
+
+    def report(self) -> Dict:
+        stalls: List[Dict] = list(self.stalls)
+        by_route = _Counter(s["route"] for s in stalls)
+        return {
+            "enabled": True,
+            "running": self.running,
+            "intervalSeconds": self.interval,
+            "stallThresholdSeconds": self.stall_threshold,
+            "lastLagSeconds": round(self.last_lag, 4),
+            "maxLagSeconds": round(self.max_lag, 4),
+            "stallsByRoute": dict(by_route),
+            "stalls": stalls,
+        }
+
+
+class LoopMonitorMiddleware:
+    """
+    Pure ASGI middleware that tags the request task for stall attribution. It must run
+    in the same task as the endpoint, which is why BaseHTTPMiddleware isn't used.
+    """
+    def __init__(self, app, monitor: LoopMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.monitor.running:
+            self.monitor.track_task(scope)
+        await self.app(scope, receive, send)
+
+
+loop_monitor: Optional[LoopMonitor] = LoopMonitor.from_env() if _env_flag("LOOP_MONITOR_ENABLED") else None
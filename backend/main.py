@@ -1,5 +1,12 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import json
+import math
 from dotenv import load_dotenv
 import os
 from pathlib import Path
@@ -11,7 +18,42 @@ from bson import ObjectId
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env.local")
 
-app = FastAPI(root_path=os.getenv("ROOT_PATH", ""))
+try:
+    import metrics
+    from http_cache import HTTPCacheMiddleware
+    from loop_monitor import loop_monitor, LoopMonitorMiddleware
+    from profiling import profiles, ProfilingMiddleware
+except ImportError:
+    from backend import metrics
+    from backend.http_cache import HTTPCacheMiddleware
+    from backend.loop_monitor import loop_monitor, LoopMonitorMiddleware
+    from backend.profiling import profiles, ProfilingMiddleware
+
+try:
+    import db as db_module
+    from serialization import FastJSONResponse
+except ImportError:
+    from backend import db as db_module
+    from backend.serialization import FastJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if loop_monitor:
+        loop_monitor.start()
+    if os.getenv("MONGODB_WARMUP", "1") != "0":
+        await db_module.warm_up()
+    rag_poll_seconds = float(os.getenv("RAG_RELOAD_POLL_SECONDS", "30"))
+    rag_watcher = asyncio.create_task(rag_pool.watch(rag_poll_seconds)) if rag_poll_seconds > 0 else None
+    yield
+    if rag_watcher:
+        rag_watcher.cancel()
+    if loop_monitor:
+        await loop_monitor.stop()
+    # Serverless containers keep the client for the next warm invocation.
+    if not db_module.IS_SERVERLESS:
+        db_module.close_client()
+
+app = FastAPI(root_path=os.getenv("ROOT_PATH", ""), lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS configuration
 origins = [
@@ -27,15 +69,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(HTTPCacheMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+if loop_monitor:
+    app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+app.add_middleware(ProfilingMiddleware)
+
 # Import dependencies
 try:
-    from agent import get_recommendations_with_links, get_course_content, analyze_skill_gap, generate_upskilling_course
+    from agent import get_recommendations_with_links, get_course_content, get_course_by_id, analyze_skill_gap, generate_upskilling_course, resolve_skill_gap_mode
 except ImportError:
-    from backend.agent import get_recommendations_with_links, get_course_content, analyze_skill_gap, generate_upskilling_course
+    from backend.agent import get_recommendations_with_links, get_course_content, get_course_by_id, analyze_skill_gap, generate_upskilling_course, resolve_skill_gap_mode
 try:
     from db import db
 except ImportError:
     from backend.db import db
+try:
+    from bulk_skill_gap import analyze_skill_gap_bulk, resolve_mode as resolve_bulk_mode
+except ImportError:
+    from backend.bulk_skill_gap import analyze_skill_gap_bulk, resolve_mode as resolve_bulk_mode
+try:
+    import admission
+    import circuit_breaker
+    import course_cache
+    import course_search
+    import model_router
+    import progress
+except ImportError:
+    from backend import admission, circuit_breaker, course_cache, course_search, model_router, progress
 
 # Pydantic Models
 class RecommendationRequest(BaseModel):
@@ -43,16 +104,35 @@ class RecommendationRequest(BaseModel):
 
 class CourseContentRequest(BaseModel):
     course_name: str
+    userId: Optional[str] = None # Identify the learner to include their progress
+    email: Optional[str] = None
 
 class QuizSubmission(BaseModel):
     courseId: str
     moduleTitle: str
     answers: List[int] # Indices of selected options
+    userId: Optional[str] = None # Learner; defaults to the course owner for upskilling courses
+    email: Optional[str] = None
     
 class SkillGapRequest(BaseModel):
     employeeSkills: List[str]
     targetRole: str
     targetRoleSkills: List[str]
+    mode: Optional[str] = None # hybrid (default), fast or llm
+
+class BulkEmployee(BaseModel):
+    employeeId: str
+    skills: List[str]
+    targetRole: Optional[str] = None # Restricts the analysis to one of the target roles
+
+class BulkTargetRole(BaseModel):
+    role: str
+    skills: List[str]
+
+class BulkSkillGapRequest(BaseModel):
+    employees: List[BulkEmployee]
+    targetRoles: List[BulkTargetRole]
+    mode: Optional[str] = None # hybrid (default) or fast
 
 
 class UpskillingRequest(BaseModel):
@@ -66,13 +146,87 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
+    dependencies = circuit_breaker.snapshot()
+    status = "degraded" if any(d["state"] != "closed" for d in dependencies.values()) else "healthy"
     if not db:
-        return {"status": "healthy", "database": "disconnected"}
+        return {"status": status, "database": "disconnected", "dependencies": dependencies}
     try:
         await db.command('ping')
-        return {"status": "healthy", "database": "connected"}
+        return {"status": status, "database": "connected", "dependencies": dependencies}
     except Exception as e:
-        return {"status": "healthy", "database": "error", "details": str(e)}
+        return {"status": status, "database": "error", "details": str(e), "dependencies": dependencies}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Exposes process metrics in Prometheus text format.
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Dependency for admin and debug routes: the X-Admin-Token header must match
+    ADMIN_API_TOKEN. Without a configured token these routes are closed.
+    """
+    expected = os.getenv("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_TOKEN is not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/api/debug/loop", dependencies=[Depends(require_admin)])
+async def debug_loop():
+    """
+    Reports event-loop lag and recent stalls captured by the loop monitor.
+    """
+    if not loop_monitor:
+        return {"enabled": False, "message": "Set LOOP_MONITOR_ENABLED=1 to enable the loop monitor."}
+    return loop_monitor.report()
+
+@app.get("/api/debug/profiles", dependencies=[Depends(require_admin)])
+async def debug_profiles():
+    """
+    Lists captured slow requests and recent header-requested profiles (newest first).
+    """
+    return profiles.report()
+
+@app.get("/api/debug/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def debug_profile(profile_id: str):
+    """
+    One request's profile: phase totals, every span, and overlapping loop stalls.
+    """
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted)")
+    return profile
+
+@app.get("/api/debug/db", dependencies=[Depends(require_admin)])
+async def debug_db():
+    """
+    Reports MongoDB client settings and connection-pool wait statistics.
+    """
+    return db_module.pool_stats()
+
+@app.get("/api/debug/cache", dependencies=[Depends(require_admin)])
+async def debug_cache():
+    """
+    Reports course cache size and hit rate for this worker.
+    """
+    return course_cache.cache.stats()
+
+@app.get("/api/debug/models", dependencies=[Depends(require_admin)])
+async def debug_models():
+    """
+    Reports the model route of each call site with per-model latency, failures and cost.
+    """
+    return model_router.router.stats()
+
+@app.get("/api/debug/admission", dependencies=[Depends(require_admin)])
+async def debug_admission():
+    """
+    Reports each admission gate's limit, in-flight and queued requests and rejections.
+    """
+    return admission.snapshot()
 
 @app.get("/api/recommendations")
 async def get_recommendations(email: str):
@@ -103,6 +257,30 @@ async def get_recommendations(email: str):
     except Exception as e:
         return {"error": str(e)}
 
+def generation_error(result: dict) -> HTTPException:
+    """
+    503 (or the result's `status`, e.g. 429 from admission control) with Retry-After
+    while a dependency's circuit breaker is open or the worker is saturated, else 500.
+    """
+    if result.get("retryAfter") is not None:
+        return HTTPException(status_code=result.get("status", 503), detail=result["error"],
+                             headers={"Retry-After": str(max(1, math.ceil(result["retryAfter"])))})
+    return HTTPException(status_code=500, detail=result["error"])
+
+async def resolve_user_id(user_id: Optional[str], email: Optional[str], course: dict = None) -> Optional[str]:
+    """
+    Progress owner: explicit userId, then the user with `email`, then the course owner.
+    """
+    if user_id:
+        return user_id
+    if email:
+        user = await db.users.find_one({"email": email}, {"_id": 1})
+        if user:
+            return str(user["_id"])
+    if course and course.get("userId"):
+        return str(course["userId"])
+    return None
+
 @app.post("/api/get-course-content")
 async def api_get_course_content(request: CourseContentRequest):
     """
@@ -112,30 +290,45 @@ async def api_get_course_content(request: CourseContentRequest):
         print(f"DEBUG: Requesting content for course: {request.course_name}")
         content = await get_course_content(request.course_name)
         if "error" in content:
-            raise HTTPException(status_code=500, detail=content["error"])
-        return content
+            raise generation_error(content)
+        user_id = await resolve_user_id(request.userId, request.email, content)
+        if user_id:
+            content = progress.apply_progress(content, await progress.get_progress(user_id, str(content["_id"])))
+        # Cached courses carry their serialized JSON; send it without re-encoding.
+        return FastJSONResponse(course_cache.cache.serialized(content) or content)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in api_get_course_content: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/courses/content")
+async def api_get_course_content_cacheable(course_name: str, userId: Optional[str] = None, email: Optional[str] = None):
+    """
+    GET variant of /api/get-course-content, so browsers can revalidate with ETags.
+    """
+    return await api_get_course_content(CourseContentRequest(course_name=course_name, userId=userId, email=email))
+
 @app.post("/api/submit-quiz")
 async def submit_quiz(submission: QuizSubmission):
     """
-    Handles quiz submission, calculates score, and updates progress.
+    Handles quiz submission, calculates score, and updates the learner's progress.
+    The course document itself is never modified.
     """
     try:
         course_id = submission.courseId
         module_title = submission.moduleTitle
         user_answers = submission.answers
         
-        # Fetch course
-        try:
-            course = await db.courses.find_one({"_id": ObjectId(course_id)})
-        except:
-             course = await db.courses.find_one({"_id": course_id}) # Try as string if ObjectId fails
+        # Fetch course (served from the course cache when hot)
+        course = await get_course_by_id(course_id)
              
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
+
+        user_id = await resolve_user_id(submission.userId, submission.email, course)
+        if not user_id:
+            raise HTTPException(status_code=400, detail="userId or email is required to record progress")
             
         # Find the module
         module_index = -1
@@ -170,51 +363,66 @@ async def submit_quiz(submission: QuizSubmission):
         
         score_percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
         
-        # Update Module
-        target_module["moduleScore"] = score_percentage
-        target_module["isCompleted"] = True # Mark module as completed after quiz
-        
-        # Update Course in DB
-        # We need to update the specific module in the array
-        await db.courses.update_one(
-            {"_id": course["_id"]},
-            {"$set": {f"modules.{module_index}": target_module}}
+        # Record the result and check course completion in one atomic upsert
+        state = await progress.record_module_result(
+            user_id, str(course["_id"]), module_index, score_percentage, len(course["modules"])
         )
-        
-        # Check Course Completion
-        # Re-fetch to get latest state or just check in memory
-        all_modules_completed = all(m.get("isCompleted", False) or (i == module_index) for i, m in enumerate(course["modules"]))
-        
-        if all_modules_completed:
-            # Calculate total progress
-            total_score = 0
-            for i, m in enumerate(course["modules"]):
-                if i == module_index:
-                    total_score += score_percentage
-                else:
-                    total_score += m.get("moduleScore", 0)
-            
-            avg_score = total_score / len(course["modules"])
-            
-            await db.courses.update_one(
-                {"_id": course["_id"]},
-                {"$set": {
-                    "status": "completed",
-                    "totalProgress": avg_score
-                }}
-            )
             
         return {
             "message": "Quiz submitted successfully",
             "score": score_percentage,
             "correctCount": correct_count,
             "totalQuestions": total_questions,
-            "isCourseCompleted": all_modules_completed
+            "isCourseCompleted": state["status"] == "completed",
+            "totalProgress": state["totalProgress"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error submitting quiz: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+@app.get("/api/progress")
+async def api_user_progress(userId: Optional[str] = None, email: Optional[str] = None):
+    """
+    Completion of every course a user has started.
+    """
+    user_id = await resolve_user_id(userId, email)
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"userId": user_id, "courses": await progress.user_summary(user_id)}
+
+@app.get("/api/progress/{course_id}")
+async def api_course_progress(course_id: str, userId: Optional[str] = None, email: Optional[str] = None):
+    """
+    A user's progress document for one course.
+    """
+    user_id = await resolve_user_id(userId, email)
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    state = await progress.get_progress(user_id, course_id)
+    return state or {"userId": user_id, "courseId": course_id, "completedModules": [], "scores": {},
+                     "status": "active", "totalProgress": 0}
+
+@app.get("/api/courses/{course_id}/completion")
+async def api_course_completion(course_id: str):
+    """
+    Learner counts and average progress for a course.
+    """
+    return await progress.course_completion_stats(course_id)
+
+@app.get("/api/courses/search")
+async def api_search_courses(q: str, limit: int = 10):
+    """
+    Searches existing catalog courses by title (term overlap + embedding similarity).
+    """
+    try:
+        results = await course_search.search_courses(q, max(1, min(limit, 50)))
+        return {"query": q, "results": results}
+    except Exception as e:
+        print(f"Error searching courses: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/courses/{course_id}")
 async def delete_course(course_id: str):
     """
@@ -229,6 +437,9 @@ async def delete_course(course_id: str):
         result = await db.courses.delete_one(query)
         
         if result.deleted_count == 1:
+            course_search.index.remove(course_id)
+            await course_cache.cache.invalidate(course_id)
+            await progress.delete_course_progress(course_id)
             return {"message": "Course deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail="Course not found")
@@ -244,7 +455,11 @@ async def api_analyze_skill_gap(request: SkillGapRequest):
     Analyzes the skill gap between employee skills and target role.
     """
     try:
-        result = await analyze_skill_gap(request.employeeSkills, request.targetRole, request.targetRoleSkills)
+        resolve_skill_gap_mode(request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = await analyze_skill_gap(request.employeeSkills, request.targetRole, request.targetRoleSkills, request.mode)
         
         if not result or not isinstance(result, dict):
              raise HTTPException(status_code=500, detail="Invalid response from analysis agent")
@@ -252,10 +467,47 @@ async def api_analyze_skill_gap(request: SkillGapRequest):
         if "error" in result:
              raise HTTPException(status_code=500, detail=result["error"])
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in analyze-skill-gap: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/analyze-skill-gap/bulk")
+async def api_analyze_skill_gap_bulk(request: BulkSkillGapRequest):
+    """
+    Analyzes many employees against one or more target roles.
+    Streams newline-delimited JSON: one line per employee/role, then a summary line.
+    """
+    if not request.targetRoles:
+        raise HTTPException(status_code=400, detail="At least one target role is required")
+    try:
+        mode = resolve_bulk_mode(request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        slot = await admission.gates["bulk_skill_gap"].acquire(admission.BATCH)
+    except admission.Rejected as e:
+        raise generation_error(e.error())
+
+    async def stream():
+        try:
+            async for result in analyze_skill_gap_bulk(
+                [e.model_dump() for e in request.employees],
+                [r.model_dump() for r in request.targetRoles],
+                mode,
+            ):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            print(f"Error in analyze-skill-gap/bulk: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            slot.release()
+
+    # The slot is held until the stream ends; the background task also frees it
+    # when the client goes away before streaming starts.
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(slot.release))
+
 @app.post("/api/generate-gap-course")
 async def api_generate_gap_course(request: UpskillingRequest):
     """
@@ -265,30 +517,73 @@ async def api_generate_gap_course(request: UpskillingRequest):
         print(f"DEBUG: Received upskilling request: {request}")
         result = await generate_upskilling_course(request.missingSkills, request.currentSkills, request.email)
         if "error" in result:
-             raise HTTPException(status_code=500, detail=result["error"])
-        return result
+             raise generation_error(result)
+        return FastJSONResponse(result)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in generate-gap-course: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- RAG Chat Endpoint ---
 try:
-    from rag import rag_service
+    import chat_sessions
+    import tenant_auth
+    from rag import rag_pool, UnknownTenantError
 except ImportError:
-    from backend.rag import rag_service
+    from backend import chat_sessions, tenant_auth
+    from backend.rag import rag_pool, UnknownTenantError
 
 class ChatRequest(BaseModel):
     query: str
+    tenant: Optional[str] = None # Must match the X-Tenant-Token's tenant when given
+    sessionId: Optional[str] = None # Returned by the previous turn; omit to start a conversation
+
+@app.post("/api/admin/rag/reload", dependencies=[Depends(require_admin)])
+async def reload_rag_index(rebuild: bool = False, tenant: Optional[str] = None):
+    """
+    Loads the latest RAG index version of a tenant (re-embedding its knowledge base
+    first if it changed, or always with `rebuild=true`) and swaps it in without
+    dropping queries.
+    """
+    try:
+        return await asyncio.to_thread(rag_pool.reload, tenant, rebuild)
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error reloading RAG index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/debug/rag", dependencies=[Depends(require_admin)])
+async def debug_rag():
+    """
+    Reports the RAG index versions this worker is serving, the tenant LRU usage
+    and chat sessions.
+    """
+    return {**rag_pool.stats(), "sessions": chat_sessions.store.stats()}
 
 @app.post("/api/chat")
-async def chat_agent(request: ChatRequest):
+async def chat_agent(request: ChatRequest, x_tenant_token: Optional[str] = Header(default=None)):
     """
-    Handles RAG-based chat queries.
+    Handles RAG-based chat queries against the knowledge base of the caller's
+    tenant token (see tenant_auth), or the default one. Pass the returned
+    `sessionId` with follow-up questions to reuse the conversation's context.
     """
     try:
-        response = rag_service.get_response(request.query)
-        return {"response": response}
+        tenant = tenant_auth.tenant_for(x_tenant_token, request.tenant)
+    except tenant_auth.TenantAccessError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    try:
+        async with admission.gates["chat"].slot():
+            service = await asyncio.to_thread(rag_pool.get, tenant) if tenant else rag_pool.default
+            session = chat_sessions.store.get_or_create(request.sessionId, tenant)
+            response = await service.get_response(request.query, session)
+        return {"response": response, "sessionId": session.id}
+    except admission.Rejected as e:
+        raise generation_error(e.error())
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         print(f"Error in chat_agent: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,455 @@
+"""
+In-process metrics registry for the backend, rendered in Prometheus text format.
+
+Counters, gauges and histograms are kept in memory per worker process and exposed
+on the `/metrics` endpoint. Apart from pymongo (already pulled in by motor) the module
+has no dependencies, so agent, db and rag can all import it without import cycles.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Generation calls take tens of seconds, so buckets reach well past the usual 10s.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# YouTube Data API v3 quota cost per call (search.list is the only method we use).
+YOUTUBE_QUOTA_COST = {"search.list": 100}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Iterable[str], labelvalues: Iterable[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labelvalues, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels) -> float:
+        """
+        Sums every series whose labels match the given subset, e.g. `total(kind="prompt")`.
+        """
+        wanted = {self.labelnames.index(name): str(value) for name, value in labels.items()}
+        with self._lock:
+            return sum(v for k, v in self._values.items() if all(k[i] == val for i, val in wanted.items()))
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            yield "_total" if not self.name.endswith("_total") else "", labelvalues, (), value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            yield "", labelvalues, (), value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> Optional[Dict]:
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return None
+        return {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]}
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._values.items())
+        for labelvalues, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                yield "_bucket", labelvalues, (("le", _format_value(bound)),), cumulative
+            yield "_bucket", labelvalues, (("le", "+Inf"),), state["count"]
+            yield "_sum", labelvalues, (), state["sum"]
+            yield "_count", labelvalues, (), state["count"]
+
+
+class MetricsRegistry:
+    """
+    Holds every metric of the process and renders them for scraping.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def reset(self):
+        """
+        Clears all recorded values (metric definitions are kept). Used by tests.
+        """
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- HTTP ---
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests by route.", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_PROGRESS = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being served.", ("method",)
+)
+
+# --- Gemini ---
+GEMINI_CALLS = registry.counter(
+    "gemini_calls_total", "Gemini generate calls by call site and outcome.", ("call_site", "outcome")
+)
+GEMINI_LATENCY = registry.histogram(
+    "gemini_call_duration_seconds", "Latency of individual Gemini calls.", ("call_site",)
+)
+GEMINI_TOKENS = registry.counter(
+    "gemini_tokens_total", "Gemini tokens consumed by call site (kind is prompt, cached_prompt or completion).", ("call_site", "kind")
+)
+GEMINI_RETRIES = registry.counter(
+    "gemini_retries_total", "Gemini attempts that were retried, by reason.", ("call_site", "reason")
+)
+GEMINI_RATE_LIMITED = registry.counter(
+    "gemini_rate_limited_total", "Gemini calls rejected with 429 / quota errors.", ("call_site",)
+)
+GEMINI_JSON_FAILURES = registry.counter(
+    "gemini_json_failures_total", "Gemini responses that could not be parsed as JSON.", ("call_site",)
+)
+
+# --- YouTube ---
+YOUTUBE_REQUESTS = registry.counter(
+    "youtube_requests_total", "YouTube Data API requests by method and outcome.", ("method", "outcome")
+)
+YOUTUBE_QUOTA_UNITS = registry.counter(
+    "youtube_quota_units_total", "YouTube Data API quota units consumed.", ("method",)
+)
+
+# --- MongoDB ---
+MONGO_COMMAND_DURATION = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", ("command", "collection", "outcome")
+)
+
+
+def record_gemini_usage(call_site: str, response) -> None:
+    """
+    Adds token counts from a Gemini response's `usage_metadata`, when present.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    if prompt_tokens:
+        GEMINI_TOKENS.inc(prompt_tokens, call_site=call_site, kind="prompt")
+    if cached_tokens:
+        # Included in "prompt"; billed at the cached-input rate.
+        GEMINI_TOKENS.inc(cached_tokens, call_site=call_site, kind="cached_prompt")
+    if completion_tokens:
+        GEMINI_TOKENS.inc(completion_tokens, call_site=call_site, kind="completion")
+
+
+def record_youtube_call(method: str, outcome: str) -> None:
+    """
+    Counts a YouTube API request and the quota units it consumed. Failed calls are
+    still charged by Google, so quota is recorded regardless of the outcome.
+    """
+    YOUTUBE_REQUESTS.inc(method=method, outcome=outcome)
+    YOUTUBE_QUOTA_UNITS.inc(YOUTUBE_QUOTA_COST.get(method, 1), method=method)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    message = str(error)
+    return "Quota" in message or "429" in message
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener that records the duration of every command sent by the
+    Motor client. Registered through `event_listeners` when the client is created.
+    """
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _event_key(event):
+        return (event.request_id, event.operation_id, getattr(event, "connection_id", None))
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[self._event_key(event)] = (event.command_name, collection)
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            command, collection = self._pending.pop(self._event_key(event), (event.command_name, ""))
+        MONGO_COMMAND_DURATION.observe(
+            event.duration_micros / 1_000_000, command=command, collection=collection, outcome=outcome
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+MONGO_POOL_WAIT = registry.histogram(
+    "mongo_pool_wait_seconds", "Time spent waiting to check a connection out of the pool.", ("outcome",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+MONGO_POOL_CHECKED_OUT = registry.gauge(
+    "mongo_pool_checked_out_connections", "Connections currently checked out of the pool."
+)
+MONGO_POOL_OPEN = registry.gauge(
+    "mongo_pool_open_connections", "Connections currently open across all pools."
+)
+MONGO_POOL_CHECKOUT_FAILURES = registry.counter(
+    "mongo_pool_checkout_failures_total", "Connection check-outs that failed, by reason.", ("reason",)
+)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    pymongo pool listener tracking check-out wait times and connection counts. Keeps a
+    small summary (see `snapshot`) next to the Prometheus series for the debug endpoint.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.failures = 0
+        self.created = 0
+        self.checked_out = 0
+        self.open = 0
+
+    def _record_wait(self, event, outcome: str):
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            return
+        MONGO_POOL_WAIT.observe(duration, outcome=outcome)
+        with self._lock:
+            self.total_wait += duration
+            self.max_wait = max(self.max_wait, duration)
+
+    def connection_checked_out(self, event):
+        self._record_wait(event, "success")
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def connection_check_out_failed(self, event):
+        self._record_wait(event, "failed")
+        with self._lock:
+            self.failures += 1
+        MONGO_POOL_CHECKOUT_FAILURES.inc(reason=str(event.reason))
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+            self.open += 1
+        MONGO_POOL_OPEN.inc()
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+        MONGO_POOL_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkedOut": self.checked_out,
+                "openConnections": self.open,
+                "connectionsCreated": self.created,
+                "checkoutFailures": self.failures,
+                "avgWaitMs": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "maxWaitMs": round(self.max_wait * 1000, 3),
+            }
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency. The route template (for example
+    `/api/courses/{course_id}`) is used as label so path parameters don't explode the
+    label cardinality.
+    """
+    def __init__(self, app, excluded_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec(method=method)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, method=method, route=route_path, status=str(status["code"])
+            )
@@ -0,0 +1,220 @@
+"""
+Per-call-site Gemini model routing.
+
+Every call site (outline, module_details, recommendations, ...) has a route: an
+ordered list of models plus its own output-token cap, temperature and latency
+budget. Calls go to the first model; on a rate limit / quota error or when the
+latency budget is exceeded they fall through to the next one. Latency, outcomes
+and estimated cost are recorded per call site and model. Streamed calls fall
+back the same way until their first chunk arrives.
+
+Routes can be overridden with environment variables, e.g.
+MODEL_ROUTE_OUTLINE="gemini-flash-latest,gemini-flash-lite-latest",
+MODEL_ROUTE_OUTLINE_MAX_TOKENS=4096, MODEL_ROUTE_OUTLINE_TEMPERATURE=0.5,
+MODEL_ROUTE_OUTLINE_TIMEOUT=30. Prices (USD per 1M input/output tokens) can be
+overridden with MODEL_PRICES_JSON='{"gemini-flash-latest": [0.3, 2.5]}'.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+FLASH = "gemini-flash-latest"
+FLASH_LITE = "gemini-flash-lite-latest"
+
+MODEL_CALLS = metrics.registry.counter(
+    "model_calls_total", "Generation calls by call site, model and outcome.", ("call_site", "model", "outcome")
+)
+MODEL_LATENCY = metrics.registry.histogram(
+    "model_call_duration_seconds", "Generation call latency by call site and model.", ("call_site", "model")
+)
+MODEL_FALLBACKS = metrics.registry.counter(
+    "model_fallbacks_total", "Calls retried on the next model of a route.", ("call_site", "model", "reason")
+)
+MODEL_COST = metrics.registry.counter(
+    "model_cost_usd_total", "Estimated generation cost in USD.", ("call_site", "model")
+)
+
+# USD per 1M (input, output) tokens.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    FLASH_LITE: (0.10, 0.40),
+    FLASH: (0.30, 2.50),
+    "gemini-pro": (1.25, 10.0),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES_JSON", "{}")).items()})
+# Fraction of the input price charged for tokens served from cached content.
+CACHED_INPUT_RATE = float(os.getenv("MODEL_CACHED_INPUT_RATE", "0.25"))
+
+
+@dataclass(frozen=True)
+class Route:
+    models: Tuple[str, ...]
+    max_output_tokens: int = 8192
+    temperature: float = 0.7
+    timeout: Optional[float] = None  # seconds before falling back to the next model
+
+    def generation_config(self) -> Dict:
+        return {"max_output_tokens": self.max_output_tokens, "temperature": self.temperature}
+
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    "outline": Route((FLASH_LITE, FLASH), max_output_tokens=2048, temperature=0.5, timeout=30),
+    "upskilling_outline": Route((FLASH_LITE, FLASH), max_output_tokens=2048, temperature=0.5, timeout=30),
+    "module_details": Route((FLASH, FLASH_LITE), max_output_tokens=8192, temperature=0.7, timeout=90),
+    "recommendations": Route((FLASH_LITE, FLASH), max_output_tokens=1024, temperature=0.5, timeout=20),
+    "skill_gap": Route((FLASH_LITE, FLASH), max_output_tokens=1024, temperature=0.3, timeout=20),
+    "skill_gap_bulk": Route((FLASH_LITE, FLASH), max_output_tokens=4096, temperature=0.3, timeout=45),
+    "rag": Route(("gemini-pro",), max_output_tokens=1024, temperature=0.3),
+    "generic": Route((FLASH,), max_output_tokens=8192, temperature=0.7),
+}
+
+
+def _route_from_env(call_site: str, route: Route) -> Route:
+    prefix = f"MODEL_ROUTE_{call_site.upper()}"
+    models = os.getenv(prefix)
+    timeout = os.getenv(f"{prefix}_TIMEOUT")
+    return Route(
+        models=tuple(m.strip() for m in models.split(",") if m.strip()) if models else route.models,
+        max_output_tokens=int(os.getenv(f"{prefix}_MAX_TOKENS", route.max_output_tokens)),
+        temperature=float(os.getenv(f"{prefix}_TEMPERATURE", route.temperature)),
+        timeout=(float(timeout) or None) if timeout else route.timeout,
+    )
+
+
+def estimate_cost(model_name: str, response) -> float:
+    usage = getattr(response, "usage_metadata", None)
+    price = MODEL_PRICES.get(model_name)
+    if usage is None or price is None:
+        return 0.0
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    input_cost = (prompt_tokens - cached_tokens + cached_tokens * CACHED_INPUT_RATE) * price[0]
+    return (input_cost + output_tokens * price[1]) / 1_000_000
+
+
+class ModelRouter:
+    """
+    Resolves call sites to routes and runs generation calls with fallback.
+    """
+    def __init__(self, routes: Dict[str, Route] = None):
+        self.routes = {name: _route_from_env(name, route) for name, route in (routes or DEFAULT_ROUTES).items()}
+        self._stats: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def route(self, call_site: str) -> Route:
+        return self.routes.get(call_site) or _route_from_env(call_site, self.routes["generic"])
+
+    async def generate(self, call_site: str, prompt, get_model: Callable[[str], object], is_rate_limit=None):
+        """
+        Calls the route's models in order until one answers.
+        Returns (response, model_name); re-raises the last model's error.
+        """
+        route = self.route(call_site)
+        for tier, model_name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                call = get_model(model_name).generate_content_async(prompt, generation_config=route.generation_config())
+                response = await (asyncio.wait_for(call, route.timeout) if route.timeout else call)
+            except Exception as e:
+                if not self._falls_back(call_site, route, tier, e, time.perf_counter() - start, is_rate_limit):
+                    raise
+                continue
+            self._record(call_site, model_name, "success", time.perf_counter() - start, estimate_cost(model_name, response))
+            return response, model_name
+
+    async def stream(self, call_site: str, prompt, get_model: Callable[[str], object], is_rate_limit=None):
+        """
+        Streams the response chunks of the first model in the route that starts
+        answering. Falls back like `generate`, but only until the first chunk has
+        arrived; the route's timeout bounds the wait for that first chunk.
+        """
+        route = self.route(call_site)
+        for tier, model_name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                call = get_model(model_name).generate_content_async(
+                    prompt, generation_config=route.generation_config(), stream=True)
+                response = await (asyncio.wait_for(call, route.timeout) if route.timeout else call)
+                chunks = response.__aiter__()
+                first = chunks.__anext__()
+                first = await (asyncio.wait_for(first, route.timeout) if route.timeout else first)
+            except StopAsyncIteration:
+                self._record(call_site, model_name, "success", time.perf_counter() - start)
+                return
+            except Exception as e:
+                if not self._falls_back(call_site, route, tier, e, time.perf_counter() - start, is_rate_limit):
+                    raise
+                continue
+            last = first
+            try:
+                yield first
+                async for chunk in chunks:
+                    last = chunk
+                    yield chunk
+            except Exception:
+                self._record(call_site, model_name, "error", time.perf_counter() - start)
+                raise
+            # The last chunk carries the usage for the whole response.
+            self._record(call_site, model_name, "success", time.perf_counter() - start, estimate_cost(model_name, last))
+            return
+
+    def _falls_back(self, call_site: str, route: Route, tier: int, error: Exception, elapsed: float,
+                    is_rate_limit=None) -> bool:
+        """
+        Records a failed call; True if the next model should be tried.
+        """
+        model_name = route.models[tier]
+        timed_out = isinstance(error, asyncio.TimeoutError)
+        limited = not timed_out and (is_rate_limit or metrics.is_rate_limit_error)(error)
+        outcome = "timeout" if timed_out else "rate_limited" if limited else "error"
+        self._record(call_site, model_name, outcome, elapsed)
+        if tier == len(route.models) - 1 or not (timed_out or limited):
+            return False
+        MODEL_FALLBACKS.inc(call_site=call_site, model=model_name, reason=outcome)
+        print(f"Warning: {model_name} {outcome} for {call_site}, falling back to {route.models[tier + 1]}")
+        return True
+
+    def _record(self, call_site: str, model_name: str, outcome: str, elapsed: float, cost: float = 0.0):
+        MODEL_CALLS.inc(call_site=call_site, model=model_name, outcome=outcome)
+        MODEL_LATENCY.observe(elapsed, call_site=call_site, model=model_name)
+        if cost:
+            MODEL_COST.inc(cost, call_site=call_site, model=model_name)
+        with self._lock:
+            stats = self._stats.setdefault((call_site, model_name), {
+                "calls": 0, "failures": 0, "totalSeconds": 0.0, "maxSeconds": 0.0, "costUsd": 0.0})
+            stats["calls"] += 1
+            stats["failures"] += outcome != "success"
+            stats["totalSeconds"] += elapsed
+            stats["maxSeconds"] = max(stats["maxSeconds"], elapsed)
+            stats["costUsd"] += cost
+
+    def stats(self) -> Dict:
+        with self._lock:
+            items = sorted(self._stats.items())
+        report = {}
+        for (call_site, model_name), stats in items:
+            report.setdefault(call_site, {})[model_name] = {
+                "calls": stats["calls"],
+                "failures": stats["failures"],
+                "avgMs": round(stats["totalSeconds"] / stats["calls"] * 1000, 1),
+                "maxMs": round(stats["maxSeconds"] * 1000, 1),
+                "costUsd": round(stats["costUsd"], 6),
+            }
+        return {
+            "routes": {name: {"models": list(r.models), "maxOutputTokens": r.max_output_tokens,
+                              "temperature": r.temperature, "timeoutSeconds": r.timeout}
+                       for name, r in self.routes.items()},
+            "stats": report,
+        }
+
+
+router = ModelRouter()
@@ -0,0 +1,180 @@
+"""
+Library of generated modules, reusable across upskilling courses.
+
+Every module produced by the course generators is stored in the `module_library`
+collection, tagged with the canonical skills it was generated to teach and a hashed
+bag-of-words embedding of its title and content. Upskilling requests first pick
+library modules for the missing skills they cover, so Gemini only has to generate
+the rest.
+"""
+import copy
+import os
+import re
+import time
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from db import db
+    import skill_matcher
+except ImportError:
+    from backend.db import db
+    from backend import skill_matcher
+
+ENABLED = os.getenv("MODULE_LIBRARY_ENABLED", "1") != "0"
+# Minimum cosine similarity between a missing skill and a candidate module's content.
+# A module about the skill scores 0.3+, one that merely mentions it stays under 0.1.
+MIN_SIMILARITY = float(os.getenv("MODULE_REUSE_MIN_SIMILARITY", "0.15"))
+CONTEXT_WEIGHT = 0.1  # tie-breaker towards modules that fit the learner's current skills
+MAX_CANDIDATES = 200
+EMBEDDING_DIM = 512
+FAILED_CONTENT = "Content generation failed."
+
+_indexes_ready = False
+
+
+def text_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Hashed unigram + bigram embedding of a text, L2-normalized.
+    """
+    words = re.findall(r"[\w+#.]+", text.lower())
+    vector = np.zeros(dim, dtype=np.float32)
+    for i, word in enumerate(words):
+        vector[zlib.crc32(word.encode()) % dim] += 1.0
+        if i:
+            vector[zlib.crc32(f"{words[i - 1]} {word}".encode()) % dim] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def module_text(module: Dict) -> str:
+    parts = [module.get("moduleTitle", "")]
+    for sub in module.get("subModules", []):
+        parts.append(sub.get("subTitle", ""))
+        parts.append(str(sub.get("explanation", ""))[:1500])
+    return "\n".join(parts)
+
+
+def tag_skills(module: Dict, candidate_skills: Iterable[str]) -> List[str]:
+    """
+    Canonical skills, out of those the module was generated for, that it teaches.
+    A module generated for a single skill is tagged with it; with several, only
+    those named in its title or section titles (skills that merely show up in
+    examples don't count).
+    """
+    candidates = sorted({skill_matcher.matcher.canonical(s) for s in candidate_skills if s and s.strip()})
+    if len(candidates) <= 1:
+        return candidates
+    titles = [module.get("moduleTitle", "")] + [sub.get("subTitle", "") for sub in module.get("subModules", [])]
+    text = f" {skill_matcher.normalize_skill(' | '.join(titles))} "
+    alias_index = skill_matcher.matcher.alias_index
+    tags = []
+    for canonical in candidates:
+        variants = [v for v, c in alias_index.items() if c == canonical] or [canonical]
+        if any(f" {v} " in text for v in variants):
+            tags.append(canonical)
+    return tags
+
+
+def _is_usable(module: Dict) -> bool:
+    subs = module.get("subModules", [])
+    return bool(subs) and bool(module.get("quiz")) and all(s.get("explanation") != FAILED_CONTENT for s in subs)
+
+
+async def _ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.module_library.create_index("skills")
+        await db.module_library.create_index([("courseTitle", 1), ("moduleTitle", 1)], unique=True)
+        _indexes_ready = True
+
+
+async def index_modules(modules: Sequence[Dict], candidate_skills: Iterable[str], course_title: str) -> int:
+    """
+    Stores generated modules in the library. Returns how many were (re)indexed.
+    """
+    if not ENABLED or not db:
+        return 0
+    candidate_skills = list(candidate_skills)
+    indexed = 0
+    try:
+        await _ensure_indexes()
+        for module in modules:
+            if not _is_usable(module):
+                continue
+            skills = tag_skills(module, candidate_skills)
+            if not skills:
+                continue
+            await db.module_library.update_one(
+                {"courseTitle": course_title, "moduleTitle": module["moduleTitle"]},
+                {"$set": {
+                    "skills": skills,
+                    "module": fresh_copy(module),
+                    "embedding": [round(float(x), 5) for x in text_embedding(module_text(module))],
+                    "updatedAt": time.time(),
+                }},
+                upsert=True,
+            )
+            indexed += 1
+    except Exception as e:
+        print(f"Warning: Failed to index modules for '{course_title}': {e}")
+    return indexed
+
+
+def fresh_copy(module: Dict) -> Dict:
+    """
+    Copy of a module with all learner progress reset.
+    """
+    module = copy.deepcopy(module)
+    module["isCompleted"] = False
+    module["moduleScore"] = 0
+    for sub in module.get("subModules", []):
+        sub["isCompleted"] = False
+    return module
+
+
+async def find_reusable_modules(missing_skills: Sequence[str], context: str = "",
+                                limit: int = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Picks at most one library module per missing skill, ranked by similarity between
+    the module content and the skill (with "<context>" as a tie-breaker). With a
+    `limit`, at most that many are reused, leaving room for at least one generated
+    module whenever a skill stays uncovered. Returns (modules, uncovered_skills).
+    """
+    if not ENABLED or not db or not missing_skills:
+        return [], list(missing_skills)
+
+    keys = [skill_matcher.matcher.canonical(s) for s in missing_skills]
+    try:
+        candidates = await db.module_library.find(
+            {"skills": {"$in": keys}}, {"skills": 1, "module": 1, "embedding": 1}
+        ).limit(MAX_CANDIDATES).to_list(length=MAX_CANDIDATES)
+    except Exception as e:
+        print(f"Warning: Module library lookup failed: {e}")
+        return [], list(missing_skills)
+    if not candidates:
+        return [], list(missing_skills)
+
+    queries = np.stack([text_embedding(skill) for skill in missing_skills])
+    documents = np.asarray([c["embedding"] for c in candidates], dtype=np.float32)
+    has_skill = np.array([[key in c["skills"] for c in candidates] for key in keys])
+    relevance = np.where(has_skill, queries @ documents.T, -1.0)
+    scores = relevance + CONTEXT_WEIGHT * (text_embedding(context) @ documents.T if context else 0.0)
+
+    chosen: Dict[int, int] = {}  # missing skill index -> candidate index
+    for i in range(len(missing_skills)):
+        for j in np.argsort(-scores[i]):
+            if relevance[i, j] < MIN_SIMILARITY:
+                continue
+            if j not in chosen.values():
+                chosen[i] = j
+                break
+    if limit is not None and (len(chosen) > limit or (len(chosen) == limit < len(missing_skills))):
+        best = sorted(chosen, key=lambda i: -relevance[i, chosen[i]])[:max(0, limit - 1)]
+        chosen = {i: chosen[i] for i in best}
+
+    reused = [fresh_copy(candidates[chosen[i]]["module"]) for i in sorted(chosen)]
+    uncovered = [skill for i, skill in enumerate(missing_skills) if i not in chosen]
+    return reused, uncovered
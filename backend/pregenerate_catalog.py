@@ -0,0 +1,231 @@
+"""
+Offline catalog pre-generation.
+
+Generates recommendations for popular roles and the courses they point to ahead of
+time, so the first user of a topic doesn't wait for a full generation. Entries that
+already exist in MongoDB are skipped, generation runs under a concurrency cap and
+stops scheduling new work once the Gemini call/token budget is spent.
+
+Usage (from the backend directory):
+    python pregenerate_catalog.py --from-users --top 20
+    python pregenerate_catalog.py --roles-file roles.txt --concurrency 3 --max-gemini-calls 400
+    python pregenerate_catalog.py --course "Docker Fundamentals" --course "Kubernetes Basics"
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+try:
+    import admission
+    import agent
+    import metrics
+    from db import db
+except ImportError:
+    from backend import admission, agent, metrics
+    from backend.db import db
+
+# Rough Gemini calls per job, used to reserve budget before a job starts:
+# one outline call plus one call per module (courses have 5-7 modules).
+COURSE_CALL_ESTIMATE = 8
+RECOMMENDATION_CALL_ESTIMATE = 1
+
+
+class Budget:
+    """
+    Tracks Gemini usage against optional call/token limits. Usage is read from the
+    metrics counters, so retries are accounted for; in-flight jobs hold a reservation.
+    """
+    def __init__(self, max_calls: Optional[int] = None, max_tokens: Optional[int] = None):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.reserved = 0
+        self._start_calls = metrics.GEMINI_CALLS.total()
+        self._start_tokens = metrics.GEMINI_TOKENS.total()
+
+    @property
+    def calls_used(self) -> int:
+        return int(metrics.GEMINI_CALLS.total() - self._start_calls)
+
+    @property
+    def tokens_used(self) -> int:
+        return int(metrics.GEMINI_TOKENS.total() - self._start_tokens)
+
+    def try_reserve(self, calls: int) -> bool:
+        if self.max_calls is not None and self.calls_used + self.reserved + calls > self.max_calls:
+            return False
+        if self.max_tokens is not None and self.tokens_used >= self.max_tokens:
+            return False
+        self.reserved += calls
+        return True
+
+    def release(self, calls: int):
+        self.reserved -= calls
+
+
+def _normalize(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+
+
+async def top_values_from_users(field: str, limit: int) -> List[str]:
+    """
+    Returns the most frequent values of a user field (string or array of strings).
+    """
+    pipeline = [
+        {"$match": {field: {"$exists": True}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+    ]
+    if field.endswith("Skills"):
+        pipeline.insert(1, {"$unwind": f"${field}"})
+    rows = await db.users.aggregate(pipeline).to_list(length=None)
+    return [row["_id"] for row in rows if isinstance(row["_id"], str) and row["_id"].strip()][:limit]
+
+
+class CatalogPregenerator:
+    def __init__(self, concurrency: int, budget: Budget, force: bool = False, dry_run: bool = False):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.budget = budget
+        self.force = force
+        self.dry_run = dry_run
+        self.stats = {"recommendations": {"generated": 0, "skipped": 0, "failed": 0, "overBudget": 0},
+                      "courses": {"generated": 0, "skipped": 0, "failed": 0, "overBudget": 0}}
+        self._done = 0
+        self._total = 0
+
+    def _progress(self, message: str):
+        self._done += 1
+        print(f"[{self._done}/{self._total}] {message} (calls={self.budget.calls_used}, tokens={self.budget.tokens_used})")
+
+    async def _run_job(self, kind: str, label: str, estimate: int, job):
+        async with self.semaphore:
+            if not self.budget.try_reserve(estimate):
+                self.stats[kind]["overBudget"] += 1
+                self._progress(f"Budget exhausted, not generating {kind[:-1]} '{label}'")
+                return None
+            start = time.perf_counter()
+            try:
+                result = await job()
+            except Exception as e:
+                result = {"error": str(e)}
+            finally:
+                self.budget.release(estimate)
+            if not result or "error" in result:
+                self.stats[kind]["failed"] += 1
+                self._progress(f"FAILED {kind[:-1]} '{label}': {(result or {}).get('error', 'empty result')}")
+                return None
+            self.stats[kind]["generated"] += 1
+            self._progress(f"Generated {kind[:-1]} '{label}' in {time.perf_counter() - start:.1f}s")
+            return result
+
+    async def _recommendations_for(self, role: str) -> List[str]:
+        cached = None if self.force else await agent.get_cached_recommendations(role)
+        if cached:
+            self.stats["recommendations"]["skipped"] += 1
+            self._progress(f"Recommendations for '{role}' already stored")
+            recommendations = cached
+        elif self.dry_run:
+            self._progress(f"Would generate recommendations for '{role}'")
+            return []
+        else:
+            recommendations = await self._run_job(
+                "recommendations", role, RECOMMENDATION_CALL_ESTIMATE,
+                lambda: agent.get_recommendations_with_links(role, use_cache=False),
+            )
+        return [c["title"] for c in (recommendations or {}).get("courses", []) if c.get("title")]
+
+    async def _course(self, title: str):
+        existing = None
+        if not self.force:
+            existing = (await agent.find_existing_course(title, {"_id": 1})
+                        or await agent.find_similar_course(title, {"_id": 1}))
+        if existing:
+            self.stats["courses"]["skipped"] += 1
+            self._progress(f"Course '{title}' already exists")
+            return
+        if self.dry_run:
+            self._progress(f"Would generate course '{title}'")
+            return
+        await self._run_job("courses", title, COURSE_CALL_ESTIMATE, lambda: agent.generate_full_course(title, priority=admission.BACKGROUND))
+
+    async def run(self, roles: List[str], courses: List[str]) -> Dict:
+        self._total = len(roles)
+        role_courses = await asyncio.gather(*(self._recommendations_for(role) for role in roles))
+
+        titles, seen = [], set()
+        for title in courses + [t for group in role_courses for t in group]:
+            key = _normalize(title)
+            if key not in seen:
+                seen.add(key)
+                titles.append(title)
+
+        self._total += len(titles)
+        await asyncio.gather(*(self._course(title) for title in titles))
+        return self.stats
+
+
+def estimate_cost(input_price_per_1m: float, output_price_per_1m: float) -> Dict:
+    prompt_tokens = int(metrics.GEMINI_TOKENS.total(kind="prompt"))
+    completion_tokens = int(metrics.GEMINI_TOKENS.total(kind="completion"))
+    cost = (prompt_tokens * input_price_per_1m + completion_tokens * output_price_per_1m) / 1_000_000
+    return {"promptTokens": prompt_tokens, "completionTokens": completion_tokens, "estimatedCostUsd": round(cost, 4)}
+
+
+async def main(args) -> Dict:
+    if not db:
+        raise SystemExit("MONGODB_URI is not set; the catalog cannot be pre-generated.")
+
+    roles = list(args.role or [])
+    courses = list(args.course or [])
+    if args.roles_file:
+        roles += _read_lines(args.roles_file)
+    if args.courses_file:
+        courses += _read_lines(args.courses_file)
+    if args.from_users:
+        roles += await top_values_from_users("currentRole", args.top)
+    if args.skills_from_users:
+        courses += await top_values_from_users("technicalSkills", args.top)
+    if not roles and not courses:
+        raise SystemExit("Nothing to generate: pass --role/--course, a list file, or --from-users.")
+
+    budget = Budget(max_calls=args.max_gemini_calls, max_tokens=args.max_tokens)
+    pregenerator = CatalogPregenerator(args.concurrency, budget, force=args.force, dry_run=args.dry_run)
+    started = time.perf_counter()
+    stats = await pregenerator.run(roles, courses)
+    return {
+        **stats,
+        "geminiCalls": budget.calls_used,
+        **estimate_cost(args.input_price_per_1m, args.output_price_per_1m),
+        "durationSeconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate recommendations and courses for popular roles.")
+    parser.add_argument("--role", action="append", help="Role to pre-generate (repeatable).")
+    parser.add_argument("--course", action="append", help="Course title to pre-generate (repeatable).")
+    parser.add_argument("--roles-file", help="File with one role per line.")
+    parser.add_argument("--courses-file", help="File with one course title per line.")
+    parser.add_argument("--from-users", action="store_true", help="Use the most frequent users.currentRole values.")
+    parser.add_argument("--skills-from-users", action="store_true",
+                        help="Also pre-generate courses for the most frequent users.technicalSkills values.")
+    parser.add_argument("--top", type=int, default=20, help="How many roles/skills to take from users.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Generation jobs running at once.")
+    parser.add_argument("--max-gemini-calls", type=int, help="Stop scheduling jobs after this many Gemini calls.")
+    parser.add_argument("--max-tokens", type=int, help="Stop scheduling jobs after this many Gemini tokens.")
+    parser.add_argument("--input-price-per-1m", type=float, default=0.0, help="USD per 1M prompt tokens.")
+    parser.add_argument("--output-price-per-1m", type=float, default=0.0, help="USD per 1M completion tokens.")
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that already exist.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be generated.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    summary = asyncio.run(main(parse_args()))
+    print(json.dumps(summary, indent=2))
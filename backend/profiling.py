@@ -0,0 +1,327 @@
+"""
+Opt-in per-request profiling and slow-request capture.
+
+A request is profiled when it is picked by sampling (PROFILE_SAMPLE_RATE, default 0)
+or sends `X-Profile: 1`. The header is only honoured with PROFILE_HEADER_ENABLED=1,
+and then only together with the admin token in X-Admin-Token. While it runs, the
+generation pipeline records timed spans into the request's profile: Gemini calls
+per call site and attempt, JSON extraction, rate-limit back-off, each
+process_module, YouTube searches, MongoDB commands and admission-queue waits.
+Tasks and threads started by the request inherit it through a context variable.
+
+Requests slower than PROFILE_SLOW_SECONDS (default 10) go into a bounded slow-request
+log with their profile, together with the event-loop stalls the loop monitor saw
+meanwhile (unprofiled slow requests are logged with their total time only).
+Header-profiled requests also get a `Server-Timing` header and an `X-Profile-Id`.
+Both are served by /api/debug/profiles.
+"""
+import hmac
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "0") == "1"
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "10"))
+SLOW_LOG_SIZE = int(os.getenv("PROFILE_SLOW_LOG_SIZE", "50"))
+RECENT_SIZE = int(os.getenv("PROFILE_RECENT_SIZE", "20"))
+MAX_SPANS = 2000  # per request; a runaway loop shouldn't eat memory
+
+PROFILED_REQUESTS = metrics.registry.counter(
+    "profiled_requests_total", "Requests profiled, by what triggered the profile.", ("trigger",)
+)
+SLOW_REQUESTS = metrics.registry.counter(
+    "slow_requests_total", "Requests slower than the slow-request threshold.", ("route",)
+)
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("request_profile", default=None)
+
+
+def _merged_seconds(intervals: List[tuple]) -> float:
+    """
+    Wall time covered by possibly overlapping (start, end) intervals.
+    """
+    total, end = 0.0, float("-inf")
+    for start, stop in sorted(intervals):
+        if stop <= end:
+            continue
+        total += stop - max(start, end)
+        end = stop
+    return total
+
+
+class Profile:
+    """
+    Timed spans of one request, as offsets from its start.
+    """
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.route = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self._lock = threading.Lock()  # MongoDB events arrive on Motor's threads
+
+    def add(self, phase: str, start: float, seconds: float, detail: str = "", outcome: str = "ok"):
+        span = {"phase": phase, "detail": detail, "startMs": round((start - self.start) * 1000, 2),
+                "durationMs": round(seconds * 1000, 2), "outcome": outcome}
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def phases(self) -> Dict[str, Dict]:
+        """
+        Per phase: span count, summed time, and wall time with at least one span
+        running (parallel modules overlap, so the sum can exceed the request).
+        """
+        with self._lock:
+            spans = list(self.spans)
+        grouped: Dict[str, List[Dict]] = {}
+        for span in spans:
+            grouped.setdefault(span["phase"], []).append(span)
+        return {
+            phase: {
+                "count": len(items),
+                "totalMs": round(sum(s["durationMs"] for s in items), 2),
+                "wallMs": round(_merged_seconds([(s["startMs"], s["startMs"] + s["durationMs"]) for s in items]), 2),
+                "maxMs": max(s["durationMs"] for s in items),
+            }
+            for phase, items in sorted(grouped.items())
+        }
+
+    def server_timing(self) -> str:
+        return ", ".join(f'{phase};dur={stats["wallMs"]};desc="{stats["count"]}x"'
+                         for phase, stats in self.phases().items())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "phases": self.phases(),
+        }
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["startMs"])
+        return {**self.summary(), "spans": spans, "droppedSpans": self.dropped}
+
+
+def current() -> Optional[Profile]:
+    return _current.get()
+
+
+def record(phase: str, seconds: float, detail: str = "", outcome: str = "ok"):
+    """
+    Adds a span that just ended to the current request's profile, if any.
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.add(phase, time.perf_counter() - seconds, seconds, detail, outcome)
+
+
+@contextmanager
+def span(phase: str, detail: str = ""):
+    """
+    Times the block into the current request's profile (no-op when unprofiled).
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        profile.add(phase, start, time.perf_counter() - start, detail, outcome)
+
+
+class MongoProfileListener(monitoring.CommandListener):
+    """
+    pymongo command listener adding each command to the profile of the request
+    that issued it (Motor runs commands with the caller's context).
+    """
+    def started(self, event):
+        pass
+
+    def _finish(self, event, outcome: str):
+        collection = event.command.get(event.command_name) if hasattr(event, "command") else None
+        detail = event.command_name if not isinstance(collection, str) else f"{event.command_name} {collection}"
+        record("mongo", event.duration_micros / 1_000_000, detail, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class ProfileStore:
+    """
+    The slow-request log and the most recent header-requested profiles.
+    """
+    def __init__(self, slow_seconds: float = SLOW_SECONDS, slow_size: int = SLOW_LOG_SIZE,
+                 recent_size: int = RECENT_SIZE):
+        self.slow_seconds = slow_seconds
+        self.slow = deque(maxlen=slow_size)
+        self.recent = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+
+    def finish(self, profile: Optional[Profile], method: str, route: str, status: int, duration: float,
+               started_at: float):
+        if profile is not None:
+            profile.route, profile.status, profile.duration = route, status, duration
+            if profile.trigger == "header":
+                with self._lock:
+                    self.recent.append(profile)
+        if duration < self.slow_seconds:
+            return
+        SLOW_REQUESTS.inc(route=route)
+        entry = {"profile": profile, "method": method, "route": route, "status": status,
+                 "startedAt": started_at, "durationMs": round(duration * 1000, 2),
+                 "loopStalls": _loop_stalls(started_at, started_at + duration)}
+        with self._lock:
+            self.slow.append(entry)
+        print(f"Warning: Slow request {method} {route} took {duration:.1f}s"
+              + (f" (profile {profile.id})" if profile else ""))
+
+    @staticmethod
+    def _summary(entry: Dict) -> Dict:
+        profile = entry["profile"]
+        summary = profile.summary() if profile else {"id": None, "method": entry["method"], "route": entry["route"],
+                                                     "status": entry["status"], "trigger": None,
+                                                     "startedAt": entry["startedAt"],
+                                                     "durationMs": entry["durationMs"], "phases": {}}
+        return {**summary, "loopStallCount": len(entry["loopStalls"])}
+
+    def report(self) -> Dict:
+        with self._lock:
+            slow, recent = list(self.slow), list(self.recent)
+        return {
+            "slowThresholdSeconds": self.slow_seconds,
+            "sampleRate": SAMPLE_RATE,
+            "headerEnabled": HEADER_ENABLED,
+            "slow": [self._summary(entry) for entry in reversed(slow)],
+            "recent": [profile.summary() for profile in reversed(recent)],
+        }
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            for entry in self.slow:
+                if entry["profile"] is not None and entry["profile"].id == profile_id:
+                    return {**entry["profile"].to_dict(), "loopStalls": entry["loopStalls"]}
+            for profile in self.recent:
+                if profile.id == profile_id:
+                    return profile.to_dict()
+        return None
+
+
+def _loop_stalls(start: float, end: float) -> List[Dict]:
+    """
+    Event-loop stalls (from the loop monitor, when enabled) overlapping [start, end].
+    """
+    try:
+        from loop_monitor import loop_monitor
+    except ImportError:
+        from backend.loop_monitor import loop_monitor
+    if not loop_monitor:
+        return []
+    return [{"startedAt": s["startedAt"], "durationSeconds": s["durationSeconds"], "route": s["route"],
+             "topFrame": s["samples"][0]["stack"].strip().splitlines()[-2:] if s["samples"] else []}
+            for s in list(loop_monitor.stalls)
+            if s["startedAt"] < end and s["startedAt"] + s["durationSeconds"] > start]
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that decides whether to profile a request, makes the
+    profile current for the endpoint (and everything it spawns) and hands the
+    finished request to the store. It must run in the endpoint's task for the
+    context variable to reach it, which is why BaseHTTPMiddleware isn't used.
+    """
+    def __init__(self, app, store: "ProfileStore" = None, sample_rate: float = None,
+                 header_enabled: bool = None, admin_token: str = None):
+        self.app = app
+        self.store = store or profiles
+        self.sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+        self.header_enabled = HEADER_ENABLED if header_enabled is None else header_enabled
+        self.admin_token = os.getenv("ADMIN_API_TOKEN") if admin_token is None else admin_token
+
+    def _header_allowed(self, headers: Dict[bytes, bytes]) -> bool:
+        if not self.header_enabled:
+            return False
+        if headers.get(b"x-profile", b"").strip().lower() not in (b"1", b"true", b"yes", b"on"):
+            return False
+        expected = (self.admin_token or "").encode()
+        return bool(expected) and hmac.compare_digest(headers.get(b"x-admin-token", b""), expected)
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self._header_allowed(dict(scope.get("headers", []))):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        profile = Profile(scope.get("method", "GET"), scope.get("path", ""), trigger) if trigger else None
+        if profile:
+            PROFILED_REQUESTS.inc(trigger=trigger)
+        token = _current.set(profile)
+        started_at, start = time.time(), time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if profile is not None and trigger == "header":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", profile.id.encode()))
+                    timing = profile.server_timing()
+                    if timing:
+                        headers.append((b"server-timing", timing.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+            self.store.finish(profile, scope.get("method", "GET"), route, status[0],
+                              time.perf_counter() - start, started_at)
+
+
+profiles = ProfileStore()
@@ -0,0 +1,124 @@
+"""
+Per-user course progress, kept apart from the shared course content.
+
+One small document per (userId, courseId) in the `progress` collection:
+
+    {"userId": "...", "courseId": "...", "moduleCount": 5,
+     "completedModules": [0, 2], "scores": {"0": 75.0, "2": 100.0},
+     "status": "active" | "completed", "totalProgress": 0, "startedAt": ..., "updatedAt": ...}
+
+Quiz submissions touch only this document with a single atomic upsert, so course
+documents are never rewritten after generation and can be cached freely.
+"""
+import time
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+try:
+    from db import db
+except ImportError:
+    from backend.db import db
+
+_indexes_ready = False
+
+
+async def _ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.progress.create_index([("userId", 1), ("courseId", 1)], unique=True)
+        await db.progress.create_index([("courseId", 1), ("status", 1)])
+        _indexes_ready = True
+
+
+async def record_module_result(user_id: str, course_id: str, module_index: int, score: float,
+                               module_count: int) -> Dict:
+    """
+    Stores a module's quiz score and marks it completed. Marks the course completed
+    (with the average module score) once every module has a result.
+    Returns the updated progress document.
+    """
+    await _ensure_indexes()
+    now = time.time()
+    doc = await db.progress.find_one_and_update(
+        {"userId": user_id, "courseId": course_id},
+        {
+            "$set": {f"scores.{module_index}": score, "moduleCount": module_count, "updatedAt": now},
+            "$addToSet": {"completedModules": module_index},
+            "$setOnInsert": {"status": "active", "totalProgress": 0, "startedAt": now},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if is_complete(doc):
+        total_progress = sum(doc["scores"].values()) / module_count
+        # $min keeps the first completion time when quizzes are retaken.
+        await db.progress.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"status": "completed", "totalProgress": total_progress}, "$min": {"completedAt": now}},
+        )
+        doc.update(status="completed", totalProgress=total_progress)
+    return doc
+
+
+def is_complete(doc: Optional[Dict]) -> bool:
+    return bool(doc) and len(doc.get("completedModules", [])) >= doc.get("moduleCount", 0) > 0
+
+
+async def get_progress(user_id: str, course_id: str) -> Optional[Dict]:
+    return await db.progress.find_one({"userId": user_id, "courseId": course_id}, {"_id": 0})
+
+
+def apply_progress(course: Dict, doc: Optional[Dict]) -> Dict:
+    """
+    Returns a copy of `course` with the user's progress filled into the legacy
+    isCompleted/moduleScore/status/totalProgress fields. `course` is not modified.
+    """
+    merged = dict(course)
+    completed = set((doc or {}).get("completedModules", []))
+    scores = (doc or {}).get("scores", {})
+    merged["modules"] = [
+        {**module, "isCompleted": i in completed, "moduleScore": scores.get(str(i), 0)}
+        for i, module in enumerate(course.get("modules", []))
+    ]
+    merged["status"] = (doc or {}).get("status", "active")
+    merged["totalProgress"] = (doc or {}).get("totalProgress", 0)
+    return merged
+
+
+async def user_summary(user_id: str) -> List[Dict]:
+    """
+    Completion of every course the user has started, newest first.
+    """
+    pipeline = [
+        {"$match": {"userId": user_id}},
+        {"$project": {"_id": 0, "courseId": 1, "status": 1, "totalProgress": 1, "moduleCount": 1,
+                      "completedModules": 1, "updatedAt": 1}},
+        {"$sort": {"updatedAt": -1}},
+    ]
+    rows = await db.progress.aggregate(pipeline).to_list(length=None)
+    for row in rows:
+        row["completedModules"] = len(row.get("completedModules", []))
+    return rows
+
+
+async def course_completion_stats(course_id: str) -> Dict:
+    """
+    Learners per status and their average progress for one course.
+    """
+    pipeline = [
+        {"$match": {"courseId": course_id}},
+        {"$group": {"_id": "$status", "learners": {"$sum": 1}, "avgProgress": {"$avg": "$totalProgress"}}},
+    ]
+    stats = {"courseId": course_id, "learners": 0, "completed": 0, "avgCompletedProgress": 0}
+    async for group in db.progress.aggregate(pipeline):
+        stats["learners"] += group["learners"]
+        if group["_id"] == "completed":
+            stats["completed"] = group["learners"]
+            stats["avgCompletedProgress"] = round(group["avgProgress"] or 0, 2)
+    return stats
+
+
+async def delete_course_progress(course_id: str) -> int:
+    result = await db.progress.delete_many({"courseId": course_id})
+    return result.deleted_count
@@ -0,0 +1,35 @@
+"""
+Stable system-instruction blocks for the Gemini prompts.
+
+The long curriculum instructions (role, rules, output JSON schema) are kept apart
+from the per-call variables and sent as the model's system instruction, so every
+call for a call site starts with the same prefix and only the variables change.
+
+Provider-side context caching is not used: Gemini only caches content of at
+least 1024 tokens, and each of these blocks is around 250-350 tokens.
+"""
+import hashlib
+import textwrap
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Instructions:
+    """
+    A named, stable system-instruction block.
+    """
+    name: str
+    text: str
+
+    @classmethod
+    def dedent(cls, name: str, text: str) -> "Instructions":
+        # Indentation from the source file is billed as input tokens on every call.
+        return cls(name, textwrap.dedent(text).strip())
+
+    @property
+    def key(self) -> str:
+        return hashlib.blake2b(self.text.encode("utf-8"), digest_size=8).hexdigest()
+
+    @property
+    def tokens(self) -> int:
+        return len(self.text) // 4
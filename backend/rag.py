@@ -1,13 +1,27 @@
 from pathlib import Path
+import asyncio
+import hashlib
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
+try:
+    import chat_sessions
+    import chunking
+    import circuit_breaker
+    import metrics
+    import model_router
+    import vector_index
+except ImportError:
+    from backend import chat_sessions, chunking, circuit_breaker, metrics, model_router, vector_index
+
 # Load env variables
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env.local")
@@ -18,62 +32,116 @@ if not GOOGLE_API_KEY:
     load_dotenv()
     GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
 
+RAG_INDEX_DIR = Path(os.getenv("RAG_INDEX_DIR", BASE_DIR / "backend" / "faiss_index"))
+RAG_TENANTS_DIR = Path(os.getenv("RAG_TENANTS_DIR", BASE_DIR / "backend" / "knowledge_base" / "tenants"))
+KNOWLEDGE_BASE_SUFFIXES = (".txt", ".md")
+
+RAG_RELOADS = metrics.registry.counter(
+    "rag_index_reloads_total", "RAG index reloads by outcome.", ("outcome",)
+)
+RAG_TENANT_LOADS = metrics.registry.counter(
+    "rag_tenant_loads_total", "Tenant knowledge-base lookups by outcome.", ("outcome",)
+)
+RAG_TENANT_INDEXES = metrics.registry.gauge(
+    "rag_tenant_indexes_loaded", "Tenant RAG indexes currently loaded."
+)
+RAG_TENANT_BYTES = metrics.registry.gauge(
+    "rag_tenant_index_bytes", "On-disk size of the loaded tenant RAG indexes."
+)
+
 class RAGService:
-    def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GOOGLE_API_KEY)
-        self.vector_store_path = BASE_DIR / "backend" / "faiss_index"
-        self.knowledge_base_path = BASE_DIR / "backend" / "knowledge_base" / "nexor_data.txt"
+    def __init__(self, knowledge_base_path=None, vector_store_path=None, embeddings=None, tenant=None):
+        self.tenant = tenant
+        self.embeddings = embeddings or GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GOOGLE_API_KEY)
+        self.vector_store_path = Path(vector_store_path or RAG_INDEX_DIR)
+        # A single file, or a directory of .txt/.md files
+        self.knowledge_base_path = Path(knowledge_base_path or BASE_DIR / "backend" / "knowledge_base" / "nexor_data.txt")
+        self.index_type = vector_index.index_type_from_env()
         self.vector_store = None
         self.agent_chain = None
+        self._reload_lock = threading.Lock()
+        self._fingerprint = None  # (file stats, content hash) of the last fingerprint
         
         # Initialize
-        self._initialize_vector_store()
-        self._initialize_agent()
+        self.vector_store = self._initialize_vector_store()
+        self.agent_chain = self._initialize_agent(self.vector_store)
+
+    def _knowledge_base_files(self):
+        if self.knowledge_base_path.is_dir():
+            return sorted(p for p in self.knowledge_base_path.iterdir() if p.suffix in KNOWLEDGE_BASE_SUFFIXES)
+        return [self.knowledge_base_path] if self.knowledge_base_path.exists() else []
+
+    def _knowledge_base_fingerprint(self):
+        """
+        Content hash of the knowledge base. Files are only re-read when their names,
+        sizes or modification times changed since the last call.
+        """
+        files = self._knowledge_base_files()
+        if not files:
+            return None
+        stats = tuple((path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in files)
+        if self._fingerprint and self._fingerprint[0] == stats:
+            return self._fingerprint[1]
+        digest = hashlib.blake2b(chunking.SETTINGS.encode(), digest_size=16)
+        for path in files:
+            digest.update(path.name.encode() + b"\0" + path.read_bytes() + b"\0")
+        self._fingerprint = (stats, digest.hexdigest())
+        return self._fingerprint[1]
 
     def _initialize_vector_store(self):
         """
-        Loads the FAISS index if it exists, otherwise creates it from the knowledge base.
+        Memory-maps the live FAISS index version if it matches the knowledge base,
+        otherwise publishes a new version built from it. Indexes in the old pickled
+        format, or built with another RAG_INDEX_TYPE, are rebuilt.
         """
-        if self.vector_store_path.exists() and (self.vector_store_path / "index.faiss").exists():
-            print("DEBUG: Loading existing FAISS index...")
-            self.vector_store = FAISS.load_local(
-                str(self.vector_store_path), 
-                self.embeddings,
-                allow_dangerous_deserialization=True # Local file is safe
-            )
-        else:
-            print("DEBUG: Creating new FAISS index from knowledge base...")
-            self._create_vector_store()
+        version = vector_index.resolve(self.vector_store_path)
+        fingerprint = self._knowledge_base_fingerprint()
+        if vector_index.is_current(version, self.index_type, fingerprint):
+            print(f"DEBUG: Memory-mapping FAISS index {version.name}...")
+            return vector_index.MmapVectorIndex(version, self.embeddings)
+        print("DEBUG: Creating new FAISS index from knowledge base...")
+        return self._create_vector_store(fingerprint)
 
-    def _create_vector_store(self):
+    def _create_vector_store(self, fingerprint=None, force=False):
         """
-        Ingests data from knowledge_base/nexor_data.txt and creates a FAISS index.
+        Ingests the knowledge base (knowledge_base/nexor_data.txt by default) and
+        publishes a new FAISS index version.
         """
-        if not self.knowledge_base_path.exists():
+        files = self._knowledge_base_files()
+        if not files:
             print(f"Error: Knowledge base file not found at {self.knowledge_base_path}")
-            return
+            return None
 
-        loader = TextLoader(str(self.knowledge_base_path))
-        documents = loader.load()
+        documents = [doc for path in files for doc in TextLoader(str(path), encoding="utf-8").load()]
         
-        text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
+        # Small chunks are embedded; the retriever expands them to their sections.
+        chunks, sections = chunking.split_documents(documents)
         
-        self.vector_store = FAISS.from_documents(texts, self.embeddings)
-        self.vector_store.save_local(str(self.vector_store_path))
+        vector_store = vector_index.MmapVectorIndex.build(
+            self.vector_store_path, chunks, self.embeddings, self.index_type, fingerprint, force, sections
+        )
         print("DEBUG: FAISS index created and saved.")
+        return vector_store
 
-    def _initialize_agent(self):
+    def _initialize_agent(self, vector_store):
         """
-        Sets up the LangChain RetrievalQA chain with a custom prompt.
+        Sets up the LangChain RetrievalQA chain with a custom prompt over `vector_store`.
         """
-        if not self.vector_store:
+        if not vector_store:
             print("Error: Vector store not initialized.")
-            return
+            return None
 
-        llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=GOOGLE_API_KEY, temperature=0.3)
+        # One chat model per tier of the route; later tiers answer when earlier ones fail.
+        route = model_router.router.route("rag")
+        llm, *fallbacks = [
+            ChatGoogleGenerativeAI(model=model_name, google_api_key=GOOGLE_API_KEY, temperature=route.temperature,
+                                   max_output_tokens=route.max_output_tokens, timeout=route.timeout)
+            for model_name in route.models
+        ]
+        if fallbacks:
+            llm = llm.with_fallbacks(fallbacks)
         
-        retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})
+        retriever = vector_store.as_retriever()
         
         prompt_template = """
         You are an expert AI Assistant for "Nexor Navigator", a career development platform.
@@ -98,27 +166,236 @@ class RAGService:
             template=prompt_template, input_variables=["context", "question"]
         )
         
-        self.agent_chain = RetrievalQA.from_chain_type(
+        return RetrievalQA.from_chain_type(
             llm=llm,
             chain_type="stuff",
             retriever=retriever,
             chain_type_kwargs={"prompt": PROMPT}
         )
 
-    def get_response(self, query: str):
+    def index_info(self):
+        if not self.vector_store:
+            return {"version": None}
+        meta = self.vector_store.meta
+        return {"version": self.vector_store.path.name, "type": meta["factory"], "vectors": meta["count"],
+                "builtAt": meta.get("builtAt")}
+
+    def reload(self, rebuild: bool = False):
+        """
+        Loads the live index version (publishing a new one first if the knowledge
+        base changed, or always when `rebuild`) and swaps it in. Queries already
+        running keep the chain they started with. Blocking; run it off the event loop.
+        """
+        with self._reload_lock:
+            previous = self.index_info()["version"]
+            if not rebuild and not self.has_updates():
+                RAG_RELOADS.inc(outcome="unchanged")
+                return {**self.index_info(), "previous": previous, "changed": False}
+            try:
+                if rebuild:
+                    vector_store = self._create_vector_store(self._knowledge_base_fingerprint(), force=True)
+                else:
+                    vector_store = self._initialize_vector_store()
+                if not vector_store:
+                    raise RuntimeError("no index could be loaded")
+                if self.vector_store and vector_store.path == self.vector_store.path:
+                    RAG_RELOADS.inc(outcome="unchanged")
+                    return {**self.index_info(), "previous": previous, "changed": False}
+                agent_chain = self._initialize_agent(vector_store)
+            except Exception:
+                RAG_RELOADS.inc(outcome="error")
+                raise
+            # Swap both references together; get_response reads the chain once per query.
+            self.vector_store, self.agent_chain = vector_store, agent_chain
+            RAG_RELOADS.inc(outcome="swapped")
+            print(f"DEBUG: RAG index swapped from {previous} to {vector_store.path.name}")
+            return {**self.index_info(), "previous": previous, "changed": True}
+
+    def has_updates(self) -> bool:
+        """
+        True if another worker published a new version or the knowledge base changed.
+        """
+        live = vector_index.resolve(self.vector_store_path)
+        if not self.vector_store or live != self.vector_store.path:
+            return True
+        return not vector_index.is_current(live, self.index_type, self._knowledge_base_fingerprint())
+
+    def index_bytes(self) -> int:
+        if not self.vector_store:
+            return 0
+        return sum(p.stat().st_size for p in self.vector_store.path.iterdir() if p.is_file())
+
+    async def _answer_in_session(self, agent_chain, query: str, session):
+        """
+        Answers a turn of a chat session. Follow-ups reuse the records earlier
+        turns were grounded on, searching only for terms those don't cover, and
+        the question carries the session's rolling summary.
+        """
+        retriever = agent_chain.retriever
+        index = retriever.index
+        version = index.path.name
+        cached = [index.document(int(i)) for i in session.context_ids(version)]
+        if cached and chat_sessions.is_follow_up(query):
+            known = set(chat_sessions.content_terms(" ".join(doc.page_content for doc in cached)))
+            if set(chat_sessions.content_terms(query)) <= known:
+                mode, documents = "reused", cached
+            else:
+                mode, documents = "merged", await retriever.ainvoke(query) + cached
+        else:
+            mode, documents = "searched", await retriever.ainvoke(query)
+        documents = index.within_budget(documents, retriever.max_tokens)
+        chat_sessions.SESSION_RETRIEVALS.inc(mode=mode)
+
+        question = f"{query}\n\nConversation so far:\n{session.summary}" if session.turns else query
+        output = await agent_chain.combine_documents_chain.ainvoke({"input_documents": documents, "question": question})
+        answer = output["output_text"]
+        session.remember(query, answer, version, [doc.id for doc in documents])
+        return answer
+
+    async def get_response(self, query: str, session=None):
         """
-        Generates a response for the user query.
+        Generates a response for the user query, within `session` if given.
+        Retrieval for concurrent queries is batched by the index (see
+        vector_index.QueryBatcher).
         """
-        if not self.agent_chain:
+        agent_chain = self.agent_chain
+        if not agent_chain:
             return "Agent not initialized properly."
+        if not circuit_breaker.gemini.allow():
+            metrics.GEMINI_CALLS.inc(call_site="rag", outcome="circuit_open")
+            return "The assistant is temporarily unavailable. Please try again in a minute."
             
+        start = time.perf_counter()
         try:
             print(f"DEBUG: Processing RAG query: {query}")
-            response = self.agent_chain.invoke({"query": query})
-            return response["result"]
+            if session is not None:
+                result = await self._answer_in_session(agent_chain, query, session)
+            else:
+                result = (await agent_chain.ainvoke({"query": query}))["result"]
+            circuit_breaker.gemini.record_success()
+            metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site="rag")
+            metrics.GEMINI_CALLS.inc(call_site="rag", outcome="success")
+            return result
         except Exception as e:
+            metrics.GEMINI_LATENCY.observe(time.perf_counter() - start, call_site="rag")
+            circuit_breaker.gemini.record_failure(rate_limited=metrics.is_rate_limit_error(e))
+            if metrics.is_rate_limit_error(e):
+                metrics.GEMINI_CALLS.inc(call_site="rag", outcome="rate_limited")
+                metrics.GEMINI_RATE_LIMITED.inc(call_site="rag")
+            else:
+                metrics.GEMINI_CALLS.inc(call_site="rag", outcome="error")
             print(f"Error in RAG generation: {e}")
             return "I encountered an error processing your request. Please try again."
 
-# Singleton instance
+class UnknownTenantError(Exception):
+    pass
+
+
+class RAGPool:
+    """
+    Per-tenant RAG services. The default knowledge base is always loaded; tenant
+    corpora live in RAG_TENANTS_DIR/<tenant>/ and their indexes in
+    RAG_INDEX_DIR/tenants/<tenant>/. Tenants are loaded on first use and the least
+    recently used ones are dropped once the loaded indexes exceed
+    RAG_TENANT_CACHE_MAX_BYTES or RAG_TENANT_CACHE_MAX_TENANTS.
+    """
+    TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+    def __init__(self, default: RAGService, tenants_dir: Path = RAG_TENANTS_DIR, index_dir: Path = RAG_INDEX_DIR,
+                 max_bytes: int = None, max_tenants: int = None):
+        self.default = default
+        self.tenants_dir = Path(tenants_dir)
+        self.index_dir = Path(index_dir) / "tenants"
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("RAG_TENANT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+        self.max_tenants = max_tenants if max_tenants is not None else int(os.getenv("RAG_TENANT_CACHE_MAX_TENANTS", "100"))
+        self._services = OrderedDict()  # tenant -> (RAGService, index bytes)
+        self._lock = threading.Lock()
+        self._loading = {}  # tenant -> lock held while that tenant loads
+        self.evictions = 0
+
+    def get(self, tenant=None) -> RAGService:
+        """
+        Returns the service for `tenant`, loading (and if needed building) its index.
+        Blocking on a cold tenant; call it off the event loop.
+        """
+        if not tenant:
+            return self.default
+        if not self.TENANT_ID.match(tenant) or not (self.tenants_dir / tenant).is_dir():
+            RAG_TENANT_LOADS.inc(outcome="unknown")
+            raise UnknownTenantError(f"Unknown knowledge base: {tenant}")
+        with self._lock:
+            if tenant in self._services:
+                self._services.move_to_end(tenant)
+                RAG_TENANT_LOADS.inc(outcome="hit")
+                return self._services[tenant][0]
+            loading = self._loading.setdefault(tenant, threading.Lock())
+        # Concurrent requests for a cold tenant wait for a single load.
+        with loading:
+            with self._lock:
+                if tenant in self._services:
+                    RAG_TENANT_LOADS.inc(outcome="hit")
+                    return self._services[tenant][0]
+            service = RAGService(self.tenants_dir / tenant, self.index_dir / tenant,
+                                 embeddings=self.default.embeddings, tenant=tenant)
+            RAG_TENANT_LOADS.inc(outcome="miss")
+            with self._lock:
+                self._services[tenant] = (service, service.index_bytes())
+                self._loading.pop(tenant, None)
+                self._evict()
+            return service
+
+    def _evict(self):
+        """
+        Drops least recently used tenants until the budget fits. Queries already
+        running on an evicted index keep it mapped until they finish.
+        """
+        while self._services and (len(self._services) > self.max_tenants or
+                                  sum(size for _, size in self._services.values()) > self.max_bytes):
+            if len(self._services) == 1:
+                break  # a tenant larger than the whole budget still gets served
+            tenant, _ = self._services.popitem(last=False)
+            self.evictions += 1
+            print(f"DEBUG: Evicted RAG index for tenant {tenant}")
+        RAG_TENANT_INDEXES.set(len(self._services))
+        RAG_TENANT_BYTES.set(sum(size for _, size in self._services.values()))
+
+    def loaded(self):
+        with self._lock:
+            return [(None, self.default)] + [(tenant, service) for tenant, (service, _) in self._services.items()]
+
+    def reload(self, tenant=None, rebuild: bool = False):
+        service = self.get(tenant)
+        result = service.reload(rebuild)
+        if tenant:
+            with self._lock:
+                if tenant in self._services:
+                    self._services[tenant] = (service, service.index_bytes())
+                    self._evict()
+        return result
+
+    async def watch(self, interval: float):
+        """
+        Polls the loaded indexes for new versions or knowledge-base changes and
+        reloads them in a worker thread.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for tenant, service in self.loaded():
+                try:
+                    if await asyncio.to_thread(service.has_updates):
+                        await asyncio.to_thread(self.reload, tenant)
+                except Exception as e:
+                    print(f"Warning: RAG index reload failed for {tenant or 'default'}: {e}")
+
+    def stats(self):
+        with self._lock:
+            tenants = {tenant: {**service.index_info(), "bytes": size}
+                       for tenant, (service, size) in reversed(self._services.items())}
+            used = sum(size for _, size in self._services.values())
+        return {"default": self.default.index_info(), "tenants": tenants, "bytes": used,
+                "maxBytes": self.max_bytes, "maxTenants": self.max_tenants, "evictions": self.evictions}
+
+
+# Singleton instances
 rag_service = RAGService()
+rag_pool = RAGPool(rag_service)
@@ -0,0 +1,280 @@
+"""
+Local, deterministic skill matching for skill-gap analysis.
+
+Skills are normalized (case, punctuation, ".js"-style suffixes), mapped onto a
+canonical name through an alias dictionary and, for anything still unmatched,
+compared by cosine similarity of character-trigram vectors. All similarities for a
+request are computed as one NumPy matrix product, so a match takes microseconds
+instead of a Gemini round-trip. A fuzzy match must also agree word for word
+(allowing plurals and one-letter typos, never different version numbers), so
+"Product Management", "Python 3" and "Spring Boot" don't pass for "Project
+Management", "Python 2" and "Spring".
+"""
+import re
+import unicodedata
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# canonical name -> normalized variants that mean the same skill
+SKILL_ALIASES: Dict[str, Sequence[str]] = {
+    "javascript": ["js", "ecmascript", "es6", "vanilla js"],
+    "typescript": ["ts"],
+    "react": ["reactjs", "react js", "react.js"],
+    "react native": ["reactnative"],
+    "node.js": ["node", "nodejs", "node js"],
+    "next.js": ["nextjs", "next js"],
+    "vue": ["vuejs", "vue js", "vue.js"],
+    "angular": ["angularjs", "angular js", "angular.js"],
+    "express": ["expressjs", "express js", "express.js"],
+    "python": ["python3", "python 3", "py"],
+    "go": ["golang"],
+    "c++": ["cpp", "cplusplus"],
+    "c#": ["csharp", "c sharp"],
+    ".net": ["dotnet", "dot net", "asp.net"],
+    "kubernetes": ["k8s"],
+    "aws": ["amazon web services"],
+    "gcp": ["google cloud", "google cloud platform"],
+    "azure": ["microsoft azure"],
+    "postgresql": ["postgres", "psql"],
+    "mongodb": ["mongo"],
+    "sql": ["structured query language"],
+    "machine learning": ["ml"],
+    "deep learning": ["dl"],
+    "artificial intelligence": ["ai"],
+    "natural language processing": ["nlp"],
+    "ci/cd": ["cicd", "ci cd", "continuous integration", "continuous delivery"],
+    "rest api": ["rest", "restful", "rest apis", "restful api", "restful apis"],
+    "html": ["html5"],
+    "css": ["css3"],
+    "scikit-learn": ["sklearn", "scikit learn"],
+    "git": ["github", "version control"],
+    "data structures and algorithms": ["dsa", "data structures & algorithms", "algorithms and data structures"],
+}
+
+# Trailing words that don't change which skill is meant ("Docker basics" == "Docker").
+_NOISE_SUFFIXES = ("framework", "library", "language", "programming", "basics", "fundamentals")
+
+SIMILARITY_THRESHOLD = 0.75
+EMBEDDING_DIM = 512
+
+
+def normalize_skill(skill: str) -> str:
+    """
+    Lower-cases and simplifies a skill name: "  React.JS " -> "react.js".
+    Characters that carry meaning in skill names (+, #, ., /) are kept.
+    """
+    text = unicodedata.normalize("NFKC", skill).lower().replace("&", " and ")
+    text = re.sub(r"[^\w+#./ ]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip(" ./")
+    words = text.split(" ")
+    while len(words) > 1 and words[-1] in _NOISE_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def _build_alias_index(aliases: Dict[str, Sequence[str]]) -> Dict[str, str]:
+    index = {}
+    for canonical, variants in aliases.items():
+        key = normalize_skill(canonical)
+        index[key] = key
+        for variant in variants:
+            index[normalize_skill(variant)] = key
+    return index
+
+
+def _words_agree(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if not (a.isalpha() and b.isalpha()):
+        return False  # versions and other tokens with digits must be identical
+    if a.rstrip("s") == b.rstrip("s") or (a.endswith("es") and a[:-2] == b) or (b.endswith("es") and b[:-2] == a):
+        return True
+    if len(a) != len(b) or len(a) < 6:
+        return False
+    return sum(x != y for x, y in zip(a, b)) <= 1
+
+
+def tokens_agree(a: str, b: str) -> bool:
+    """
+    Whether two normalized skill names name the same thing word for word:
+    "systems design" / "system design" and "postgre sql" / "postgresql" agree,
+    "project management" / "product management", "python 2" / "python 3" and
+    "spring" / "spring boot" don't.
+    """
+    words_a, words_b = a.split(), b.split()
+    if "".join(words_a) == "".join(words_b):
+        return True
+    return len(words_a) == len(words_b) and all(_words_agree(x, y) for x, y in zip(words_a, words_b))
+
+
+def trigram_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Hashes character trigrams (and whole words) into a fixed-size unit vector.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f"  {text} "
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode()) % dim] += 1.0
+    for word in text.split():
+        vector[zlib.crc32(f"w:{word}".encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SkillMatcher:
+    """
+    Matches employee skills against required skills.
+
+    `embedder` maps a normalized skill to a vector; the default trigram hashing
+    embedder needs no network. Pass `similarity_threshold=None` to disable fuzzy
+    matching and rely on normalization and aliases only.
+    """
+    def __init__(self, aliases: Dict[str, Sequence[str]] = None,
+                 embedder: Optional[Callable[[str], np.ndarray]] = None,
+                 similarity_threshold: Optional[float] = SIMILARITY_THRESHOLD, max_cache_entries: int = 20000):
+        self.alias_index = _build_alias_index(SKILL_ALIASES if aliases is None else aliases)
+        self.embedder = embedder or trigram_embedding
+        self.similarity_threshold = similarity_threshold
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._canonical: Dict[str, str] = {}
+        self.max_cache_entries = max_cache_entries
+
+    def canonical(self, skill: str) -> str:
+        cached = self._canonical.get(skill)
+        if cached is not None:
+            return cached
+        key = normalize_skill(skill)
+        if key not in self.alias_index:
+            # "react.js" style names: try again without the dotted suffix
+            stripped = re.sub(r"\.?(js|py)$", "", key).strip()
+            key = self.alias_index.get(stripped, key)
+        else:
+            key = self.alias_index[key]
+        if len(self._canonical) >= self.max_cache_entries:
+            self._canonical.clear()
+        self._canonical[skill] = key
+        return key
+
+    def _vector(self, key: str) -> np.ndarray:
+        vector = self._vectors.get(key)
+        if vector is None:
+            if len(self._vectors) >= self.max_cache_entries:
+                self._vectors.clear()
+            vector = self._vectors[key] = np.asarray(self.embedder(key), dtype=np.float32)
+        return vector
+
+    def similarity_matrix(self, rows: Sequence[str], columns: Sequence[str]) -> np.ndarray:
+        """
+        Cosine similarities between canonical skill names (rows x columns).
+        """
+        if not rows or not columns:
+            return np.zeros((len(rows), len(columns)), dtype=np.float32)
+        a = np.stack([self._vector(r) for r in rows])
+        b = np.stack([self._vector(c) for c in columns])
+        return a @ b.T
+
+    def _coverage(self, required_keys: List[str], employee_keys: List[str], similarity: np.ndarray):
+        """
+        For each required skill returns the index of the employee skill covering it, or -1.
+        """
+        employee_positions = {key: i for i, key in enumerate(employee_keys)}
+        covered = np.full(len(required_keys), -1, dtype=np.int64)
+        for i, key in enumerate(required_keys):
+            if key in employee_positions:
+                covered[i] = employee_positions[key]
+        if self.similarity_threshold is not None and similarity.size:
+            candidates = (similarity >= self.similarity_threshold) & (covered < 0)[:, None]
+            for i in np.flatnonzero(candidates.any(axis=1)):
+                for j in np.argsort(-similarity[i]):
+                    if not candidates[i, j]:
+                        break
+                    if tokens_agree(required_keys[i], employee_keys[j]):
+                        covered[i] = j
+                        break
+        return covered
+
+    def match(self, employee_skills: Iterable[str], required_skills: Iterable[str]) -> Dict:
+        """
+        Returns missing skills, which employee skill covers each required one, and
+        the share of required skills covered as a 0-100 integer.
+        """
+        return self.match_batch([(employee_skills, required_skills)])[0]
+
+    def match_batch(self, pairs: Sequence) -> List[Dict]:
+        """
+        Matches many (employee_skills, required_skills) pairs with a single similarity
+        matrix over every distinct skill involved, instead of one matrix per pair.
+        """
+        prepared = []
+        row_index: Dict[str, int] = {}
+        column_index: Dict[str, int] = {}
+        for employee_skills, required_skills in pairs:
+            employee_skills = [s for s in employee_skills if s and s.strip()]
+            required_skills = list(dict.fromkeys(s for s in required_skills if s and s.strip()))
+            employee_keys = list(dict.fromkeys(self.canonical(s) for s in employee_skills))
+            required_keys = [self.canonical(s) for s in required_skills]
+            original_by_key = {}
+            for skill in employee_skills:
+                original_by_key.setdefault(self.canonical(skill), skill)
+            for key in required_keys:
+                row_index.setdefault(key, len(row_index))
+            for key in employee_keys:
+                column_index.setdefault(key, len(column_index))
+            prepared.append((required_skills, required_keys, employee_keys, original_by_key))
+
+        if self.similarity_threshold is not None:
+            similarity = self.similarity_matrix(list(row_index), list(column_index))
+        results = []
+        for required_skills, required_keys, employee_keys, original_by_key in prepared:
+            if self.similarity_threshold is not None and required_keys and employee_keys:
+                rows = np.fromiter((row_index[k] for k in required_keys), dtype=np.int64)
+                columns = np.fromiter((column_index[k] for k in employee_keys), dtype=np.int64)
+                sub_matrix = similarity[np.ix_(rows, columns)]
+            else:
+                sub_matrix = np.zeros((0, 0))
+            covered = self._coverage(required_keys, employee_keys, sub_matrix)
+            results.append(self._result(required_skills, employee_keys, original_by_key, covered))
+        return results
+
+    @staticmethod
+    def _result(required_skills, employee_keys, original_by_key, covered) -> Dict:
+        missing, matched = [], {}
+        for skill, index in zip(required_skills, covered):
+            if index < 0:
+                missing.append(skill)
+            else:
+                matched[skill] = original_by_key[employee_keys[index]]
+        total = len(required_skills)
+        return {
+            "missingSkills": missing,
+            "matchedSkills": matched,
+            "matchPercentage": round(100 * (total - len(missing)) / total) if total else 100,
+        }
+
+
+def estimate_time(missing_skills: Sequence[str], weeks_per_skill: int = 2) -> str:
+    """
+    Rough time-to-close estimate used instead of asking the model.
+    """
+    if not missing_skills:
+        return "0 weeks"
+    weeks = len(missing_skills) * weeks_per_skill
+    if weeks < 8:
+        return f"{weeks} weeks"
+    return f"{round(weeks / 4.345)} months"
+
+
+def template_recommendations(missing_skills: Sequence[str], target_role: str) -> List[str]:
+    """
+    Fallback recommendations for fast mode or when the model is unavailable.
+    """
+    if not missing_skills:
+        return [f"Strengthen your existing skills with advanced {target_role} projects."]
+    recommendations = [f"Complete a focused course on {skill}." for skill in missing_skills[:2]]
+    recommendations.append(f"Build a hands-on project for a {target_role} role using {', '.join(missing_skills[:3])}.")
+    return recommendations
+
+
+matcher = SkillMatcher()
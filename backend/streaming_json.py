@@ -0,0 +1,82 @@
+"""
+Incremental parsing of streamed JSON model output.
+"""
+import json
+from typing import Dict, List
+
+
+class ArrayItemParser:
+    """
+    Yields the objects of one array in a JSON document, found by its key, as soon
+    as each object is complete:
+
+        parser = ArrayItemParser("modules")
+        for chunk in stream:
+            for module in parser.feed(chunk):
+                ...
+
+    Text around the JSON (such as a ```json fence) is ignored. Items that are not
+    objects, or that don't parse, are skipped.
+    """
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._pending_key = None
+        self._array_depth = None  # stack depth inside the target array, once it is open
+        self._item_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self.text += chunk
+        items = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+            if self.done:
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == ":":
+                self._pending_key = self._last_string if self._stack and self._stack[-1] == "{" else None
+            elif c == ",":
+                self._pending_key = None
+            elif c in "{[":
+                if (c == "[" and self._array_depth is None and self._pending_key == self.key
+                        and self._stack and self._stack[-1] == "{"):
+                    self._array_depth = len(self._stack) + 1
+                elif c == "{" and self._array_depth == len(self._stack):
+                    self._item_start = i
+                self._stack.append(c)
+                self._pending_key = None
+            elif c in "}]" and self._stack:
+                self._stack.pop()
+                if self._array_depth is None:
+                    continue
+                if c == "}" and self._item_start is not None and len(self._stack) == self._array_depth:
+                    try:
+                        item = json.loads(text[self._item_start:i + 1])
+                        if isinstance(item, dict):
+                            items.append(item)
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif len(self._stack) < self._array_depth:
+                    self.done = True  # the array closed; nothing more to find
+        self._pos = len(text)
+        return items
@@ -0,0 +1,58 @@
+"""
+Binds chat requests to an organization's knowledge base.
+
+A tenant token is "<tenant>.<signature>", the signature being an HMAC-SHA256 of
+the tenant id under RAG_TENANT_SIGNING_KEY. An organization's users send it in
+the X-Tenant-Token header (typically added by the organization's SSO proxy), so
+a caller only reaches the knowledge base its token was issued for. Without a
+signing key only the default knowledge base is served.
+
+Issue a token with `python tenant_auth.py <tenant>`.
+"""
+import hashlib
+import hmac
+import os
+import sys
+from typing import Optional
+
+
+class TenantAccessError(Exception):
+    pass
+
+
+def _signing_key(key: Optional[str]) -> bytes:
+    key = os.getenv("RAG_TENANT_SIGNING_KEY") if key is None else key
+    if not key:
+        raise TenantAccessError("Tenant knowledge bases are disabled (RAG_TENANT_SIGNING_KEY is not set)")
+    return key.encode()
+
+
+def _signature(tenant: str, key: bytes) -> str:
+    return hmac.new(key, tenant.encode(), hashlib.sha256).hexdigest()
+
+
+def sign(tenant: str, key: Optional[str] = None) -> str:
+    return f"{tenant}.{_signature(tenant, _signing_key(key))}"
+
+
+def tenant_for(token: Optional[str], requested: Optional[str] = None, key: Optional[str] = None) -> Optional[str]:
+    """
+    The tenant a request may query: the one its token was signed for (None, the
+    default knowledge base, without a token). A `requested` tenant must match it.
+    """
+    if not token:
+        if requested:
+            raise TenantAccessError("A tenant token is required for this knowledge base")
+        return None
+    tenant, _, signature = token.rpartition(".")
+    if not tenant or not hmac.compare_digest(signature.encode(), _signature(tenant, _signing_key(key)).encode()):
+        raise TenantAccessError("Invalid tenant token")
+    if requested and requested != tenant:
+        raise TenantAccessError("The tenant token was issued for another knowledge base")
+    return tenant
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python tenant_auth.py <tenant>")
+    print(sign(sys.argv[1]))
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import admission
+import agent
+
+
+async def queued(gate, priority, order):
+    async with gate.slot(priority):
+        order.append(priority)
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_by_priority_then_arrival():
+    gate = admission.Gate("test", limit=1, queue_size=4, queue_timeout=5, expected_seconds=1)
+    order = []
+    slot = await gate.acquire()
+    tasks = [asyncio.create_task(queued(gate, p, order))
+             for p in (admission.BACKGROUND, admission.BATCH, admission.INTERACTIVE)]
+    await asyncio.sleep(0)
+    assert gate.snapshot()["queued"] == {"interactive": 1, "batch": 1, "background": 1}
+
+    slot.release()
+    await asyncio.gather(*tasks)
+    assert order == [admission.INTERACTIVE, admission.BATCH, admission.BACKGROUND]
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queues_reject_fast_or_shed_lower_priority():
+    gate = admission.Gate("test", limit=1, queue_size=1, queue_timeout=5, expected_seconds=10)
+    slot = await gate.acquire()
+    background = asyncio.create_task(gate.acquire(admission.BACKGROUND))
+    await asyncio.sleep(0)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        await gate.acquire(admission.BACKGROUND)
+    assert rejected.value.status == 429 and rejected.value.retry_after == 20  # 2 waves of ~10s
+
+    interactive = asyncio.create_task(gate.acquire(admission.INTERACTIVE))
+    with pytest.raises(admission.Rejected) as shed:
+        await background
+    assert shed.value.status == 503 and shed.value.reason == "shed"
+
+    slot.release()
+    (await interactive).release()
+    assert gate.snapshot()["inFlight"] == 0 and gate.rejected == 2
+
+
+@pytest.mark.asyncio
+async def test_timed_out_and_cancelled_waiters_free_their_place():
+    gate = admission.Gate("test", limit=1, queue_size=2, queue_timeout=0.01, expected_seconds=1)
+    slot = await gate.acquire()
+    with pytest.raises(admission.Rejected) as timed_out:
+        await gate.acquire()
+    assert timed_out.value.status == 503
+
+    gate.queue_timeout = 5
+    waiter = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    assert gate.snapshot()["queued"]["interactive"] == 0
+    slot.release()
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_saturated_course_generation_returns_a_retry_hint(monkeypatch, fake_gemini):
+    gate = admission.Gate("course_generation", limit=1, queue_size=0, queue_timeout=1, expected_seconds=30)
+    monkeypatch.setitem(admission.gates, "course_generation", gate)
+    fake_gemini()
+
+    async with gate.slot():
+        result = await agent.generate_full_course("Rust")
+    assert result["status"] == 429 and result["retryAfter"] == 30
+    assert "Course generation is at capacity" in result["error"]
@@ -0,0 +1,56 @@
+import pytest
+
+from bench.fake_gemini import FakeGeminiModel, FakeRateLimitError
+from bench.fake_mongo import FakeDatabase
+from bench.fake_youtube import FakeYouTubeServer
+
+
+@pytest.mark.asyncio
+async def test_fake_mongo_updates_nested_module():
+    db = FakeDatabase()
+    result = await db.courses.insert_one({"title": "Python Basics", "modules": [{"moduleTitle": "A", "isCompleted": False}]})
+
+    course = await db.courses.find_one({"title": {"$regex": "^python basics$", "$options": "i"}})
+    assert course["_id"] == result.inserted_id
+
+    await db.courses.update_one({"_id": result.inserted_id}, {"$set": {"modules.0.isCompleted": True}, "$inc": {"views": 1}})
+    course = await db.courses.find_one({"_id": result.inserted_id})
+    assert course["modules"][0]["isCompleted"] is True
+    assert course["views"] == 1
+
+    deleted = await db.courses.delete_one({"_id": result.inserted_id})
+    assert deleted.deleted_count == 1
+    assert await db.courses.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_fake_gemini_is_reproducible_and_injects_failures():
+    import agent
+
+    model = FakeGeminiModel(rate_429=0.0, truncation_rate=1.0, seed=1)
+    response = await model.generate_content_async('Create a detailed course outline for: "Rust"')
+    assert agent.extract_json(response.text) is None
+
+    model = FakeGeminiModel(rate_429=1.0)
+    with pytest.raises(FakeRateLimitError):
+        await model.generate_content_async("anything")
+
+    model = FakeGeminiModel()
+    response = await model.generate_content_async('Create a detailed course outline for: "Rust"')
+    assert agent.extract_json(response.text)["title"] == "Rust"
+
+
+@pytest.mark.asyncio
+async def test_fetch_video_uses_stub_server(monkeypatch):
+    import agent
+
+    server = FakeYouTubeServer().start()
+    try:
+        monkeypatch.setenv("YOUTUBE_API_KEY", "fake")
+        monkeypatch.setenv("YOUTUBE_API_ENDPOINT", server.url)
+        video = await agent.fetch_video_for_topic("binary search")
+    finally:
+        server.stop()
+
+    assert video["title"] == "binary search explained"
+    assert server.request_count == 1
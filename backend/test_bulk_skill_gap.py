@@ -0,0 +1,60 @@
+import pytest
+
+import bulk_skill_gap
+
+ROLES = [{"role": "Cloud Engineer", "skills": ["Python", "AWS", "Docker"]},
+         {"role": "Frontend Engineer", "skills": ["JavaScript", "React", "CSS"]}]
+
+
+async def collect(employees, mode=None):
+    return [r async for r in bulk_skill_gap.analyze_skill_gap_bulk(employees, ROLES, mode)]
+
+
+@pytest.mark.asyncio
+async def test_identical_skill_sets_share_one_packed_prompt(fake_gemini):
+    model = fake_gemini()
+    employees = [
+        {"employeeId": "e1", "skills": ["Python", "React.js"]},
+        {"employeeId": "e2", "skills": ["react", "python"]},
+        {"employeeId": "e3", "skills": ["Python", "AWS", "Docker"], "targetRole": "Cloud Engineer"},
+    ]
+
+    results = await collect(employees)
+
+    rows = [r for r in results if "employeeId" in r]
+    summary = results[-1]["summary"]
+    assert len(rows) == 5
+    assert summary["uniquePairs"] == 3
+    assert summary["llmPrompts"] == 1
+    assert model.calls["ok"] == 1
+
+    e1_cloud = next(r for r in rows if r["employeeId"] == "e1" and r["targetRole"] == "Cloud Engineer")
+    e2_cloud = next(r for r in rows if r["employeeId"] == "e2" and r["targetRole"] == "Cloud Engineer")
+    assert e1_cloud["missingSkills"] == ["AWS", "Docker"]
+    assert e1_cloud["recommendations"] == e2_cloud["recommendations"]
+    assert e1_cloud["recommendations"][0].startswith("Pair with a Cloud Engineer")
+
+    e3 = next(r for r in rows if r["employeeId"] == "e3")
+    assert e3["matchPercentage"] == 100
+
+
+@pytest.mark.asyncio
+async def test_fast_mode_and_unknown_role(fake_gemini):
+    model = fake_gemini()
+
+    results = await collect([{"employeeId": "e1", "skills": ["CSS"], "targetRole": "Data Scientist"},
+                             {"employeeId": "e2", "skills": ["CSS"]}], mode="fast")
+
+    assert results[0]["error"].startswith("Unknown target role")
+    assert sum(1 for r in results if r.get("employeeId") == "e2") == 2
+    assert model.calls["ok"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_mode_is_rejected(fake_gemini):
+    model = fake_gemini()
+
+    with pytest.raises(ValueError, match="Unknown skill gap mode 'fastt'"):
+        await collect([{"employeeId": "e1", "skills": ["CSS"]}], mode="fastt")
+    assert bulk_skill_gap.resolve_mode("LLM") == "hybrid"
+    assert model.calls["ok"] == 0
@@ -0,0 +1,46 @@
+import chat_sessions
+
+
+def test_follow_up_detection():
+    assert chat_sessions.is_follow_up("and how long does that take?")
+    assert chat_sessions.is_follow_up("What about the quizzes?")
+    assert chat_sessions.is_follow_up("Is it mandatory?")
+    assert not chat_sessions.is_follow_up("How does the skill gap analysis work?")
+    assert chat_sessions.content_terms("and how long does that take?") == []
+    assert chat_sessions.content_terms("What about quizzes?") == ["quizze"]
+
+
+def test_sessions_expire_when_idle_and_are_bounded(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(chat_sessions.time, "monotonic", lambda: clock[0])
+    store = chat_sessions.SessionStore(max_sessions=2, idle_seconds=60)
+
+    first = store.get_or_create(None)
+    assert store.get_or_create(first.id) is first
+    other = store.get_or_create(first.id, tenant="acme")  # sessions don't cross tenants
+    assert other is not first and other.id != first.id
+    assert store.get_or_create(first.id) is first  # and the original isn't replaced
+
+    clock[0] = 30
+    b = store.get_or_create("guessed")
+    assert b.id != "guessed"  # unknown ids get a server-generated one
+    clock[0] = 50
+    store.get_or_create(None)
+    assert store.stats()["sessions"] == 2
+
+    clock[0] = 95
+    assert store.stats()["sessions"] == 1  # b was idle for over a minute
+    assert store.get_or_create(b.id) is not b
+
+
+def test_summary_and_context_stay_within_budget(monkeypatch):
+    monkeypatch.setattr(chat_sessions, "SUMMARY_TOKENS", 40)
+    monkeypatch.setattr(chat_sessions, "CONTEXT_RECORDS", 3)
+    session = chat_sessions.ChatSession(id="s")
+    for turn in range(5):
+        session.remember(f"Question {turn} about roadmaps?", f"Answer {turn}. More detail follows.", "v1",
+                         [str(turn), str(turn + 10)])
+    assert session.record_ids == ["4", "14", "3"]
+    assert len(session.summary) // 4 <= 40
+    assert session.turns[-1] == "Q: Question 4 about roadmaps? A: Answer 4."
+    assert session.context_ids("v2") == []  # records from another index version are not reused
@@ -0,0 +1,42 @@
+from langchain_core.documents import Document
+
+import chunking
+
+GUIDE = """Welcome to the platform.
+
+# Guide
+Read this first.
+
+## Setup
+2024 Revenue grew.
+
+3. Progress Tracking System
+Tracks completion percentage of course.
+3.1 Quiz Scores
+Displays quiz performance.
+
+FAQ
+===
+Ask your lead."""
+
+
+def test_sections_follow_headings():
+    sections = chunking.split_sections(GUIDE)
+    assert [s.heading for s in sections] == [
+        "", "Guide", "Guide > Setup", "3. Progress Tracking System",
+        "3. Progress Tracking System > 3.1 Quiz Scores", "FAQ"]
+    assert sections[2].body == "2024 Revenue grew."
+    assert sections[-1].body == "Ask your lead."
+
+
+def test_children_are_small_and_point_to_their_section():
+    long_section = "# Roadmap\n" + "\n".join(f"Step {i} builds on the previous step." for i in range(40))
+    children, parents = chunking.split_documents([Document(page_content=long_section, metadata={"source": "kb"})],
+                                                 chunk_chars=200)
+    assert len(parents) == 1 and len(children) > 5
+    assert all(len(child.page_content) <= 200 + len("Roadmap\n") for child in children)
+    assert all(child.page_content.startswith("Roadmap\n") for child in children)
+    assert {child.metadata["parent"] for child in children} == {0}
+    assert "Step 39" in parents[0].page_content and parents[0].metadata == {"source": "kb", "section": "Roadmap"}
+    # No overlap: every line is in exactly one child.
+    assert sum(child.page_content.count("Step ") for child in children) == 40
@@ -0,0 +1,95 @@
+import pytest
+
+import agent
+import circuit_breaker
+import course_search
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: clock[0])
+    breaker = circuit_breaker.CircuitBreaker("test", failure_rate=0.5, min_calls=4, open_seconds=10)
+
+    for outcome in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record_success() if outcome else breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+    assert not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.allow()          # single half-open probe
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.retry_after() == 20  # backs off
+
+    clock[0] += 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_cancelled_probe_gives_its_place_up(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: clock[0])
+    breaker = circuit_breaker.CircuitBreaker("test", failure_rate=0.5, min_calls=2, open_seconds=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    clock[0] += 10
+    assert breaker.allow()          # the probe's caller is cancelled and never records
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+
+    clock[0] += 10
+    assert breaker.allow()          # the lease ran out; a new probe goes through
+    breaker.record_success()
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_rate_limits_trip_before_the_error_threshold():
+    breaker = circuit_breaker.CircuitBreaker("test", failure_rate=0.9, rate_limit_rate=0.2, min_calls=5)
+    for _ in range(4):
+        breaker.record_success()
+    breaker.record_failure(rate_limited=True)
+    assert breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_open_gemini_breaker_fails_fast_to_degraded_responses(monkeypatch, fake_gemini):
+    model = fake_gemini(rate_429=1.0)
+    monkeypatch.setattr(circuit_breaker, "gemini", circuit_breaker.CircuitBreaker("gemini", min_calls=1))
+    monkeypatch.setattr(course_search, "index", course_search.CourseSearchIndex())
+    monkeypatch.setattr(course_search, "db", None)
+    course_search.index.add({"_id": "c1", "title": "Data Engineering Fundamentals", "description": "Pipelines"})
+
+    assert await agent.generate_with_retry("anything", call_site="outline") is None
+    assert model.calls["rate_limited"] == 2  # both outline tiers 429'd; tripped with no retry sleep
+
+    gap = await agent.analyze_skill_gap(["Python"], "Data Engineer", ["Python", "Spark"], mode="llm")
+    assert gap["missingSkills"] == ["Spark"]
+    assert gap["degraded"] is True
+
+    recommendations = await agent.get_recommendations_with_links("Data Engineering", use_cache=False)
+    assert recommendations is None  # batch callers still see the failure
+    monkeypatch.setattr(agent, "db", None)
+    recommendations = await agent.get_recommendations_with_links("Data Engineering")
+    assert recommendations["degraded"] is True
+    assert recommendations["courses"][0]["title"] == "Data Engineering Fundamentals"
+
+    course = await agent.generate_full_course("Rust")
+    assert course["retryAfter"] > 0
+    assert model.calls["rate_limited"] == 2
+
+
+@pytest.mark.asyncio
+async def test_open_youtube_breaker_defers_videos(monkeypatch):
+    breaker = circuit_breaker.CircuitBreaker("youtube", min_calls=1)
+    breaker.record_failure(rate_limited=True)
+    monkeypatch.setattr(circuit_breaker, "youtube", breaker)
+    monkeypatch.setenv("YOUTUBE_API_KEY", "fake")
+    monkeypatch.setenv("YOUTUBE_API_ENDPOINT", "http://127.0.0.1:9")  # never contacted
+
+    video = await agent.fetch_video_for_topic("binary search")
+    assert video["deferred"] is True
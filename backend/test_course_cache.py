@@ -0,0 +1,63 @@
+import pytest
+
+import agent
+import course_cache
+
+
+def course(course_id, title, padding=0):
+    return {"_id": course_id, "title": title, "modules": [{"moduleTitle": "A", "notes": "x" * padding}]}
+
+
+@pytest.mark.asyncio
+async def test_lru_is_bounded_by_bytes_and_expires(monkeypatch):
+    cache = course_cache.CourseCache(max_bytes=2500, ttl=60)
+    await cache.put(course("1", "Python Basics", 1000), "Intro to Python")
+    await cache.put(course("2", "Rust", 1000))
+    await cache.get_by_id("1")  # "1" is now the most recently used
+    await cache.put(course("3", "Go", 1000))
+
+    assert await cache.get_by_id("2") is None
+    assert (await cache.get_by_title("intro  to PYTHON"))["_id"] == "1"
+    assert cache.stats()["bytes"] <= 2500
+
+    clock = [1000.0]
+    monkeypatch.setattr(course_cache.time, "monotonic", lambda: clock[0])
+    await cache.put(course("4", "Docker"))
+    clock[0] += 61
+    assert await cache.get_by_title("Docker") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_and_invalidation_across_workers():
+    shared = course_cache.LocalSharedBackend()
+    worker_a = course_cache.CourseCache(shared=shared)
+    worker_b = course_cache.CourseCache(shared=shared)
+
+    await worker_a.put(course("1", "Python Basics"), "Intro to Python")
+    assert (await worker_b.get_by_title("Intro to Python"))["title"] == "Python Basics"
+
+    assert (await worker_b.get_by_id("1"))["title"] == "Python Basics"  # now a local hit for worker B
+
+    await worker_a.invalidate("1")
+    assert await worker_b.get_by_id("1") is None
+    assert await worker_b.get_by_title("Python Basics") is None
+
+    await worker_b.put(course("1", "Python Basics 2"))  # reloaded after the invalidation
+    assert (await worker_b.get_by_id("1"))["title"] == "Python Basics 2"
+
+
+@pytest.mark.asyncio
+async def test_hot_course_is_served_without_the_database(fake_gemini, fake_db):
+    fake_gemini()
+    await fake_db.courses.insert_one({"title": "Python Basics", "modules": []})
+
+    first = await agent.get_course_content("python basics")
+    operations = fake_db.operation_count
+    second = await agent.get_course_content("Python Basics")
+    by_id = await agent.get_course_by_id(first["_id"])
+
+    assert second is first and by_id is first
+    assert fake_db.operation_count == operations
+
+    regenerated = await agent.generate_full_course("Python Basics")
+    assert (await agent.get_course_content("Python Basics"))["modules"] == regenerated["modules"]
@@ -0,0 +1,43 @@
+import pytest
+
+import agent
+import course_search
+
+
+def test_title_terms_fold_levels_aliases_and_stopwords():
+    assert course_search.title_terms("Intro to Python") == ["level:beginner", "python"]
+    assert course_search.title_terms("Python Basics") == ["python", "level:beginner"]
+    assert course_search.title_terms("Machine Learning with React.js") == ["machine learning", "react"]
+
+
+def test_search_ranks_near_duplicates_and_keeps_levels_apart():
+    index = course_search.CourseSearchIndex()
+    index.add({"_id": "1", "title": "Python Basics"})
+    index.add({"_id": "2", "title": "Advanced Python"})
+    index.add({"_id": "3", "title": "Docker Fundamentals"})
+    index.add({"_id": "4", "title": "Python for Me", "userId": "u1"})
+
+    results = index.search("Intro to Python")
+    assert [r["_id"] for r in results[:2]] == ["1", "2"]
+    assert "4" not in {r["_id"] for r in results}
+    assert index.find_close_match("Introduction to Python")["_id"] == "1"
+    assert index.find_close_match("Python 101")["_id"] == "1"
+    assert index.find_close_match("Advanced Docker") is None
+
+    index.remove("1")
+    assert index.find_close_match("Intro to Python") is None
+
+
+@pytest.mark.asyncio
+async def test_course_request_reuses_close_existing_course(fake_gemini, fake_db):
+    model = fake_gemini()
+    await fake_db.courses.insert_one({"title": "Python Basics", "description": "", "modules": []})
+
+    course = await agent.get_course_content("Intro to Python")
+
+    assert course["title"] == "Python Basics"
+    assert model.calls["ok"] == 0
+
+    generated = await agent.get_course_content("Advanced Python")
+    assert generated["title"] == "Advanced Python"
+    assert course_search.index.find_close_match("Mastering Python")["_id"] == str(generated["_id"])
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import db
+
+
+def test_client_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGODB_MAX_POOL_SIZE", "25")
+    monkeypatch.setenv("MONGODB_COMPRESSORS", "zstd,zlib")
+    monkeypatch.setenv("MONGODB_READ_PREFERENCE", "secondaryPreferred")
+
+    options = db.client_options()
+
+    assert options["maxPoolSize"] == 25
+    assert options["compressors"] == "zstd,zlib"
+    assert options["readPreference"] == "secondaryPreferred"
+    assert "socketTimeoutMS" not in options
+
+
+def test_client_is_reused_and_recreated_after_fork(monkeypatch):
+    monkeypatch.setattr(db, "MONGODB_URI", "mongodb://localhost:27017/nextrole")
+    db.close_client()
+    try:
+        first = db.get_client()
+        assert db.get_client() is first
+
+        monkeypatch.setattr(db, "_client_pid", -1)
+        assert db.get_client() is not first
+        assert db.DatabaseProxy().name == "nextrole"
+    finally:
+        db.close_client()
+
+
+def test_pool_listener_tracks_wait_times():
+    listener = db.MongoPoolMetrics()
+    event = SimpleNamespace(address=("localhost", 27017), connection_id=1, duration=0.004)
+    listener.connection_created(event)
+    listener.connection_checked_out(event)
+    listener.connection_checked_out(SimpleNamespace(address=("localhost", 27017), connection_id=1, duration=0.002))
+    listener.connection_checked_in(event)
+
+    stats = listener.snapshot()
+    assert stats["checkouts"] == 2
+    assert stats["checkedOut"] == 1
+    assert stats["openConnections"] == 1
+    assert stats["avgWaitMs"] == 3.0
+    assert stats["maxWaitMs"] == 4.0
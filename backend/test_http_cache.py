@@ -0,0 +1,78 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+import http_cache
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(http_cache.HTTPCacheMiddleware, policies={
+        "/courses/{name}": "private, no-cache", "/stream": "no-store"})
+
+    @app.get("/courses/{name}")
+    async def course(name: str):
+        return {"title": name, "modules": [{"explanation": "long text " * 200}]}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(3):
+                yield f'{{"row": {i}}}\n'
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    return app
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_etag_revalidation_returns_304(client):
+    first = await client.get("/courses/python", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    second = await client.get("/courses/python", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    changed = await client.get("/courses/rust", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "rust"
+
+
+@pytest.mark.asyncio
+async def test_large_bodies_are_compressed_and_keep_their_validator(client):
+    response = await client.get("/courses/python", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < 1000
+    assert response.json()["title"] == "python"
+
+    # The gzip variant's ETag still validates the resource.
+    revalidated = await client.get("/courses/python", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    small = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert http_cache.choose_encoding("gzip;q=0, deflate") is None
+
+
+@pytest.mark.asyncio
+async def test_streamed_responses_pass_through(client):
+    response = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.text.splitlines() == ['{"row": 0}', '{"row": 1}', '{"row": 2}']
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from loop_monitor import LoopMonitor
+
+
+def blocking_section():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_stall_is_captured_and_attributed():
+    monitor = LoopMonitor(interval=0.02, stall_threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        monitor.track_task({"type": "http", "path": "/api/chat", "route": SimpleNamespace(path="/api/chat")})
+        blocking_section()
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+
+    report = monitor.report()
+    assert report["stallsByRoute"].get("/api/chat") == 1
+    stall = report["stalls"][0]
+    assert stall["durationSeconds"] >= 0.25
+    assert any("blocking_section" in sample["stack"] for sample in stall["samples"])
+
+
+@pytest.mark.asyncio
+async def test_no_stall_when_loop_is_idle():
+    monitor = LoopMonitor(interval=0.02, stall_threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.2)
+    finally:
+        await monitor.stop()
+
+    assert monitor.report()["stalls"] == []
+    assert not monitor.running
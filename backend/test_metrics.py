@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("demo_seconds", "Demo.", ("site",), buckets=(0.1, 1.0))
+    hist.observe(0.05, site="a")
+    hist.observe(0.5, site="a")
+    hist.observe(5, site="a")
+
+    text = hist.render()
+
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{site="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{site="a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{site="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{site="a"} 3' in text
+
+
+def test_counter_rejects_unknown_labels():
+    counter = metrics.Counter("demo_total", "Demo.", ("site",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_middleware_labels_route_template():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/api/courses/{course_id}")
+    async def get_course(course_id: str):
+        return {"id": course_id}
+
+    client = TestClient(app)
+    client.get("/api/courses/abc")
+    client.get("/api/courses/def")
+
+    snapshot = metrics.HTTP_REQUEST_DURATION.snapshot(method="GET", route="/api/courses/{course_id}", status="200")
+    assert snapshot["count"] == 2
+
+
+def test_mongo_listener_records_collection():
+    listener = metrics.MongoCommandMetrics()
+    started = SimpleNamespace(request_id=1, operation_id=1, connection_id=("h", 1),
+                              command_name="find", command={"find": "courses"})
+    finished = SimpleNamespace(request_id=1, operation_id=1, connection_id=("h", 1),
+                               command_name="find", duration_micros=2500)
+    listener.started(started)
+    listener.succeeded(finished)
+
+    snapshot = metrics.MONGO_COMMAND_DURATION.snapshot(command="find", collection="courses", outcome="success")
+    assert snapshot["count"] == 1
+    assert snapshot["sum"] == pytest.approx(0.0025)
+
+
+@pytest.mark.asyncio
+async def test_generate_with_retry_records_tokens_and_json_failures():
+    import agent
+
+    bad = MagicMock(text="not json", usage_metadata=SimpleNamespace(prompt_token_count=10, candidates_token_count=3))
+    good = MagicMock(text='{"ok": true}', usage_metadata=SimpleNamespace(prompt_token_count=10, candidates_token_count=5))
+
+    with patch("agent.GenerativeModel") as model_class:
+        mock_model = model_class.return_value
+        mock_model.generate_content_async = AsyncMock(side_effect=[bad, good])
+        result = await agent.generate_with_retry("prompt", call_site="outline")
+
+    assert result == {"ok": True}
+    assert metrics.GEMINI_CALLS.value(call_site="outline", outcome="success") == 1
+    assert metrics.GEMINI_JSON_FAILURES.value(call_site="outline") == 1
+    assert metrics.GEMINI_RETRIES.value(call_site="outline", reason="json_error") == 1
+    assert metrics.GEMINI_TOKENS.value(call_site="outline", kind="prompt") == 20
+    assert metrics.GEMINI_TOKENS.value(call_site="outline", kind="completion") == 8
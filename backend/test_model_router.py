@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import model_router
+from bench.fake_gemini import FakeRateLimitError
+
+
+class StubModel:
+    def __init__(self, name, error=None, delay=0.0):
+        self.name = name
+        self.error = error
+        self.delay = delay
+        self.configs = []
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.configs.append(generation_config)
+        if stream:
+            return self._stream()
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        usage = SimpleNamespace(prompt_token_count=1_000_000, candidates_token_count=0)
+        return SimpleNamespace(text=self.name, usage_metadata=usage)
+
+    async def _stream(self):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        for piece in (self.name[:2], self.name[2:]):
+            yield SimpleNamespace(text=piece, usage_metadata=None)
+
+
+def make_router(**routes):
+    return model_router.ModelRouter(routes={"generic": model_router.Route(("a",)), **routes})
+
+
+@pytest.mark.asyncio
+async def test_falls_back_on_rate_limit_and_timeout():
+    models = {"lite": StubModel("lite", error=FakeRateLimitError()), "slow": StubModel("slow", delay=1),
+              "flash": StubModel("flash")}
+    router = make_router(
+        outline=model_router.Route(("lite", "slow", "flash"), max_output_tokens=256, temperature=0.2, timeout=0.05))
+
+    response, used = await router.generate("outline", "prompt", models.__getitem__)
+    assert used == "flash" and response.text == "flash"
+    assert models["lite"].configs == [{"max_output_tokens": 256, "temperature": 0.2}]
+
+    stats = router.stats()["stats"]["outline"]
+    assert stats["lite"]["failures"] == 1
+    assert stats["slow"]["failures"] == 1
+    assert stats["flash"]["calls"] == 1 and stats["flash"]["failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_streams_fall_back_until_the_first_chunk():
+    models = {"lite": StubModel("lite", error=FakeRateLimitError()), "slow": StubModel("slow", delay=1),
+              "flash": StubModel("flash")}
+    router = make_router(outline=model_router.Route(("lite", "slow", "flash"), timeout=0.05))
+
+    chunks = [chunk.text async for chunk in router.stream("outline", "prompt", models.__getitem__)]
+    assert chunks == ["fl", "ash"]
+    stats = router.stats()["stats"]["outline"]
+    assert stats["lite"]["failures"] == 1 and stats["slow"]["failures"] == 1
+    assert stats["flash"]["failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_other_errors_do_not_fall_back():
+    models = {"lite": StubModel("lite", error=ValueError("bad prompt")), "flash": StubModel("flash")}
+    router = make_router(outline=model_router.Route(("lite", "flash")))
+    with pytest.raises(ValueError):
+        await router.generate("outline", "prompt", models.__getitem__)
+    assert models["flash"].configs == []
+
+
+@pytest.mark.asyncio
+async def test_cost_uses_the_price_table(monkeypatch):
+    monkeypatch.setitem(model_router.MODEL_PRICES, "a", (0.5, 1.0))
+    router = make_router()
+    await router.generate("unknown_site", "prompt", lambda name: StubModel(name))
+    assert router.stats()["stats"]["unknown_site"]["a"]["costUsd"] == 0.5
+
+
+def test_routes_can_be_overridden_from_env(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTE_OUTLINE", "gemini-pro, gemini-flash-latest")
+    monkeypatch.setenv("MODEL_ROUTE_OUTLINE_MAX_TOKENS", "512")
+    route = model_router.ModelRouter().route("outline")
+    assert route.models == ("gemini-pro", "gemini-flash-latest")
+    assert route.max_output_tokens == 512
@@ -0,0 +1,75 @@
+import pytest
+
+import agent
+import module_library
+
+
+@pytest.fixture
+def fakes(monkeypatch, fake_gemini, fake_db):
+    model = fake_gemini()
+    monkeypatch.setattr(module_library, "ENABLED", True)
+    return model, fake_db
+
+
+def test_tag_skills_only_uses_the_skills_the_module_was_generated_for():
+    module = {
+        "moduleTitle": "Deploying Services with K8s",
+        "subModules": [{"subTitle": "Section 1: Pods", "explanation": "Package the app with Docker first."}],
+    }
+    assert module_library.tag_skills(module, ["Kubernetes", "Docker", "Rust"]) == ["kubernetes"]
+    assert module_library.tag_skills(module, ["Kubernetes"]) == ["kubernetes"]
+
+    dsa = {
+        "moduleTitle": "Binary Search Trees",
+        "subModules": [{"subTitle": "Section 1: Insertion", "explanation": "In Python, a node is a small class."}],
+    }
+    assert module_library.tag_skills(dsa, ["DSA", "Python"]) == []
+
+
+@pytest.mark.asyncio
+async def test_upskilling_course_reuses_library_modules(fakes):
+    model, fake_db = fakes
+
+    first = await agent.generate_upskilling_course(["Docker"], ["Python"])
+    assert len(first["modules"]) == 3
+    assert await fake_db.module_library.count_documents({"skills": "docker"}) == 3
+    calls_after_first = model.calls["ok"]
+
+    second = await agent.generate_upskilling_course(["Docker", "Kubernetes"], ["Python"])
+
+    # One reused Docker module plus two freshly generated ones (outline + 2 module prompts).
+    assert len(second["modules"]) == 3
+    assert second["modules"][0]["moduleTitle"] in {m["moduleTitle"] for m in first["modules"]}
+    assert model.calls["ok"] - calls_after_first == 3
+
+
+@pytest.mark.asyncio
+async def test_fully_covered_gap_still_fills_the_course_and_resets_progress(fakes):
+    model, fake_db = fakes
+    await agent.generate_upskilling_course(["Docker"], [])
+    stored = await fake_db.module_library.find_one({})
+    await fake_db.module_library.update_one({"_id": stored["_id"]}, {"$set": {"module.isCompleted": True}})
+    calls = model.calls["ok"]
+
+    course = await agent.generate_upskilling_course(["docker"], [])
+
+    # One reused module plus two generated ones (outline + 2 module prompts).
+    assert model.calls["ok"] - calls == 3
+    assert len(course["modules"]) == 3
+    assert all(module["isCompleted"] is False for module in course["modules"])
+
+
+@pytest.mark.asyncio
+async def test_modules_that_only_mention_a_skill_are_not_reused(fakes):
+    model, fake_db = fakes
+    await fake_db.module_library.insert_one({
+        "courseTitle": "DSA", "moduleTitle": "Binary Search Trees", "skills": ["python"],
+        "module": {"moduleTitle": "Binary Search Trees", "subModules": [], "quiz": []},
+        "embedding": module_library.text_embedding(
+            "Binary Search Trees\nA binary search tree keeps smaller keys on the left. In Python a node "
+            "is a class with left and right attributes; insertion walks down comparing keys.").tolist(),
+    })
+
+    reused, uncovered = await module_library.find_reusable_modules(["Python"], "SQL")
+
+    assert reused == [] and uncovered == ["Python"]
@@ -0,0 +1,67 @@
+import pytest
+
+import agent
+import pregenerate_catalog
+
+
+@pytest.fixture
+def fake_backend(monkeypatch, fake_gemini, fake_db):
+    model = fake_gemini()
+    monkeypatch.setattr(pregenerate_catalog, "db", fake_db)
+    return fake_db, model
+
+
+@pytest.mark.asyncio
+async def test_generates_recommended_courses_and_skips_existing(fake_backend):
+    fake_db, model = fake_backend
+    await fake_db.courses.insert_one({"title": "Mastering Data Analyst", "modules": []})
+    for email, role in [("a@x.com", "Data Analyst"), ("b@x.com", "Data Analyst"), ("c@x.com", "QA Engineer")]:
+        await fake_db.users.insert_one({"email": email, "currentRole": role})
+
+    args = pregenerate_catalog.parse_args(["--from-users", "--top", "1", "--concurrency", "2"])
+    summary = await pregenerate_catalog.main(args)
+
+    assert summary["recommendations"]["generated"] == 1
+    assert summary["courses"]["skipped"] == 1
+    assert summary["courses"]["generated"] == 1
+    assert await fake_db.recommendations.count_documents({"roleKey": "data analyst"}) == 1
+    assert await fake_db.courses.find_one({"title": "Transitioning beyond Data Analyst"})
+
+    # A second run finds everything in place and makes no Gemini calls.
+    calls_before = model.calls["ok"]
+    summary = await pregenerate_catalog.main(args)
+    assert summary["recommendations"]["skipped"] == 1
+    assert summary["courses"]["generated"] == 0
+    assert model.calls["ok"] == calls_before
+
+
+@pytest.mark.asyncio
+async def test_budget_stops_scheduling_courses(fake_backend):
+    args = pregenerate_catalog.parse_args(
+        ["--course", "Docker", "--course", "docker", "--course", "Kubernetes", "--concurrency", "1",
+         "--max-gemini-calls", str(pregenerate_catalog.COURSE_CALL_ESTIMATE)]
+    )
+    summary = await pregenerate_catalog.main(args)
+
+    assert summary["courses"]["generated"] == 1
+    assert summary["courses"]["overBudget"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_role_recommendations_are_regenerated(fake_backend, monkeypatch):
+    fake_db, model = fake_backend
+    monkeypatch.setattr(agent, "RECOMMENDATION_MAX_AGE_SECONDS", 3600)
+    await fake_db.recommendations.insert_one(
+        {"roleKey": "data analyst", "courses": [{"title": "Old"}], "generatedAt": agent.time.time() - 7200})
+
+    fresh = await agent.get_recommendations_with_links("Data Analyst")
+
+    assert fresh["courses"] != [{"title": "Old"}] and model.calls["ok"] == 1
+    assert await agent.get_cached_recommendations("Data Analyst") == fresh
+
+    async def unavailable(role):
+        return None
+    monkeypatch.setattr(agent, "generate_role_recommendations", unavailable)
+    # Generation unavailable: the expired entry beats a degraded answer.
+    await fake_db.recommendations.update_one({"roleKey": "data analyst"}, {"$set": {"generatedAt": 0}})
+    assert await agent.get_recommendations_with_links("Data Analyst") == fresh
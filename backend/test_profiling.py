@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import agent
+import profiling
+from serialization import FastJSONResponse
+
+
+def make_app(store, sample_rate=0.0):
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(profiling.ProfilingMiddleware, store=store, sample_rate=sample_rate, header_enabled=True,
+                       admin_token="secret")
+
+    @app.get("/courses/{name}")
+    async def course(name: str):
+        return FastJSONResponse(await agent.generate_full_course(name))
+
+    @app.get("/db")
+    async def db_calls():
+        # Motor runs commands on its executor with the caller's context.
+        event = SimpleNamespace(command_name="find", command={"find": "courses"}, duration_micros=2500)
+        await asyncio.to_thread(profiling.MongoProfileListener().succeeded, event)
+        return {"ok": True}
+
+    return app
+
+
+@pytest.fixture
+def fake_backend(fake_gemini, fake_db):
+    fake_gemini(latency=0.01)
+
+
+@pytest.mark.asyncio
+async def test_header_profiles_record_pipeline_phases(fake_backend):
+    store = profiling.ProfileStore(slow_seconds=60)
+    transport = httpx.ASGITransport(app=make_app(store))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/courses/Rust", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+        assert "gemini;dur=" in response.headers["server-timing"]
+        unprofiled = await client.get("/courses/Go")
+        assert "x-profile-id" not in unprofiled.headers
+        anonymous = await client.get("/courses/Go", headers={"X-Profile": "1", "X-Admin-Token": "guess"})
+        assert "x-profile-id" not in anonymous.headers
+
+    profile = store.get(response.headers["x-profile-id"])
+    assert profile["route"] == "/courses/{name}" and profile["status"] == 200
+    phases = profile["phases"]
+    assert phases["module"]["count"] == 5  # spans from the module tasks reach the request's profile
+    assert phases["gemini"]["count"] == 6 and phases["json"]["count"] == 6
+    assert phases["module"]["wallMs"] < phases["module"]["totalMs"]  # modules overlap
+    assert {"gemini", "module"} <= {span["phase"] for span in profile["spans"]}
+    assert len(store.report()["recent"]) == 1 and store.report()["slow"] == []
+
+
+@pytest.mark.asyncio
+async def test_slow_requests_are_captured_with_or_without_a_profile(fake_backend):
+    store = profiling.ProfileStore(slow_seconds=0)
+    transport = httpx.ASGITransport(app=make_app(store, sample_rate=1.0))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/db")
+    transport = httpx.ASGITransport(app=make_app(store))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/db")
+
+    unprofiled, sampled = store.report()["slow"]
+    assert unprofiled["id"] is None and unprofiled["phases"] == {}
+    assert sampled["trigger"] == "sampled"
+    profile = store.get(sampled["id"])
+    assert profile["spans"][0]["detail"] == "find courses"
+    assert profile["phases"]["mongo"]["totalMs"] == 2.5
+    assert profile["loopStalls"] == []
+
+
+def test_spans_outside_a_request_are_ignored():
+    with profiling.span("gemini", "outline"):
+        pass
+    profiling.record("mongo", 0.1)
+    assert profiling.current() is None
@@ -0,0 +1,44 @@
+import pytest
+
+import progress
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes(monkeypatch):
+    monkeypatch.setattr(progress, "_indexes_ready", False)
+
+
+@pytest.mark.asyncio
+async def test_progress_is_per_user_and_completes_course(fake_db):
+    await progress.record_module_result("alice", "c1", 0, 50.0, 2)
+    await progress.record_module_result("bob", "c1", 0, 100.0, 2)
+    await progress.record_module_result("alice", "c1", 0, 100.0, 2)  # retake replaces the score
+    state = await progress.record_module_result("alice", "c1", 1, 50.0, 2)
+
+    assert state["status"] == "completed"
+    assert state["totalProgress"] == 75.0
+    assert await fake_db.progress.count_documents({}) == 2
+
+    bob = await progress.get_progress("bob", "c1")
+    assert bob["status"] == "active"
+    assert bob["completedModules"] == [0]
+
+    stats = await progress.course_completion_stats("c1")
+    assert stats == {"courseId": "c1", "learners": 2, "completed": 1, "avgCompletedProgress": 75.0}
+
+    summary = await progress.user_summary("alice")
+    assert summary[0]["completedModules"] == 2
+
+
+@pytest.mark.asyncio
+async def test_apply_progress_leaves_shared_course_untouched(fake_db):
+    course = {"_id": "c1", "title": "Python Basics", "status": "active", "totalProgress": 0,
+              "modules": [{"moduleTitle": "A", "isCompleted": False, "moduleScore": 0},
+                          {"moduleTitle": "B", "isCompleted": False, "moduleScore": 0}]}
+    state = await progress.record_module_result("alice", "c1", 1, 80.0, 2)
+
+    merged = progress.apply_progress(course, state)
+
+    assert [m["isCompleted"] for m in merged["modules"]] == [False, True]
+    assert merged["modules"][1]["moduleScore"] == 80.0
+    assert course["modules"][1]["isCompleted"] is False
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+import agent
+import model_router
+
+
+@pytest.mark.asyncio
+async def test_module_calls_send_only_their_variables(monkeypatch, fake_gemini):
+    model = fake_gemini()
+    prompts = []
+    generate = model_router.router.generate
+
+    async def recording_generate(call_site, prompt, get_model, is_rate_limit=None):
+        response, model_name = await generate(call_site, prompt, get_model, is_rate_limit)
+        prompts.append(prompt)
+        return response, model_name
+    monkeypatch.setattr(model_router.router, "generate", recording_generate)
+
+    for title in ("Ownership", "Borrowing"):
+        _, details = await agent.generate_module_details("Rust", title, [{"subTitle": "Section 1: Basics"}])
+        assert details["quiz"]
+    assert all("Output JSON format" not in prompt for prompt in prompts)
+    assert len(prompts[0]) < len(agent.MODULE_DETAILS_INSTRUCTIONS.text) / 4
+    assert model.calls["system_instruction_tokens"] == 2 * agent.MODULE_DETAILS_INSTRUCTIONS.tokens
+
+
+def test_cached_tokens_are_billed_at_the_cached_rate(monkeypatch):
+    monkeypatch.setitem(model_router.MODEL_PRICES, "a", (1.0, 0.0))
+    monkeypatch.setattr(model_router, "CACHED_INPUT_RATE", 0.25)
+    usage = SimpleNamespace(prompt_token_count=1_000_000, cached_content_token_count=800_000, candidates_token_count=0)
+    assert model_router.estimate_cost("a", SimpleNamespace(usage_metadata=usage)) == pytest.approx(0.4)
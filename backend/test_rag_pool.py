@@ -0,0 +1,109 @@
+import os
+import importlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bench import harness
+
+
+@pytest.fixture(scope="module")
+def rag():
+    # Same offline stand-ins as the bench: fake embeddings/chat and a throw-away index.
+    index_dir = tempfile.TemporaryDirectory(prefix="test-faiss-")
+    os.environ["RAG_INDEX_DIR"] = index_dir.name
+    harness._patch_rag_providers(chat_latency=0)
+    yield importlib.import_module("rag")
+    index_dir.cleanup()
+
+
+@pytest.fixture
+def tenants(tmp_path):
+    (tmp_path / "acme").mkdir()
+    (tmp_path / "acme" / "policies.txt").write_text("Acme engineers get two learning days per month.")
+    (tmp_path / "globex").mkdir()
+    (tmp_path / "globex" / "handbook.md").write_text("Globex mentors review every promotion plan.")
+    return tmp_path
+
+
+def test_tenants_load_lazily_and_are_evicted_lru(rag, tenants, tmp_path):
+    pool = rag.RAGPool(rag.rag_service, tenants_dir=tenants, index_dir=tmp_path / "indexes", max_tenants=1)
+    assert pool.get() is pool.default
+    assert pool.stats()["tenants"] == {}
+
+    acme = pool.get("acme")
+    assert acme.vector_store.similarity_search("learning days", k=1)[0].page_content.startswith("Acme")
+    assert pool.get("acme") is acme
+
+    globex = pool.get("globex")
+    assert globex.vector_store.document(0).metadata["source"].endswith("handbook.md")
+    stats = pool.stats()
+    assert list(stats["tenants"]) == ["globex"]
+    assert stats["evictions"] == 1
+
+    # Reloading an evicted tenant maps its existing index instead of re-embedding it.
+    assert pool.get("acme").vector_store.path == acme.vector_store.path
+
+
+def test_byte_budget_and_concurrent_cold_loads(rag, tenants, tmp_path):
+    pool = rag.RAGPool(rag.rag_service, tenants_dir=tenants, index_dir=tmp_path / "indexes", max_bytes=1)
+    with ThreadPoolExecutor(8) as executor:
+        services = list(executor.map(pool.get, ["acme"] * 8))
+    assert all(service is services[0] for service in services)
+
+    pool.get("globex")
+    assert list(pool.stats()["tenants"]) == ["globex"]  # over budget, but the newest stays
+
+
+def test_unknown_tenants_are_rejected(rag, tenants, tmp_path):
+    pool = rag.RAGPool(rag.rag_service, tenants_dir=tenants, index_dir=tmp_path / "indexes")
+    for tenant in ("initech", "../acme", "acme/.."):
+        with pytest.raises(rag.UnknownTenantError):
+            pool.get(tenant)
+
+
+def test_unchanged_knowledge_bases_are_not_rehashed(rag, tenants, tmp_path, monkeypatch):
+    pool = rag.RAGPool(rag.rag_service, tenants_dir=tenants, index_dir=tmp_path / "indexes")
+    service = pool.get("acme")
+    reads = []
+    read_bytes = rag.Path.read_bytes
+    monkeypatch.setattr(rag.Path, "read_bytes", lambda path: reads.append(path.name) or read_bytes(path))
+
+    assert not service.has_updates()
+    assert reads == []
+    (tenants / "acme" / "policies.txt").write_text("Acme engineers get three learning days per month.")
+    assert service.has_updates()
+    assert reads == ["policies.txt"]
+
+
+def test_tenant_tokens_bind_callers_to_their_knowledge_base():
+    import tenant_auth
+    token = tenant_auth.sign("acme", key="k")
+    assert tenant_auth.tenant_for(token, key="k") == "acme"
+    assert tenant_auth.tenant_for(token, "acme", key="k") == "acme"
+    assert tenant_auth.tenant_for(None, key="k") is None
+    for token, requested in [(token, "globex"), (None, "acme"), ("globex." + token.split(".")[1], None),
+                             (tenant_auth.sign("acme", key="other"), None)]:
+        with pytest.raises(tenant_auth.TenantAccessError):
+            tenant_auth.tenant_for(token, requested, key="k")
+
+
+@pytest.mark.asyncio
+async def test_follow_ups_reuse_session_context(rag):
+    import chat_sessions
+    service = rag.rag_service
+    index = service.vector_store
+    embed_calls = []
+    original = index.batcher._search
+    index.batcher._search = lambda queries, k: embed_calls.append(queries) or original(queries, k)
+    session = chat_sessions.ChatSession(id="s1")
+
+    await service.get_response("How does the skill gap analysis engine work?", session)
+    assert len(embed_calls) == 1 and session.record_ids
+    await service.get_response("and how long does that take?", session)
+    assert len(embed_calls) == 1  # answered from the session's records
+    assert "Q: How does the skill gap analysis engine work?" in session.summary
+
+    await service.get_response("What about the quantum teleportation module?", session)
+    assert len(embed_calls) == 2  # new terms: searched and merged
@@ -0,0 +1,30 @@
+import datetime
+import json
+
+import pytest
+from bson import ObjectId
+
+import course_cache
+import serialization
+
+
+def test_dumps_handles_bson_types_with_and_without_orjson(monkeypatch):
+    oid = ObjectId()
+    doc = {"_id": oid, "userId": oid, "createdAt": datetime.datetime(2026, 1, 2, 3, 4, 5), "tags": {"a"}}
+    expected = {"_id": str(oid), "userId": str(oid), "createdAt": "2026-01-02T03:04:05", "tags": ["a"]}
+
+    assert json.loads(serialization.dumps(doc)) == expected
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.dumps(doc)) == expected
+
+
+@pytest.mark.asyncio
+async def test_cached_course_reuses_serialized_bytes():
+    cache = course_cache.CourseCache()
+    course = {"_id": "c1", "title": "Python Basics", "modules": []}
+    await cache.put(course)
+
+    body = cache.serialized(course)
+    assert json.loads(body) == course
+    assert cache.serialized(dict(course)) is None  # a modified copy must be encoded again
+    assert serialization.FastJSONResponse(body).body is body
@@ -0,0 +1,83 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from skill_matcher import SkillMatcher, estimate_time, normalize_skill
+
+
+def test_normalize_and_aliases():
+    matcher = SkillMatcher()
+    assert normalize_skill("  React.JS ") == "react.js"
+    assert matcher.canonical("React.js") == matcher.canonical("react") == "react"
+    assert matcher.canonical("K8s") == "kubernetes"
+    assert matcher.canonical("Docker Basics") == "docker"
+    assert matcher.canonical("C++") != matcher.canonical("C#")
+
+
+def test_match_reports_missing_skills_and_percentage():
+    result = SkillMatcher().match(
+        ["Python", "JavaScript", "React.js", "Systems Design"],
+        ["Python", "JavaScript", "React", "AWS", "Docker", "System Design"],
+    )
+    assert result["missingSkills"] == ["AWS", "Docker"]
+    assert result["matchedSkills"]["React"] == "React.js"
+    assert result["matchedSkills"]["System Design"] == "Systems Design"
+    assert result["matchPercentage"] == 67
+
+
+def test_similar_but_different_skills_are_not_matched():
+    result = SkillMatcher().match(["Java", "React"], ["JavaScript", "React Native"])
+    assert result["missingSkills"] == ["JavaScript", "React Native"]
+
+    for employee, required in [("Project Management", "Product Management"), ("Python 2", "Python 3"),
+                               ("Spring", "Spring Boot")]:
+        result = SkillMatcher().match([employee], [required])
+        assert result["missingSkills"] == [required] and result["matchPercentage"] == 0
+
+    exact_only = SkillMatcher(similarity_threshold=None).match(["Systems Design"], ["System Design"])
+    assert exact_only["missingSkills"] == ["System Design"]
+
+
+def test_estimate_time():
+    assert estimate_time([]) == "0 weeks"
+    assert estimate_time(["AWS", "Docker"]) == "4 weeks"
+    assert estimate_time(["a", "b", "c", "d", "e"]) == "2 months"
+
+
+@pytest.mark.asyncio
+async def test_analyze_skill_gap_modes():
+    import agent
+
+    with patch("agent.generate_with_retry", new=AsyncMock(return_value={"recommendations": ["Learn AWS"]})) as llm:
+        fast = await agent.analyze_skill_gap(["Python"], "Cloud Engineer", ["Python", "AWS"], mode="fast")
+        assert llm.await_count == 0
+        assert fast["missingSkills"] == ["AWS"]
+        assert fast["matchPercentage"] == 50
+
+        hybrid = await agent.analyze_skill_gap(["Python"], "Cloud Engineer", ["Python", "AWS"], mode="hybrid")
+        assert llm.await_count == 1
+        assert hybrid["recommendations"] == ["Learn AWS"]
+
+    assert "error" in await agent.analyze_skill_gap(["Python"], "Cloud Engineer", ["AWS"], mode="bogus")
+
+
+@pytest.fixture(scope="module")
+def bench_app():
+    from bench import harness
+    env = harness.install()
+    yield env.app
+    env.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_mode_is_a_bad_request(bench_app):
+    import httpx
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        body = {"employeeSkills": ["Python"], "targetRole": "Cloud Engineer", "targetRoleSkills": ["AWS"]}
+        response = await client.post("/api/analyze-skill-gap", json={**body, "mode": "fastt"})
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Unknown skill gap mode 'fastt'")
+
+        response = await client.post("/api/analyze-skill-gap", json={**body, "mode": "fast"})
+        assert response.status_code == 200 and response.json()["missingSkills"] == ["AWS"]
@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+
+import agent
+import streaming_json
+
+
+def test_modules_are_emitted_as_soon_as_they_close():
+    outline = {"title": 'The "modules": [trap]', "modules": [
+        {"moduleTitle": "A {1}", "subModules": [{"subTitle": "Section 1: \\\"x\\\""}]},
+        {"moduleTitle": "B", "subModules": [], "extra": {"modules": [{"nested": True}]}},
+        "not an object",
+    ], "after": [{"ignored": True}]}
+    text = "```json\n" + json.dumps(outline) + "\n```"
+
+    parser = streaming_json.ArrayItemParser("modules")
+    emitted = []
+    for i in range(0, len(text), 7):
+        for item in parser.feed(text[i:i + 7]):
+            emitted.append((item, i + 7))
+    assert [item for item, _ in emitted] == outline["modules"][:2]
+    first_end = text.index('}]}') + 3
+    assert emitted[0][1] - 7 < first_end <= emitted[0][1]  # not held back until the document ends
+    assert parser.done and parser.text == text
+
+
+@pytest.mark.asyncio
+async def test_module_generation_starts_while_the_outline_streams(monkeypatch, fake_gemini, fake_db):
+    fake_gemini(latency=0.2, stream_chunks=10)
+    started = []
+    process_module = agent.process_module
+
+    async def recording_process_module(course_name, module_title, *args):
+        started.append(time.perf_counter())
+        return await process_module(course_name, module_title, *args)
+    monkeypatch.setattr(agent, "process_module", recording_process_module)
+
+    start = time.perf_counter()
+    course = await agent.generate_full_course("Rust")
+    assert [m["moduleTitle"] for m in course["modules"]] == [f"Rust: Part {i + 1}" for i in range(5)]
+    assert started[0] - start < 0.15  # before the 0.2s outline finished
+    assert started[-1] - started[0] > 0.05  # one by one as the outline arrives
+
+    monkeypatch.setattr(agent, "OUTLINE_STREAMING", False)
+    started.clear()
+    start = time.perf_counter()
+    await agent.generate_full_course("Go")
+    assert started[0] - start >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_keeps_modules_the_fallback_outline_still_has(monkeypatch, fake_gemini, fake_db):
+    fake_gemini(latency=0.05)
+    started, finished = [], []
+    process_module = agent.process_module
+
+    async def recording_process_module(course_name, module_title, *args):
+        started.append(module_title)
+        try:
+            return await process_module(course_name, module_title, *args)
+        finally:
+            finished.append(module_title)
+    monkeypatch.setattr(agent, "process_module", recording_process_module)
+
+    async def broken_stream(course_name, on_module):
+        on_module({"moduleTitle": "Rust: Part 1", "subModules": [{"subTitle": "Section 1: Intro"}]})
+        on_module({"moduleTitle": "Rust: Abandoned", "subModules": [{"subTitle": "Section 1: Intro"}]})
+        return None
+    monkeypatch.setattr(agent, "stream_course_outline", broken_stream)
+
+    course = await agent.generate_full_course("Rust")
+
+    assert [m["moduleTitle"] for m in course["modules"]] == [f"Rust: Part {i + 1}" for i in range(5)]
+    assert started.count("Rust: Part 1") == 1  # reused, not generated twice
+    assert "Rust: Abandoned" in finished  # cancelled and awaited
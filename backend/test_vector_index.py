@@ -0,0 +1,121 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import vector_index
+
+# IDs are the record positions the index assigns.
+DOCS = [Document(id=str(i), page_content=text, metadata={"source": "kb", "chunk": i})
+        for i, text in enumerate(["Nexor Navigator plans careers.", "Courses are generated by Gemini.",
+                                  "Quiz scores unlock modules – naïve learners welcome."])]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_build_and_search_roundtrip(tmp_path, index_type):
+    embeddings = DeterministicFakeEmbedding(size=64)
+    path = tmp_path / "faiss_index"
+    index = vector_index.MmapVectorIndex.build(path, DOCS, embeddings, index_type)
+
+    assert len(index) == 3
+    assert index.path == vector_index.resolve(path)
+    assert vector_index.is_current(index.path, index_type)
+    assert index.document(2) == DOCS[2]
+    assert index.similarity_search(DOCS[1].page_content, k=1) == [DOCS[1]]
+
+    retriever = index.as_retriever(search_kwargs={"k": 2})
+    assert retriever.invoke(DOCS[0].page_content)[0] == DOCS[0]
+
+    reopened = vector_index.MmapVectorIndex(index.path, embeddings)
+    assert reopened.similarity_search(DOCS[2].page_content, k=5)[0] == DOCS[2]
+
+
+def test_legacy_or_other_type_needs_rebuild(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "index.faiss").write_bytes(b"")
+    (legacy / "index.pkl").write_bytes(b"")
+    assert vector_index.resolve(legacy) is None
+
+    index = vector_index.MmapVectorIndex.build(legacy, DOCS, DeterministicFakeEmbedding(size=64), "flat")
+    assert not (legacy / "index.pkl").exists()
+    assert not vector_index.is_current(index.path, "hnsw")
+
+
+def test_ivfpq_trains_on_large_corpora_and_falls_back_on_small_ones(tmp_path):
+    assert vector_index.factory_string("ivfpq", 64, 100) == "Flat"
+
+    rng = np.random.default_rng(0)
+    vectors = rng.random((10000, 16), dtype="float32")
+    docs = [Document(page_content=str(i)) for i in range(len(vectors))]
+    meta = vector_index.write_index_dir(tmp_path / "ivf", vectors, docs, "ivfpq")
+    assert meta["factory"].startswith("IVF") and meta["factory"].endswith("PQ2")
+
+    index = vector_index.MmapVectorIndex(tmp_path / "ivf", embeddings=None)
+    hits = index.search_by_vector(vectors[42], k=5)
+    assert "42" in [doc.page_content for doc in hits]
+
+
+def test_publishing_swaps_versions_and_keeps_old_ones_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "KEEP_VERSIONS", 2)
+    embeddings = DeterministicFakeEmbedding(size=64)
+    root = tmp_path / "faiss_index"
+    first = vector_index.MmapVectorIndex.build(root, DOCS, embeddings, source="kb-1")
+
+    # Same source: another worker reuses the live version instead of re-embedding.
+    assert vector_index.publish(root, DOCS, embeddings, source="kb-1") == first.path
+    assert vector_index.publish(root, DOCS, embeddings, source="kb-1", force=True) != first.path
+
+    updated = [Document(id="0", page_content="Mentors review every learning path.")]
+    latest = vector_index.MmapVectorIndex.build(root, updated, embeddings, source="kb-2")
+    assert vector_index.resolve(root) == latest.path
+    assert not first.path.exists()  # pruned, but still mapped by readers that have it open
+    assert first.similarity_search(DOCS[0].page_content, k=1) == [DOCS[0]]
+    assert latest.similarity_search("anything", k=3) == updated
+    assert len([p for p in root.iterdir() if p.is_dir()]) == 2
+
+
+def test_chunks_expand_to_deduplicated_sections_within_budget(tmp_path):
+    sections = [Document(id="3", page_content="A\n" + "alpha " * 40),
+                Document(id="4", page_content="B\n" + "beta " * 400)]
+    chunks = [Document(id="0", page_content="A\nalpha one", metadata={"parent": 0}),
+              Document(id="1", page_content="A\nalpha two", metadata={"parent": 0}),
+              Document(id="2", page_content="B\nbeta one", metadata={"parent": 1})]
+    embeddings = DeterministicFakeEmbedding(size=64)
+    index = vector_index.MmapVectorIndex.build(tmp_path / "idx", chunks, embeddings, parents=sections)
+    assert len(index) == 3
+    assert index.parent(1) == sections[1]
+
+    context = index.expand([chunks[0], chunks[1], chunks[2]], max_tokens=100)
+    assert context == [sections[0], chunks[2]]  # section B is too large, its chunk fits
+
+    retriever = index.as_retriever(search_kwargs={"k": 3, "max_tokens": 20})
+    assert all(doc in chunks for doc in retriever.invoke("alpha one"))
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_embedding_call_and_search(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=64)
+    index = vector_index.MmapVectorIndex.build(tmp_path / "idx", DOCS, embeddings)
+    index.embeddings = counting = CountingEmbedding(size=64)
+
+    queries = [doc.page_content for doc in DOCS] * 4
+    results = await asyncio.gather(*[index.asimilarity_search(q, k=1 + i % 2) for i, q in enumerate(queries)])
+    assert counting.calls == 1
+    assert not index.batcher._running  # batch tasks are held until they finish, then dropped
+    assert [docs[0] for docs in results] == DOCS * 4
+    assert [len(docs) for docs in results] == [1 + i % 2 for i in range(len(queries))]
+
+    retriever = index.as_retriever(search_kwargs={"k": 1})
+    assert await retriever.ainvoke(DOCS[1].page_content) == [DOCS[1]]
+    assert counting.calls == 2
@@ -0,0 +1,395 @@
+"""
+Memory-mapped FAISS index and docstore for the RAG knowledge base.
+
+The index root holds immutable version directories (`v<timestamp>`) and a
+`CURRENT` file naming the live one. Publishing a new version writes its
+directory first and then replaces `CURRENT` atomically, so readers always see a
+complete index; the newest RAG_INDEX_KEEP_VERSIONS versions are kept.
+
+A version directory holds:
+  index.faiss   the FAISS index (Flat, HNSW or IVF-PQ), memory-mapped read-only
+  docs.bin      one UTF-8 JSON record ({"page_content", "metadata"}) per vector, concatenated,
+                followed by the parent (section) records the vectors point to
+  offsets.npy   int64 start offsets of the records in docs.bin, memory-mapped
+  meta.json     format version, index type, dimension and vector count
+
+Nothing is unpickled, and vectors and documents are read through the page cache,
+so pre-forked workers share one copy instead of each loading their own.
+
+RAG_INDEX_TYPE selects the index: `flat` (exact, default), `hnsw` or `ivfpq`.
+Search and build parameters: RAG_HNSW_M, RAG_HNSW_EF_SEARCH, RAG_IVF_NLIST,
+RAG_IVF_NPROBE, RAG_PQ_M. Retrieval: RAG_FETCH_K candidate chunks, expanded to
+their parent sections within RAG_CONTEXT_TOKENS. Concurrent async queries are
+micro-batched (RAG_BATCH_WINDOW_MS, RAG_BATCH_MAX): one embedding call and one
+FAISS search per batch.
+"""
+import asyncio
+import inspect
+import json
+import math
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds are not serialized
+    fcntl = None
+
+try:
+    import metrics
+except ImportError:
+    from backend import metrics
+
+FORMAT_VERSION = 2
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0: 4 * sqrt(vector count), capped by training data
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("RAG_PQ_M", "0"))  # 0: dimension / 8
+PQ_MIN_TRAINING_POINTS = 39  # per centroid, as FAISS recommends
+FETCH_K = int(os.getenv("RAG_FETCH_K", "4"))
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "750"))  # ~ the 3 x 1,000-character chunks used before
+BATCH_WINDOW_MS = float(os.getenv("RAG_BATCH_WINDOW_MS", "5"))
+BATCH_MAX = max(1, int(os.getenv("RAG_BATCH_MAX", "32")))
+
+QUERY_BATCH_SIZE = metrics.registry.histogram(
+    "rag_query_batch_size", "Chat queries embedded and searched per batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+QUERY_EMBED_CALLS = metrics.registry.counter(
+    "rag_query_embedding_calls_total", "Embedding calls made for chat queries."
+)
+KEEP_VERSIONS = max(1, int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "3")))
+# Files of the unversioned layout, removed once a version is published.
+_LEGACY_FILES = ("index.faiss", "index.pkl", "docs.bin", "offsets.npy", "meta.json")
+
+# Zero-copy mmap of the stored vectors (FAISS >= 1.10); older builds copy them in.
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def index_type_from_env() -> str:
+    index_type = os.getenv("RAG_INDEX_TYPE", "flat").lower().replace("-", "").replace("_", "")
+    if index_type not in INDEX_TYPES:
+        print(f"Warning: Unknown RAG_INDEX_TYPE '{index_type}', using flat")
+        return "flat"
+    return index_type
+
+
+def factory_string(index_type: str, dim: int, count: int) -> str:
+    """
+    FAISS index_factory description for `index_type`. IVF-PQ falls back to Flat
+    when there are too few vectors to train its quantizers.
+    """
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivfpq":
+        nlist = IVF_NLIST or max(1, min(int(4 * math.sqrt(count)), count // PQ_MIN_TRAINING_POINTS))
+        pq_m = PQ_M or next(m for m in (dim // 8, 32, 16, 8, 4, 2, 1) if m and dim % m == 0)
+        # 8-bit PQ trains 256 centroids per sub-quantizer
+        if count >= max(256, nlist) * PQ_MIN_TRAINING_POINTS:
+            return f"IVF{nlist},PQ{pq_m}"
+        print(f"Warning: {count} vectors are too few to train IVF-PQ, using a flat index")
+    return "Flat"
+
+
+def embed_queries(embeddings, texts: List[str]) -> np.ndarray:
+    """
+    Embeds several queries in one call, as retrieval queries for providers that
+    distinguish them from documents (Gemini's task_type).
+    """
+    QUERY_EMBED_CALLS.inc()
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        vectors = embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    else:
+        vectors = embeddings.embed_documents(texts)
+    return np.asarray(vectors, dtype="float32")
+
+
+def _meta(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads((path / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def resolve(root: Path) -> Optional[Path]:
+    """
+    The live version directory under `root`, or None if nothing was published.
+    """
+    root = Path(root)
+    try:
+        path = root / (root / "CURRENT").read_text().strip()
+    except OSError:
+        return None
+    return path if (path / "meta.json").exists() else None
+
+
+def is_current(path: Optional[Path], index_type: str, source: Optional[str] = None) -> bool:
+    """
+    True if `path` holds an index in this format built with `index_type`
+    (and from `source`, the knowledge-base fingerprint, when given).
+    """
+    meta = _meta(Path(path)) if path else None
+    return (bool(meta) and meta.get("version") == FORMAT_VERSION and meta.get("requestedType") == index_type
+            and (source is None or meta.get("source") == source))
+
+
+def write_index_dir(path: Path, vectors: np.ndarray, documents: List[Document], index_type: str,
+                    source: Optional[str] = None, parents: Optional[List[Document]] = None) -> Dict:
+    """
+    Builds the index and writes it to a staging directory next to `path`, then
+    renames it into place.
+    """
+    path = Path(path)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count, dim = vectors.shape
+    spec = factory_string(index_type, dim, count)
+    index = faiss.index_factory(dim, spec)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    faiss.write_index(index, str(staging / "index.faiss"))
+    offsets = [0]
+    with open(staging / "docs.bin", "wb") as f:
+        for doc in list(documents) + list(parents or []):
+            record = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata},
+                                ensure_ascii=False, separators=(",", ":")).encode()
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(staging / "offsets.npy", np.asarray(offsets, dtype="int64"))
+    meta = {"version": FORMAT_VERSION, "requestedType": index_type, "factory": spec,
+            "dimension": dim, "count": count, "parents": len(parents or []), "source": source,
+            "builtAt": time.time()}
+    (staging / "meta.json").write_text(json.dumps(meta))
+    staging.rename(path)
+    return meta
+
+
+def publish(root: Path, documents: List[Document], embeddings, index_type: str = "flat",
+            source: Optional[str] = None, force: bool = False, parents: Optional[List[Document]] = None) -> Path:
+    """
+    Embeds `documents` into a new version under `root` and makes it the live one.
+    A document's metadata["parent"] is its position in `parents`.
+    With several workers publishing at once, the first one builds and the others
+    reuse its version (unless `force`).
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        current = resolve(root)
+        if not force and is_current(current, index_type, source):
+            return current
+        vectors = np.asarray(embeddings.embed_documents([d.page_content for d in documents]), dtype="float32")
+        version = root / f"v{time.time_ns()}"
+        meta = write_index_dir(version, vectors, documents, index_type, source, parents)
+        pointer = root / "CURRENT.tmp"
+        pointer.write_text(version.name)
+        os.replace(pointer, root / "CURRENT")
+        print(f"DEBUG: Published {meta['factory']} index {version.name} with {meta['count']} vectors")
+        _prune(root, version)
+    return version
+
+
+def _prune(root: Path, live: Path):
+    """
+    Deletes all but the newest KEEP_VERSIONS versions. Workers still mapping a
+    deleted version keep reading it until they reload (the files are only unlinked).
+    """
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith("v") and p.name[1:].isdigit())
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != live:
+            shutil.rmtree(old, ignore_errors=True)
+    for name in _LEGACY_FILES:
+        (root / name).unlink(missing_ok=True)
+
+
+class MmapVectorIndex:
+    """
+    Read-only vector index over a memory-mapped index directory.
+    """
+    def __init__(self, path: Path, embeddings):
+        self.path = Path(path)
+        self.embeddings = embeddings
+        self.meta = _meta(self.path)
+        self.index = faiss.read_index(str(self.path / "index.faiss"), _MMAP_FLAGS)
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = HNSW_EF_SEARCH
+        if "IVF" in self.meta["factory"]:
+            faiss.extract_index_ivf(self.index).nprobe = IVF_NPROBE
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        with open(self.path / "docs.bin", "rb") as f:
+            # mmap can't map an empty file
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        self.batcher = QueryBatcher(self)
+
+    @classmethod
+    def build(cls, root: Path, documents: List[Document], embeddings, index_type: str = "flat",
+              source: Optional[str] = None, force: bool = False,
+              parents: Optional[List[Document]] = None) -> "MmapVectorIndex":
+        """
+        Publishes `documents` under `root` (see `publish`) and opens the live version.
+        """
+        return cls(publish(root, documents, embeddings, index_type, source, force, parents), embeddings)
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def parent(self, i: int) -> Document:
+        return self.document(self.meta["count"] + i)
+
+    def document(self, i: int) -> Document:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        record = json.loads(self._docs[start:end])
+        # The record position is a stable ID within this version (see chat_sessions).
+        return Document(id=str(i), page_content=record["page_content"], metadata=record["metadata"])
+
+    def search_batch(self, vectors, k: int = 3) -> List[List[Document]]:
+        """
+        Nearest documents for each row of `vectors`, in one FAISS search.
+        """
+        vectors = np.asarray(vectors, dtype="float32")
+        vectors = vectors.reshape(len(vectors), -1)
+        if not len(self):
+            return [[] for _ in vectors]
+        _, ids = self.index.search(vectors, min(k, len(self)))
+        return [[self.document(int(i)) for i in row if i >= 0] for row in ids]
+
+    def search_by_vector(self, vector, k: int = 3) -> List[Document]:
+        return self.search_batch([vector], k)[0]
+
+    def similarity_search(self, query: str, k: int = 3) -> List[Document]:
+        return self.search_by_vector(self.embeddings.embed_query(query), k)
+
+    async def asimilarity_search(self, query: str, k: int = 3) -> List[Document]:
+        return await self.batcher.search(query, k)
+
+    def expand(self, chunks: List[Document], max_tokens: int = CONTEXT_TOKENS) -> List[Document]:
+        """
+        Replaces ranked chunks by their parent sections, deduplicated, while they
+        fit in `max_tokens`; a chunk whose section doesn't fit is kept as is.
+        """
+        context, used, seen = [], 0, set()
+        for chunk in chunks:
+            parent_id = chunk.metadata.get("parent")
+            if parent_id is not None and parent_id in seen:
+                continue
+            parent = self.parent(parent_id) if parent_id is not None else None
+            for candidate in ([parent] if parent else []) + [chunk]:
+                tokens = len(candidate.page_content) // 4 + 1
+                if used + tokens <= max_tokens:
+                    context.append(candidate)
+                    used += tokens
+                    if candidate is parent:
+                        seen.add(parent_id)
+                    break
+        return context
+
+    @staticmethod
+    def within_budget(documents: List[Document], max_tokens: int = CONTEXT_TOKENS) -> List[Document]:
+        """
+        Distinct documents, in order, while they fit in `max_tokens`.
+        """
+        context, used, seen = [], 0, set()
+        for doc in documents:
+            tokens = len(doc.page_content) // 4 + 1
+            if doc.id in seen or used + tokens > max_tokens:
+                continue
+            context.append(doc)
+            used += tokens
+            seen.add(doc.id)
+        return context
+
+    def as_retriever(self, search_kwargs: Optional[Dict] = None) -> "VectorIndexRetriever":
+        search_kwargs = search_kwargs or {}
+        return VectorIndexRetriever(index=self, k=search_kwargs.get("k", FETCH_K),
+                                    max_tokens=search_kwargs.get("max_tokens", CONTEXT_TOKENS))
+
+    def close(self):
+        if isinstance(self._docs, mmap.mmap):
+            self._docs.close()
+
+
+class QueryBatcher:
+    """
+    Collects queries that arrive within `window` seconds of each other (up to
+    `max_batch`) and answers them with one embedding call and one FAISS search.
+    """
+    def __init__(self, index: MmapVectorIndex, window: float = BATCH_WINDOW_MS / 1000, max_batch: int = BATCH_MAX):
+        self.index = index
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []  # (query, k, future)
+        self._timer = None
+        self._running = set()  # the loop only keeps weak references to tasks
+
+    async def search(self, query: str, k: int) -> List[Document]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        QUERY_BATCH_SIZE.observe(len(batch))
+        try:
+            results = await asyncio.to_thread(self._search, [query for query, _, _ in batch],
+                                              max(k for _, k, _ in batch))
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, k, future), docs in zip(batch, results):
+            if not future.done():  # the request may have been cancelled
+                future.set_result(docs[:k])
+
+    def _search(self, queries: List[str], k: int) -> List[List[Document]]:
+        unique = list(dict.fromkeys(queries))
+        rows = dict(zip(unique, self.index.search_batch(embed_queries(self.index.embeddings, unique), k)))
+        return [rows[query] for query in queries]
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """
+    LangChain retriever over an MmapVectorIndex: the `k` nearest chunks,
+    expanded to their sections within `max_tokens`.
+    """
+    index: Any
+    k: int = FETCH_K
+    max_tokens: int = CONTEXT_TOKENS
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.index.expand(self.index.similarity_search(query, self.k), self.max_tokens)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.index.expand(await self.index.asimilarity_search(query, self.k), self.max_tokens)